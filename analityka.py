@@ -0,0 +1,1506 @@
+"""
+Obliczenia dashboardu niezależne od Streamlit: kategorie leków, kostka OLAP i graf widoków, indeks promocji, roll-upy czasu,
+agregacja aptek, udziały rynkowe produktów, hierarchia sprzedaży, uplift, prognozy Holta-Wintersa,
+wykrywanie anomalii, LTTB, funkcje Pareto, pivotów i tabel porównawczych, formatowanie liczb, cache wyników
+w pamięci i na dysku oraz migawki Arrow wczytanych danych.
+
+prz.py jest tylko warstwą widoku: wczytuje pliki, cache'uje wyniki (CachePamieci / st.cache_data / st.cache_resource)
+i rysuje. Zadania wsadowe (przetworz_dane.py), testy i benchmarki importują ten moduł bez uruchamiania dashboardu, np.:
+
+    from analityka import holt_winters_wsadowo, KostkaOLAP
+"""
+import functools
+import hashlib
+import os
+import pickle
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+
+month_names = { # Pełne nazwy miesięcy - używane do tworzenia kolumny 'Miesiąc_nazwa' w 'przygotuj_daty_cached'
+    1: "Styczeń", 2: "Luty", 3: "Marzec", 4: "Kwiecień", 5: "Maj", 6: "Czerwiec",
+    7: "Lipiec", 8: "Sierpień", 9: "Wrzesień", 10: "Październik", 11: "Listopad", 12: "Grudzień"
+}
+month_names_short = { # Skrócone nazwy miesięcy - używane w tabelach i pivotach
+    1: "Sty", 2: "Lut", 3: "Mar", 4: "Kwi", 5: "Maj", 6: "Cze",
+    7: "Lip", 8: "Sie", 9: "Wrz", 10: "Paź", 11: "Lis", 12: "Gru"
+}
+
+# Przyrostki surowych plików źródłowych dla każdej kategorii (np. 'promocje_waga.parquet')
+kategorie_pliki = {
+    "LECZENIE NAŁOGÓW": "nalogi",
+    "PREPARATY PRZECIWALERGICZNE": "przeciwalergiczne",
+    "PREPARATY PRZECIWWYMIOTNE": "przeciwwymiotne",
+    "PREPARATY SŁUŻĄCE DO ZMNIEJSZENIA WAGI CIAŁA": "waga",
+    "PRZYLEPCE": "przylepce",
+}
+# Krótkie nazwy kategorii używane w nagłówkach i tabelach
+kategorie_etykiety = {
+    "LECZENIE NAŁOGÓW": "Nałogi",
+    "PREPARATY PRZECIWALERGICZNE": "Przeciwalergiczne",
+    "PREPARATY PRZECIWWYMIOTNE": "Przeciwwymiotne",
+    "PREPARATY SŁUŻĄCE DO ZMNIEJSZENIA WAGI CIAŁA": "Waga",
+    "PRZYLEPCE": "Przylepce",
+}
+# Pliki wskaźników - nazwy dwóch pierwszych zostały zachowane z wcześniejszej wersji skryptu
+kategorie_wskazniki = {
+    "LECZENIE NAŁOGÓW": "wsknalogi.parquet",
+    "PREPARATY PRZECIWALERGICZNE": "wskalerg.parquet",
+    "PREPARATY PRZECIWWYMIOTNE": "wskwymiot.parquet",
+    "PREPARATY SŁUŻĄCE DO ZMNIEJSZENIA WAGI CIAŁA": "wskwaga.parquet",
+    "PRZYLEPCE": "wskprz.parquet",
+}
+MIARY_KOSTKI = ['Ilość', 'Sprzedaż budżetowa']
+BEZ_PROMOCJI = "Bez promocji"  # rodzaj promocji w kostce dla sprzedaży poza promocjami
+
+
+# Funkcja wybierająca kolumnę (dostosowana do nowych nazw kolumn w Parquet)
+def wybierz_kolumne_wg(filtr: str) -> str:
+    # W plikach Parquet kolumna "Ilość" już nie ma spacji
+    return 'Sprzedaż budżetowa' if filtr == "Sprzedaż wartościowa" else 'Ilość'
+
+
+# Funkcja analizy Pareto (dostosowana do pracy z zagregowanymi danymi i filtrowaniem po roku)
+def analiza_pareto_from_agg(df_agg: pd.DataFrame, grupa_kolumna: str, filtr: str, prog: float,
+                            rok_filtr: int = None) -> tuple:
+    kol = wybierz_kolumne_wg(filtr)
+
+    df_current_year = df_agg
+    if rok_filtr is not None:
+        df_current_year = df_agg[df_agg['Rok'] == rok_filtr]
+
+    # Jeśli po filtrowaniu nie ma danych, zwróć puste wyniki
+    if df_current_year.empty:
+        return 0, 0.0, pd.DataFrame(columns=[grupa_kolumna, kol, 'Skumulowany %']), pd.Series(dtype='float64')
+
+    # Sumujemy już zagregowane dane dla danego roku/grupy
+    sprzedaz = df_current_year.groupby(grupa_kolumna)[kol].sum().sort_values(ascending=False)
+
+    # Upewniamy się, że nie dzielimy przez zero, jeśli suma sprzedaży wynosi 0
+    total_sum = sprzedaz.sum()
+    if total_sum == 0:
+        return 0, 0.0, pd.DataFrame(columns=[grupa_kolumna, kol, 'Skumulowany %']), sprzedaz
+
+    skumulowana = sprzedaz.cumsum()
+    procent = 100 * skumulowana / total_sum
+
+    ograniczone = sprzedaz[procent <= prog].to_frame(name=kol)
+    ograniczone['Skumulowany %'] = procent[procent <= prog]
+
+    liczba = len(ograniczone)
+    procent_grup = 100 * liczba / len(sprzedaz) if len(sprzedaz) > 0 else 0
+
+    return liczba, procent_grup, ograniczone, sprzedaz
+
+
+class KostkaOLAP:
+    """
+    Kostka sprzedaży trzymająca zmaterializowane agregaty (roll-upy) po podzbiorach wymiarów.
+    Zapytanie jest liczone z najmniejszego agregatu, który zawiera wszystkie potrzebne wymiary,
+    a wyniki trafiają do pamięci LRU - zmiana filtra nie wymaga ponownego przeliczania danych źródłowych.
+    """
+    WYMIARY = ('Rok', 'Miesiąc', 'Kategoria', 'Rodzaj promocji', 'Producent')
+    MIARY = ('Ilość', 'Sprzedaż budżetowa')
+
+    def __init__(self, max_wynikow: int = 256):
+        self._agregaty = {}  # frozenset(wymiary) -> DataFrame
+        self._wyniki = OrderedDict()
+        self._blokada = threading.Lock()
+        self._max_wynikow = max_wynikow
+
+    def dodaj_agregat(self, df: pd.DataFrame, wymiary) -> None:
+        wymiary = list(wymiary)
+        self._agregaty[frozenset(wymiary)] = (
+            df.groupby(wymiary, as_index=False)[list(self.MIARY)].sum()
+        )
+
+    @property
+    def pelna(self) -> bool:
+        """Czy kostka ma agregat bazowy (wszystkie wymiary naraz) - wtedy każda kombinacja filtrów jest dostępna."""
+        return frozenset(self.WYMIARY) in self._agregaty
+
+    def _najmniejszy(self, potrzebne: frozenset):
+        kandydaci = [(len(df), klucz) for klucz, df in self._agregaty.items() if potrzebne <= klucz]
+        return min(kandydaci, key=lambda k: k[0])[1] if kandydaci else None
+
+    def wartosci(self, wymiar: str) -> list:
+        klucz = self._najmniejszy(frozenset([wymiar]))
+        return sorted(self._agregaty[klucz][wymiar].unique()) if klucz is not None else []
+
+    def zestaw(self, wymiary, filtry: dict = None) -> tuple:
+        """
+        Zwraca (DataFrame z miarami zsumowanymi po `wymiary`, lista pominiętych filtrów).
+        filtry: {wymiar: (od, do)} dla zakresu albo {wymiar: lista wartości}; None oznacza brak filtra.
+        Filtr po wymiarze, którego nie da się połączyć z `wymiary` w dostępnych agregatach, jest pomijany.
+        """
+        wymiary = list(wymiary)
+        filtry = {w: v for w, v in (filtry or {}).items() if v is not None}
+        klucz_wyniku = (tuple(wymiary), tuple(sorted(
+            (w, v if isinstance(v, tuple) else tuple(sorted(v))) for w, v in filtry.items()
+        )))
+        with self._blokada:
+            if klucz_wyniku in self._wyniki:
+                self._wyniki.move_to_end(klucz_wyniku)
+                return self._wyniki[klucz_wyniku].copy(), []
+
+        pominiete = []
+        zrodlo = self._najmniejszy(frozenset(wymiary) | frozenset(filtry))
+        if zrodlo is None:
+            pominiete = [w for w in filtry if self._najmniejszy(frozenset(wymiary) | {w}) is None]
+            filtry = {w: v for w, v in filtry.items() if w not in pominiete}
+            zrodlo = self._najmniejszy(frozenset(wymiary) | frozenset(filtry))
+            if zrodlo is None:  # filtry dostępne pojedynczo, ale nie razem
+                pominiete += list(filtry)
+                filtry = {}
+                zrodlo = self._najmniejszy(frozenset(wymiary))
+        if zrodlo is None:
+            return pd.DataFrame(columns=wymiary + list(self.MIARY)), list(filtry)
+
+        df = self._agregaty[zrodlo]
+        maska = np.ones(len(df), dtype=bool)
+        for wymiar, wartosc in filtry.items():
+            if isinstance(wartosc, tuple):
+                maska &= df[wymiar].between(*wartosc).to_numpy()
+            else:
+                maska &= df[wymiar].isin(wartosc).to_numpy()
+        wynik = df[maska].groupby(wymiary, as_index=False)[list(self.MIARY)].sum()
+
+        with self._blokada:
+            if not filtry and frozenset(wymiary) not in self._agregaty:
+                self._agregaty[frozenset(wymiary)] = wynik  # materializacja nowego roll-upu
+            if not pominiete:
+                self._wyniki[klucz_wyniku] = wynik
+                if len(self._wyniki) > self._max_wynikow:
+                    self._wyniki.popitem(last=False)
+        return wynik.copy(), pominiete
+
+
+class GrafWidokow:
+    """
+    Graf zależności widoków (wykresów/tabel) od filtrów. Każdy widok to zapytanie do kostki
+    po `wymiary`, zależne od filtrów `zalezy_od`. Widok, na którym klika się w wartości wymiaru
+    (`wymiar_wyboru`), nie jest filtrowany własnym zaznaczeniem - tylko je podświetla.
+    """
+    def __init__(self):
+        self._widoki = {}  # nazwa -> (wymiary, zalezy_od, wymiar_wyboru)
+
+    def dodaj(self, nazwa: str, wymiary: list, zalezy_od=('Rok', 'Kategoria', 'Rodzaj promocji'),
+              wymiar_wyboru: str = None) -> None:
+        self._widoki[nazwa] = (list(wymiary), tuple(zalezy_od), wymiar_wyboru)
+
+    def nazwy(self) -> list:
+        return list(self._widoki)
+
+    def wymiary(self, nazwa: str) -> list:
+        return self._widoki[nazwa][0]
+
+    def zalezne_od(self, wymiar: str, krzyzowy: bool = False) -> list:
+        """Widoki do przeliczenia po zmianie filtra `wymiar` (krzyzowy=True: filtra ustawionego kliknięciem)."""
+        return [
+            nazwa for nazwa, (_, zalezy_od, wymiar_wyboru) in self._widoki.items()
+            if wymiar in zalezy_od and not (krzyzowy and wymiar_wyboru == wymiar)
+        ]
+
+    def filtry_widoku(self, nazwa: str, filtry: dict, filtry_krzyzowe: dict) -> dict:
+        """Filtry globalne zawężone filtrami krzyżowymi - z pominięciem wymiaru, który widok sam wybiera."""
+        _, zalezy_od, wymiar_wyboru = self._widoki[nazwa]
+        wynik = {}
+        for wymiar in zalezy_od:
+            wartosc = filtry.get(wymiar)
+            krzyzowy = filtry_krzyzowe.get(wymiar) if wymiar != wymiar_wyboru else None
+            if krzyzowy is not None:
+                wartosc = krzyzowy if wartosc is None else [w for w in wartosc if w in krzyzowy]
+            wynik[wymiar] = wartosc
+        return wynik
+
+
+def _na_dzien(data) -> int:
+    # Liczba dni od 1970-01-01 - wspólna skala dla wszystkich zapytań indeksu
+    return int(np.datetime64(pd.Timestamp(data), 'D').astype(np.int64))
+
+
+class IndeksPromocji:
+    """
+    Indeks przedziałów [Data od, Data do] promocji, pogrupowany po produkcie ('Id kartoteki').
+    Końce przedziałów są sortowane raz przy budowie (linia zamiatania), więc liczba promocji
+    aktywnych w dniu lub nakładających się na zakres to dwa wyszukiwania binarne - O(log n).
+    """
+
+    def __init__(self, df_promocje: pd.DataFrame):
+        od = df_promocje['Data od - promocja'].to_numpy('datetime64[D]').astype(np.int64)
+        do = df_promocje['Data do - promocja'].to_numpy('datetime64[D]').astype(np.int64)
+        id_promocji = df_promocje['Id promocji'].to_numpy()
+        self.produkty, kod = np.unique(df_promocje['Id kartoteki'].to_numpy(str), return_inverse=True)
+
+        # Dwie kopie tych samych przedziałów: posortowane po (produkt, początek) i (produkt, koniec)
+        wg_od = np.lexsort((od, kod))
+        wg_do = np.lexsort((do, kod))
+        self._kod = kod[wg_od]
+        self._od = od[wg_od]
+        self._do_wg_od = do[wg_od]
+        self._id_wg_od = id_promocji[wg_od]
+        self._do = do[wg_do]
+        # Granice fragmentów tablic należących do kolejnych produktów
+        self._granice = np.searchsorted(self._kod, np.arange(len(self.produkty) + 1))
+        # Najdłuższa promocja produktu - zawęża kandydatów przy wyszukiwaniu aktywnych promocji
+        self._maks_dlugosc = np.zeros(len(self.produkty), dtype=np.int64)
+        np.maximum.at(self._maks_dlugosc, kod, do - od)
+        self._kategorie = (
+            df_promocje.drop_duplicates('Id kartoteki').set_index('Id kartoteki')['Kategoria nazwa']
+            if 'Kategoria nazwa' in df_promocje.columns else None
+        )
+
+    def __len__(self):
+        return len(self._od)
+
+    def _fragment(self, indeks):
+        pozycja = np.searchsorted(self.produkty, str(indeks))
+        if pozycja == len(self.produkty) or self.produkty[pozycja] != str(indeks):
+            return None
+        return pozycja, self._granice[pozycja], self._granice[pozycja + 1]
+
+    def liczba_nakladajacych(self, indeks, data_od, data_do) -> int:
+        """Liczba promocji produktu, które nakładają się na zakres [data_od, data_do]."""
+        fragment = self._fragment(indeks)
+        if fragment is None:
+            return 0
+        _, lo, hi = fragment
+        # Rozpoczęte nie później niż koniec zakresu minus zakończone przed jego początkiem
+        rozpoczete = np.searchsorted(self._od[lo:hi], _na_dzien(data_do), side='right')
+        zakonczone = np.searchsorted(self._do[lo:hi], _na_dzien(data_od), side='left')
+        return int(rozpoczete - zakonczone)
+
+    def liczba_aktywnych(self, indeks, dzien) -> int:
+        """Liczba promocji produktu aktywnych w danym dniu."""
+        return self.liczba_nakladajacych(indeks, dzien, dzien)
+
+    def aktywne(self, indeks, data_od, data_do) -> np.ndarray:
+        """Identyfikatory promocji produktu nakładających się na zakres [data_od, data_do]."""
+        fragment = self._fragment(indeks)
+        if fragment is None:
+            return np.array([])
+        pozycja, lo, hi = fragment
+        od, do = _na_dzien(data_od), _na_dzien(data_do)
+        # Kandydaci: początek w [od - najdłuższa promocja, do]; pozostałe nie mogą sięgać zakresu
+        poczatki = self._od[lo:hi]
+        a = lo + np.searchsorted(poczatki, od - self._maks_dlugosc[pozycja], side='left')
+        b = lo + np.searchsorted(poczatki, do, side='right')
+        return self._id_wg_od[a:b][self._do_wg_od[a:b] >= od]
+
+    def koncentracja_miesieczna(self) -> pd.DataFrame:
+        """
+        Dla każdego produktu i miesiąca zwraca liczbę promocji aktywnych w miesiącu
+        ('Liczba promocji') oraz największą liczbę promocji trwających jednocześnie
+        w jednym dniu miesiąca ('Maks. równoległych').
+        """
+        kolumny = ['Id kartoteki', 'Rok', 'Miesiąc', 'Liczba promocji', 'Maks. równoległych']
+        if len(self) == 0:
+            return pd.DataFrame(columns=kolumny)
+
+        n_prod = len(self.produkty)
+        m_od = self._od.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        m_do = self._do_wg_od.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        m_min, m_max = m_od.min(), m_do.max()
+        n_mies = m_max - m_min + 1
+
+        # Liczba promocji w miesiącu: tablica różnicowa +1 w miesiącu startu, -1 po miesiącu końca
+        roznice = np.zeros((n_prod, n_mies + 1), dtype=np.int64)
+        np.add.at(roznice, (self._kod, m_od - m_min), 1)
+        np.add.at(roznice, (self._kod, m_do - m_min + 1), -1)
+        liczba = np.cumsum(roznice, axis=1)[:, :n_mies]
+
+        # Maksimum równoległych: zamiatanie po dniach zdarzeń (+1 w dniu startu, -1 dzień po końcu).
+        # Zdarzenia zerowe na początku każdego miesiąca przenoszą poziom do miesięcy bez zdarzeń.
+        poczatki_mies = (np.arange(m_min, m_max + 1).astype('datetime64[M]')
+                         .astype('datetime64[D]').astype(np.int64))
+        zdarzenia = pd.DataFrame({
+            'kod': np.concatenate([self._kod, self._kod, np.repeat(np.arange(n_prod), n_mies)]),
+            'dzien': np.concatenate([self._od, self._do_wg_od + 1, np.tile(poczatki_mies, n_prod)]),
+            'zmiana': np.concatenate([np.ones(len(self), dtype=np.int64),
+                                      -np.ones(len(self), dtype=np.int64),
+                                      np.zeros(n_prod * n_mies, dtype=np.int64)]),
+        })
+        poziomy = zdarzenia.groupby(['kod', 'dzien'], sort=True)['zmiana'].sum().reset_index()
+        # Suma zmian każdego produktu wynosi 0, więc wspólna suma skumulowana nie przecieka między produktami
+        poziomy['poziom'] = poziomy['zmiana'].cumsum()
+        poziomy['mies'] = (poziomy['dzien'].to_numpy().astype('datetime64[D]')
+                           .astype('datetime64[M]').astype(np.int64))
+        poziomy = poziomy[poziomy['mies'] <= m_max]
+        maks = np.zeros((n_prod, n_mies), dtype=np.int64)
+        np.maximum.at(maks, (poziomy['kod'].to_numpy(), poziomy['mies'].to_numpy() - m_min),
+                      poziomy['poziom'].to_numpy())
+
+        miesiace = np.arange(m_min, m_max + 1)
+        wynik = pd.DataFrame({
+            'Id kartoteki': np.repeat(self.produkty, n_mies),
+            'Rok': np.tile(miesiace // 12 + 1970, n_prod),
+            'Miesiąc': np.tile(miesiace % 12 + 1, n_prod),
+            'Liczba promocji': liczba.ravel(),
+            'Maks. równoległych': maks.ravel(),
+        })
+        if self._kategorie is not None:
+            wynik['Kategoria nazwa'] = wynik['Id kartoteki'].map(self._kategorie)
+        return wynik
+
+
+POZIOMY_CZASU = {'Dzień': 'D', 'Tydzień': 'W', 'Miesiąc': 'M', 'Kwartał': 'Q', 'Rok': 'Y'}
+
+
+class RollupyCzasu:
+    """
+    Sumy miar w okresach (PeriodIndex) zapisane raz na poziomie bazowym; poziomy grubsze są wyliczane
+    leniwie z najbliższego drobniejszego poziomu i pamiętane. Tygodnie nie zawierają się w miesiącach,
+    więc tydzień i miesiąc liczymy z dni, kwartał z miesięcy, a rok z kwartałów.
+    """
+    KOLEJNOSC = ['D', 'W', 'M', 'Q', 'Y']
+    ZRODLO = {'W': 'D', 'M': 'D', 'Q': 'M', 'Y': 'Q'}
+
+    def __init__(self, df_bazowy: pd.DataFrame, poziom_bazowy: str):
+        self.poziom_bazowy = poziom_bazowy
+        self._rollupy = {poziom_bazowy: df_bazowy.sort_index()}
+        self._blokada = threading.Lock()
+
+    def dostepny(self, poziom: str) -> bool:
+        while poziom != self.poziom_bazowy:
+            if poziom not in self.ZRODLO:
+                return False
+            poziom = self.ZRODLO[poziom]
+        return True
+
+    def poziom(self, poziom: str) -> pd.DataFrame:
+        with self._blokada:
+            return self._poziom(poziom)
+
+    def _poziom(self, poziom: str) -> pd.DataFrame:
+        if poziom not in self._rollupy:
+            if not self.dostepny(poziom):
+                raise KeyError(f"Poziom '{poziom}' nie wynika z poziomu bazowego '{self.poziom_bazowy}'")
+            zrodlo = self._poziom(self.ZRODLO[poziom])
+            self._rollupy[poziom] = zrodlo.groupby(zrodlo.index.asfreq(poziom)).sum()
+        return self._rollupy[poziom]
+
+    def dopisz(self, df_nowy: pd.DataFrame) -> None:
+        """Dodaje sumy na poziomie bazowym i przelicza w pamiętanych poziomach tylko okresy, których dotyczą."""
+        with self._blokada:
+            baza = self._rollupy[self.poziom_bazowy]
+            self._rollupy[self.poziom_bazowy] = baza.add(df_nowy, fill_value=0).sort_index()
+            zmienione = {self.poziom_bazowy: df_nowy.index.unique()}
+            for poziom in self.KOLEJNOSC:
+                if poziom in zmienione or poziom not in self._rollupy:
+                    continue
+                zrodlo = self._rollupy[self.ZRODLO[poziom]]
+                klucze = zmienione[self.ZRODLO[poziom]].asfreq(poziom).unique()
+                okresy = zrodlo.index.asfreq(poziom)
+                maska = okresy.isin(klucze)
+                nowe = zrodlo[maska].groupby(okresy[maska]).sum()
+                stare = self._rollupy[poziom]
+                self._rollupy[poziom] = pd.concat([stare[~stare.index.isin(klucze)], nowe]).sort_index()
+                zmienione[poziom] = klucze
+
+
+KOLUMNY_APTEK = ['Kod SAP', 'Nazwa apteki', 'Rok', 'Rodzaj promocji poziom 2', 'id promocji',
+                 'Sprzedaż ilość', 'Sprzedaż budżetowa']
+KLUCZ_APTEK = ['Kod SAP', 'Kategoria', 'Rok']
+ROZMIAR_PACZKI = 250_000  # wierszy w jednej paczce czytanej z pliku
+PROG_SCALANIA = 8  # po tylu paczkach częściowe agregaty są scalane, żeby lista nie rosła z rozmiarem pliku
+
+
+class AgregatorAptek:
+    """
+    Strumieniowa (out-of-core) agregacja sprzedaży po aptekach. Pliki sprzedaży czytane są paczkami grup
+    wierszy Parquet tylko z potrzebnymi kolumnami; każda paczka jest od razu agregowana, a częściowe wyniki
+    co PROG_SCALANIA paczek scalane - w pamięci jest naraz jedna paczka i agregaty rozmiaru liczby aptek.
+    """
+
+    def __init__(self):
+        self._sumy, self._rodzaje, self._promocje, self._nazwy = [], [], [], []
+        self.wiersze = 0
+
+    @staticmethod
+    def _scal(czesci: list, klucz: list, sumuj: bool = True) -> list:
+        df = pd.concat(czesci, ignore_index=True)
+        return [df.groupby(klucz, as_index=False).sum() if sumuj else df.drop_duplicates(klucz, ignore_index=True)]
+
+    def dodaj_plik(self, sciezka: str, kategoria: str, rozmiar_paczki: int = ROZMIAR_PACZKI):
+        for paczka in pq.ParquetFile(sciezka).iter_batches(batch_size=rozmiar_paczki, columns=KOLUMNY_APTEK):
+            self.dodaj_paczke(paczka.to_pandas(), kategoria)
+
+    def dodaj_paczke(self, df: pd.DataFrame, kategoria: str):
+        self.wiersze += len(df)
+        df['Kategoria'] = kategoria
+        df['Kod SAP'] = df['Kod SAP'].astype(str)
+        promocyjna = df['id promocji'].notna()
+        df['Ilość promocyjna'] = df['Sprzedaż ilość'].where(promocyjna, 0)
+        df['Wartość promocyjna'] = df['Sprzedaż budżetowa'].where(promocyjna, 0)
+        df['Wiersze'] = 1
+        self._sumy.append(df.groupby(KLUCZ_APTEK, as_index=False)[
+            ['Sprzedaż ilość', 'Sprzedaż budżetowa', 'Ilość promocyjna', 'Wartość promocyjna', 'Wiersze']].sum())
+        w_promocji = df[promocyjna].rename(columns={'Rodzaj promocji poziom 2': 'Rodzaj promocji'})
+        self._rodzaje.append(w_promocji.groupby(KLUCZ_APTEK + ['Rodzaj promocji'], as_index=False)[
+            ['Sprzedaż ilość', 'Sprzedaż budżetowa']].sum())
+        self._promocje.append(w_promocji[KLUCZ_APTEK + ['id promocji']].drop_duplicates())
+        self._nazwy.append(df[['Kod SAP', 'Nazwa apteki']].drop_duplicates('Kod SAP'))
+        if len(self._sumy) >= PROG_SCALANIA:
+            self._sumy = self._scal(self._sumy, KLUCZ_APTEK)
+            self._rodzaje = self._scal(self._rodzaje, KLUCZ_APTEK + ['Rodzaj promocji'])
+            self._promocje = self._scal(self._promocje, KLUCZ_APTEK + ['id promocji'], sumuj=False)
+            self._nazwy = self._scal(self._nazwy, ['Kod SAP'], sumuj=False)
+
+    def wyniki(self) -> dict:
+        """Sumy aptek, sprzedaż wg rodzaju promocji, użyte promocje i nazwy aptek (po scaleniu wszystkich paczek)."""
+        if not self._sumy:
+            return {}
+        return {
+            'sumy': self._scal(self._sumy, KLUCZ_APTEK)[0],
+            'rodzaje': self._scal(self._rodzaje, KLUCZ_APTEK + ['Rodzaj promocji'])[0],
+            'promocje': self._scal(self._promocje, KLUCZ_APTEK + ['id promocji'], sumuj=False)[0],
+            'nazwy': self._scal(self._nazwy, ['Kod SAP'], sumuj=False)[0].set_index('Kod SAP')['Nazwa apteki'],
+        }
+
+
+class UdzialyProduktow:
+    """
+    Połączenie sprzedaży NEUCA z rynkiem na poziomie (Indeks, Rok, Miesiąc), zbudowane raz.
+    Klucz (kod produktu, numer miesiąca) jest kodowany w int64 i trzymany w pd.Index (tablica haszująca),
+    więc pojedyncze odczyty i złączenie to get_indexer, a rankingi roczne - np.bincount po kodach produktów.
+    """
+    MIARY = {
+        "Sprzedaż ilościowa": ('Sprzedaż ilość', 'Sprzedaż rynek ilość'),
+        "Sprzedaż wartościowa": ('Sprzedaż budżetowa', 'Sprzedaż rynek wartość'),
+    }
+
+    def __init__(self, sprzedaz: pd.DataFrame, rynek: pd.DataFrame):
+        # Klucz musi być unikalny - ewentualne powtórzenia wierszy rynku sumujemy
+        rynek = rynek.groupby(['Indeks', 'Rok', 'Miesiąc'], as_index=False, sort=False).agg(
+            {'Kategoria nazwa': 'first', 'Sprzedaż rynek ilość': 'sum', 'Sprzedaż rynek wartość': 'sum'})
+        self.produkty, kody_rynek = np.unique(rynek['Indeks'].to_numpy(str), return_inverse=True)
+        miesiace_rynek = rynek['Rok'].to_numpy(np.int64) * 12 + rynek['Miesiąc'].to_numpy(np.int64) - 1
+        self._indeks = pd.Index(kody_rynek.astype(np.int64) * 100_000 + miesiace_rynek)
+
+        # Sprzedaż NEUCA produktów spoza danych rynkowych nie ma udziału - pomijamy ją przy złączeniu
+        kody_sprz = np.searchsorted(self.produkty, sprzedaz['Indeks'].to_numpy(str))
+        kody_sprz = np.minimum(kody_sprz, len(self.produkty) - 1)
+        na_rynku = self.produkty[kody_sprz] == sprzedaz['Indeks'].to_numpy(str)
+        miesiace_sprz = sprzedaz['Rok'].to_numpy(np.int64) * 12 + sprzedaz['Miesiąc'].to_numpy(np.int64) - 1
+        pozycje = self._indeks.get_indexer(kody_sprz[na_rynku].astype(np.int64) * 100_000 + miesiace_sprz[na_rynku])
+
+        self.kod = kody_rynek
+        self.miesiac = miesiace_rynek
+        self.kategoria = rynek['Kategoria nazwa'].to_numpy(str)
+        self.dane = {}
+        for kol_neuca, kol_rynek in self.MIARY.values():
+            neuca = np.zeros(len(rynek))
+            trafione = pozycje >= 0
+            np.add.at(neuca, pozycje[trafione], sprzedaz[kol_neuca].to_numpy(float)[na_rynku][trafione])
+            self.dane[kol_neuca] = neuca
+            self.dane[kol_rynek] = rynek[kol_rynek].to_numpy(float)
+        self._wiersze_produktu = np.split(np.argsort(self.kod, kind='stable'),
+                                          np.cumsum(np.bincount(self.kod, minlength=len(self.produkty)))[:-1])
+
+    def __len__(self):
+        return len(self._indeks)
+
+    @property
+    def lata(self) -> list:
+        return sorted(set((self.miesiac // 12).tolist()))
+
+    def wiersz(self, indeks: str, rok: int, miesiac: int) -> dict:
+        """Sprzedaż NEUCA i rynku produktu w miesiącu (pusty słownik, gdy brak danych)."""
+        kod = np.searchsorted(self.produkty, indeks)
+        if kod >= len(self.produkty) or self.produkty[kod] != indeks:
+            return {}
+        pozycja = self._indeks.get_indexer([kod * 100_000 + rok * 12 + miesiac - 1])[0]
+        return {} if pozycja < 0 else {kolumna: wartosci[pozycja] for kolumna, wartosci in self.dane.items()}
+
+    def szereg(self, indeks: str, miara: str) -> pd.DataFrame:
+        """Miesięczne udziały produktu (drill-down) - wiersze produktu odczytane z indeksu, bez złączeń."""
+        kod = np.searchsorted(self.produkty, indeks)
+        if kod >= len(self.produkty) or self.produkty[kod] != indeks:
+            return pd.DataFrame(columns=['Rok', 'Miesiąc', 'NEUCA', 'Rynek', 'Udział (%)'])
+        wiersze = self._wiersze_produktu[kod]
+        kol_neuca, kol_rynek = self.MIARY[miara]
+        df = pd.DataFrame({
+            'Rok': self.miesiac[wiersze] // 12,
+            'Miesiąc': self.miesiac[wiersze] % 12 + 1,
+            'NEUCA': self.dane[kol_neuca][wiersze],
+            'Rynek': self.dane[kol_rynek][wiersze],
+        }).sort_values(['Rok', 'Miesiąc'], ignore_index=True)
+        df['Udział (%)'] = 100 * df['NEUCA'] / df['Rynek'].where(df['Rynek'] > 0)
+        return df
+
+    def udzialy_roczne(self, rok: int, miara: str, kategorie=None) -> pd.DataFrame:
+        """Roczna sprzedaż NEUCA, rynku i udział (%) każdego produktu (opcjonalnie tylko z wybranych kategorii)."""
+        kol_neuca, kol_rynek = self.MIARY[miara]
+        maska = self.miesiac // 12 == rok
+        if kategorie is not None:
+            maska &= np.isin(self.kategoria, kategorie)
+        neuca = np.bincount(self.kod[maska], self.dane[kol_neuca][maska], minlength=len(self.produkty))
+        rynek = np.bincount(self.kod[maska], self.dane[kol_rynek][maska], minlength=len(self.produkty))
+        obecne = rynek > 0
+        return pd.DataFrame({
+            'Indeks': self.produkty[obecne],
+            'NEUCA': neuca[obecne],
+            'Rynek': rynek[obecne],
+            'Udział (%)': 100 * neuca[obecne] / rynek[obecne],
+        })
+
+    def zmiany_rr(self, rok: int, miara: str, kategorie=None) -> pd.DataFrame:
+        """Zmiana udziału (pp) produktów obecnych na rynku w roku `rok` i poprzednim."""
+        biezacy = self.udzialy_roczne(rok, miara, kategorie)
+        poprzedni = self.udzialy_roczne(rok - 1, miara, kategorie)
+        df = biezacy.merge(poprzedni[['Indeks', 'Udział (%)']], on='Indeks', suffixes=('', ' rok wcześniej'))
+        df['Zmiana (pp)'] = df['Udział (%)'] - df['Udział (%) rok wcześniej']
+        return df
+
+
+WYMIARY_HIERARCHII = ['Kategoria', 'Producent', 'Indeks', 'Rok', 'Miesiąc']
+
+
+def agreguj_hierarchie_kategorii(kategoria: str, katalog: str = ".") -> pd.DataFrame:
+    """Liście hierarchii sprzedaży jednej kategorii: suma ilości i wartości per producent, produkt i miesiąc."""
+    sprzedaz = pd.read_parquet(
+        os.path.join(katalog, f"sprzedaz_{kategorie_pliki[kategoria]}.parquet"),
+        columns=['Rok', 'Miesiąc', 'Producent sprzedażowy kod', 'Indeks', 'Sprzedaż ilość', 'Sprzedaż budżetowa'],
+    )
+    sprzedaz = sprzedaz.rename(columns={'Producent sprzedażowy kod': 'Producent', 'Sprzedaż ilość': 'Ilość'})
+    sprzedaz['Kategoria'] = kategoria
+    sprzedaz['Producent'] = sprzedaz['Producent'].astype(str)
+    sprzedaz['Indeks'] = sprzedaz['Indeks'].astype(str)
+    return sprzedaz.groupby(WYMIARY_HIERARCHII, as_index=False)[MIARY_KOSTKI].sum()
+
+
+class HierarchiaSprzedazy:
+    """
+    Hierarchia kategoria → producent → produkt → miesiąc. Sumy pośrednie każdego poziomu są liczone raz
+    przy budowie i trzymane z posortowanym MultiIndexem, więc rozwinięcie węzła to odczyt .loc, a nie groupby.
+    """
+    MIARY = KostkaOLAP.MIARY
+
+    def __init__(self, liscie: pd.DataFrame):
+        miary = list(self.MIARY)
+        self.produkty = liscie.groupby(['Rok', 'Producent', 'Indeks', 'Kategoria'])[miary].sum().sort_index()
+        # Miesiące producenta rozbite na kategorie w kolumnach - filtr kategorii to suma wybranych kolumn
+        self.miesiace_producenta = liscie.pivot_table(
+            index=['Rok', 'Producent', 'Miesiąc'], columns='Kategoria', values=miary, aggfunc='sum', fill_value=0
+        ).sort_index()
+        self.miesiace_produktu = liscie.groupby(['Rok', 'Indeks', 'Miesiąc'])[miary].sum().sort_index()
+
+    @staticmethod
+    def _wezel(sumy: pd.DataFrame, klucz: tuple) -> pd.DataFrame:
+        try:
+            return sumy.loc[klucz]
+        except KeyError:
+            return sumy.iloc[:0].droplevel(list(range(len(klucz))))
+
+    def produkty_producenta(self, rok: int, producent: str, miara: str, kategorie=None) -> pd.DataFrame:
+        """Produkty producenta w roku (malejąco wg miary) z udziałem w jego sprzedaży."""
+        df = self._wezel(self.produkty, (rok, producent)).reset_index()
+        if kategorie is not None:
+            df = df[df['Kategoria'].isin(kategorie)]
+        df = df.sort_values(miara, ascending=False).set_index('Indeks')
+        suma = df[miara].sum()
+        df['Udział w producencie (%)'] = 100 * df[miara] / suma if suma else 0.0
+        return df
+
+    def trend_producenta(self, rok: int, producent: str, miara: str, kategorie=None) -> pd.Series:
+        wezel = self._wezel(self.miesiace_producenta, (rok, producent))[miara]
+        if kategorie is not None:
+            wezel = wezel[wezel.columns.intersection(kategorie)]
+        return wezel.sum(axis=1)
+
+    def trend_produktu(self, rok: int, indeks: str, miara: str) -> pd.Series:
+        return self._wezel(self.miesiace_produktu, (rok, indeks))[miara]
+
+
+def macierz_miesieczna(df, kolumna, produkty, m_min, n_mies):
+    # Gęsta macierz produkt x miesiąc (NaN tam, gdzie brak wiersza) dla kolumny z danymi miesięcznymi
+    macierz = np.full((len(produkty), n_mies), np.nan)
+    if len(produkty) == 0:
+        return macierz
+    indeksy = df['Indeks'].to_numpy(str)
+    wiersze = np.minimum(np.searchsorted(produkty, indeksy), len(produkty) - 1)
+    miesiace = df['Rok'].to_numpy(np.int64) * 12 + df['Miesiąc'].to_numpy(np.int64) - 1 - m_min
+    poprawne = (produkty[wiersze] == indeksy) & (miesiace >= 0) & (miesiace < n_mies)
+    macierz[wiersze[poprawne], miesiace[poprawne]] = df[kolumna].to_numpy(float)[poprawne]
+    return macierz
+
+
+def sumy_okien(macierz, wiersze, od, do):
+    """
+    Sumy macierzy w oknach miesięcy [od, do] (włącznie) dla wielu wierszy naraz - z sum prefiksowych.
+    Okno wychodzące poza zakres danych albo zawierające brakujący miesiąc daje NaN.
+    """
+    n_mies = macierz.shape[1]
+    zera = np.zeros((macierz.shape[0], 1))
+    prefiks = np.hstack([zera, np.cumsum(np.nan_to_num(macierz), axis=1)])
+    braki = np.hstack([zera, np.cumsum(np.isnan(macierz), axis=1)])
+
+    poprawne = (od >= 0) & (do < n_mies) & (od <= do)
+    a, b = np.clip(od, 0, n_mies - 1), np.clip(do, 0, n_mies - 1) + 1
+    sumy = prefiks[wiersze, b] - prefiks[wiersze, a]
+    niepelne = (braki[wiersze, b] - braki[wiersze, a]) > 0
+    return np.where(poprawne & ~niepelne, sumy, np.nan)
+
+
+def oblicz_uplift_promocji(df_promocje: pd.DataFrame, sprzedaz_mies: pd.DataFrame,
+                           rodzaje_promocji: pd.Series, rynek: pd.DataFrame) -> pd.DataFrame:
+    """
+    Uplift każdej promocji liczony na udziale NEUCA w rynku produktu (sprzedaż / sprzedaż rynku):
+    - 'Uplift vs przed (%)' - okres promocji względem tak samo długiego okresu tuż przed nią,
+    - 'Uplift r/r (%)' - okres promocji względem tych samych miesięcy rok wcześniej.
+    Wszystkie okna liczone są jednocześnie dla wszystkich promocji na macierzach produkt x miesiąc.
+    """
+    if df_promocje.empty or sprzedaz_mies.empty:
+        return pd.DataFrame()
+
+    m_sprzedaz = sprzedaz_mies['Rok'].astype(np.int64) * 12 + sprzedaz_mies['Miesiąc'].astype(np.int64) - 1
+    m_min, n_mies = int(m_sprzedaz.min()), int(m_sprzedaz.max() - m_sprzedaz.min() + 1)
+    produkty = np.unique(np.concatenate([sprzedaz_mies['Indeks'].to_numpy(str),
+                                         df_promocje['Id kartoteki'].to_numpy(str)]))
+
+    sprzedaz = macierz_miesieczna(sprzedaz_mies, 'Sprzedaż ilość', produkty, m_min, n_mies)
+    # Brak wiersza sprzedaży w miesiącu oznacza zerową sprzedaż, a nie brak danych
+    sprzedaz = np.nan_to_num(sprzedaz)
+    rynek_ilosc = macierz_miesieczna(rynek, 'Sprzedaż rynek ilość', produkty, m_min, n_mies)
+
+    wiersze = np.searchsorted(produkty, df_promocje['Id kartoteki'].to_numpy(str))
+    m_od = (df_promocje['Data od - promocja'].dt.year.to_numpy(np.int64) * 12
+            + df_promocje['Data od - promocja'].dt.month.to_numpy(np.int64) - 1 - m_min)
+    m_do = (df_promocje['Data do - promocja'].dt.year.to_numpy(np.int64) * 12
+            + df_promocje['Data do - promocja'].dt.month.to_numpy(np.int64) - 1 - m_min)
+    dlugosc = m_do - m_od + 1
+
+    okna = {
+        'w trakcie': (m_od, m_do),
+        'przed': (m_od - dlugosc, m_od - 1),
+        'rok wcześniej': (m_od - 12, m_do - 12),
+    }
+    udzialy = {}
+    wynik = df_promocje[['Id promocji', 'Id kartoteki', 'Id producenta sprzedaży', 'Kategoria nazwa',
+                         'Data od - promocja', 'Data do - promocja']].copy()
+    wynik['Rodzaj promocji'] = wynik['Id promocji'].map(rodzaje_promocji)
+    for nazwa, (od, do) in okna.items():
+        s = sumy_okien(sprzedaz, wiersze, od, do)
+        r = sumy_okien(rynek_ilosc, wiersze, od, do)
+        wynik[f'Sprzedaż {nazwa}'] = s
+        with np.errstate(divide='ignore', invalid='ignore'):
+            udzialy[nazwa] = np.where(r > 0, s / r, np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wynik['Uplift vs przed (%)'] = np.where(
+            udzialy['przed'] > 0, 100 * (udzialy['w trakcie'] / udzialy['przed'] - 1), np.nan)
+        wynik['Uplift r/r (%)'] = np.where(
+            udzialy['rok wcześniej'] > 0, 100 * (udzialy['w trakcie'] / udzialy['rok wcześniej'] - 1), np.nan)
+    return wynik
+
+
+SIATKA_HW = np.array(np.meshgrid(
+    [0.1, 0.3, 0.5, 0.7, 0.9],   # alfa - poziom
+    [0.01, 0.1, 0.3],            # beta - trend
+    [0.05, 0.2, 0.5],            # gamma - sezonowość
+)).reshape(3, -1)
+
+
+def holt_winters_wsadowo(szeregi: np.ndarray, horyzont: int, sezon: int = 12, z: float = 1.96) -> tuple:
+    """
+    Dopasowuje addytywny model Holta-Wintersa do wszystkich wierszy macierzy (szeregi x miesiące) naraz:
+    pętla idzie tylko po czasie, a szeregi i punkty siatki parametrów są wymiarami tablic NumPy.
+    Dla każdego szeregu wybierane są parametry z najmniejszym błędem prognoz jednokrokowych.
+    Zwraca (prognoza, dolna, górna) - macierze (szeregi x horyzont) z przedziałem ~95%.
+    """
+    y = np.nan_to_num(np.asarray(szeregi, dtype=float))
+    liczba, dlugosc = y.shape
+    if dlugosc < 2 * sezon:
+        raise ValueError(f"Holt-Winters wymaga co najmniej {2 * sezon} miesięcy historii (jest {dlugosc})")
+    alfa, beta, gamma = (p[:, None] for p in SIATKA_HW)  # (G, 1) - rozgłaszane na szeregi
+
+    # Inicjalizacja z dwóch pierwszych sezonów; wygładzanie od drugiego sezonu
+    poziom = np.broadcast_to(y[:, :sezon].mean(axis=1), (len(SIATKA_HW[0]), liczba)).copy()
+    trend = np.broadcast_to((y[:, sezon:2 * sezon].mean(axis=1) - y[:, :sezon].mean(axis=1)) / sezon,
+                            poziom.shape).copy()
+    sezonowe = np.broadcast_to(y[:, :sezon] - y[:, :sezon].mean(axis=1, keepdims=True),
+                               poziom.shape + (sezon,)).copy()
+    sse = np.zeros(poziom.shape)
+    for t in range(sezon, dlugosc):
+        s_t = sezonowe[:, :, t % sezon]
+        blad = y[:, t] - (poziom + trend + s_t)
+        sse += blad ** 2
+        nowy_poziom = alfa * (y[:, t] - s_t) + (1 - alfa) * (poziom + trend)
+        trend = beta * (nowy_poziom - poziom) + (1 - beta) * trend
+        sezonowe[:, :, t % sezon] = gamma * (y[:, t] - nowy_poziom) + (1 - gamma) * s_t
+        poziom = nowy_poziom
+
+    najlepszy = sse.argmin(axis=0)
+    kolumny = np.arange(liczba)
+    poziom, trend = poziom[najlepszy, kolumny], trend[najlepszy, kolumny]
+    sezonowe = sezonowe[najlepszy, kolumny]
+    sigma2 = sse[najlepszy, kolumny] / (dlugosc - sezon)
+    a, b, g = (p[najlepszy] for p in SIATKA_HW)
+
+    kroki = np.arange(1, horyzont + 1)
+    prognoza = poziom[:, None] + kroki * trend[:, None] + sezonowe[:, (dlugosc + kroki - 1) % sezon]
+    # Wariancja prognozy h-krokowej: sigma^2 * (1 + sum_{j<h} c_j^2), c_j = alfa(1 + j*beta) + gamma*[j mod m = 0]
+    j = np.arange(1, horyzont)
+    c = a[:, None] * (1 + j * b[:, None]) + g[:, None] * (j % sezon == 0)
+    wariancja = sigma2[:, None] * (1 + np.hstack([np.zeros((liczba, 1)), np.cumsum(c ** 2, axis=1)]))
+    margines = z * np.sqrt(wariancja)
+    return np.clip(prognoza, 0, None), np.clip(prognoza - margines, 0, None), prognoza + margines
+
+
+def wersja_plikow(pliki: list) -> tuple:
+    """Wersja danych (czas modyfikacji i rozmiar każdego pliku) - klucz cache dla wyników liczonych z tych plików."""
+    wersja = []
+    for filename in pliki:
+        stat = os.stat(filename) if os.path.exists(filename) else None
+        wersja.append((filename, stat.st_mtime_ns if stat else 0, stat.st_size if stat else 0))
+    return tuple(wersja)
+
+
+def wersja_zrodel(pliki: list) -> str:
+    """Skrót treści plików źródłowych i wersji bibliotek - wersja kodu w kluczach cache dyskowego."""
+    h = hashlib.sha256(f"pandas {pd.__version__}|numpy {np.__version__}".encode())
+    for plik in pliki:
+        with open(plik, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def odcisk_danych(obiekt, h) -> None:
+    """Dopisuje do skrótu h zawartość argumentu: ramki i serie przez hash_pandas_object, kontenery rekurencyjnie."""
+    h.update(type(obiekt).__name__.encode())
+    if isinstance(obiekt, (pd.DataFrame, pd.Series)):
+        if isinstance(obiekt, pd.DataFrame):
+            h.update(repr((obiekt.shape, list(obiekt.columns), list(obiekt.dtypes))).encode())
+        else:
+            h.update(repr((obiekt.shape, obiekt.name, obiekt.dtype)).encode())
+        try:
+            h.update(pd.util.hash_pandas_object(obiekt, index=True).to_numpy().tobytes())
+        except TypeError:  # niehaszowalne wartości w komórkach (np. listy)
+            h.update(pickle.dumps(obiekt))
+    elif isinstance(obiekt, np.ndarray):
+        h.update(repr((obiekt.shape, obiekt.dtype)).encode())
+        h.update(np.ascontiguousarray(obiekt).tobytes())
+    elif isinstance(obiekt, dict):
+        for klucz in sorted(obiekt, key=repr):
+            odcisk_danych(klucz, h)
+            odcisk_danych(obiekt[klucz], h)
+    elif isinstance(obiekt, (list, tuple)):
+        h.update(str(len(obiekt)).encode())
+        for element in obiekt:
+            odcisk_danych(element, h)
+    elif obiekt is None or isinstance(obiekt, (str, bytes, int, float, bool, np.generic)):
+        h.update(repr(obiekt).encode())
+    else:  # repr innych obiektów może zawierać adres w pamięci - bierzemy ich zawartość
+        h.update(pickle.dumps(obiekt))
+
+
+def klucz_wywolania(funkcja, wersja_kodu: str, args: tuple, kwargs: dict) -> str:
+    """Klucz wyniku w cache: nazwa funkcji, wersja kodu i odcisk argumentów."""
+    h = hashlib.sha256(f"{funkcja.__module__}.{funkcja.__qualname__}|{wersja_kodu}".encode())
+    odcisk_danych(args, h)
+    odcisk_danych(kwargs, h)
+    return h.hexdigest()
+
+
+class CacheDyskowy:
+    """
+    Wyniki pochodne (ramki, krotki, figury Plotly) zapisane na dysku, żeby restart i ponowne wdrożenie
+    zaczynały od gotowych wyników. Klucz to skrót z nazwy funkcji, wersji kodu i odcisku danych wejściowych;
+    figury zapisujemy jako JSON Plotly, pozostałe wyniki jako pickle. Łączny rozmiar katalogu jest ograniczony -
+    odczyt odświeża czas modyfikacji pliku, a przy zapisie usuwane są najdawniej używane wpisy (LRU).
+
+    Dekorator zapamietaj() stosujemy pod CachePamieci.zapamietaj: pamięć procesu obsługuje kolejne przebiegi,
+    dysk - pierwsze wywołanie po starcie.
+    """
+
+    def __init__(self, katalog: str, limit_bajtow: int, wersja_kodu: str = ""):
+        self.katalog = katalog
+        self.limit_bajtow = limit_bajtow
+        self.wersja_kodu = wersja_kodu
+        self.trafienia = 0
+        self.chybienia = 0
+        self._blokada = threading.Lock()
+
+    def _sciezka(self, klucz: str, rozszerzenie: str) -> str:
+        return os.path.join(self.katalog, klucz + rozszerzenie)
+
+    def odczytaj(self, klucz: str):
+        """Zwraca (True, wynik) albo (False, None), gdy wpisu nie ma lub jest uszkodzony."""
+        for rozszerzenie in ('.pkl', '.json'):
+            sciezka = self._sciezka(klucz, rozszerzenie)
+            try:
+                if rozszerzenie == '.json':
+                    import plotly.io as pio  # figury wczytujemy dopiero, gdy są na dysku
+                    with open(sciezka, encoding='utf-8') as f:
+                        wynik = pio.from_json(f.read())
+                else:
+                    with open(sciezka, 'rb') as f:
+                        wynik = pickle.load(f)
+            except FileNotFoundError:
+                continue
+            except Exception:  # plik przerwany w trakcie zapisu lub z niezgodnej wersji biblioteki
+                self._usun(sciezka)
+                continue
+            try:
+                os.utime(sciezka)  # ostatnie użycie - kolejność usuwania LRU
+            except OSError:
+                pass
+            return True, wynik
+        return False, None
+
+    def zapisz(self, klucz: str, wynik) -> None:
+        os.makedirs(self.katalog, exist_ok=True)
+        if hasattr(wynik, 'to_plotly_json'):
+            sciezka, dane = self._sciezka(klucz, '.json'), wynik.to_json().encode('utf-8')
+        else:
+            sciezka, dane = self._sciezka(klucz, '.pkl'), pickle.dumps(wynik, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(dane) > self.limit_bajtow:
+            return
+        tymczasowa = f"{sciezka}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tymczasowa, 'wb') as f:
+            f.write(dane)
+        os.replace(tymczasowa, sciezka)  # atomowo - równoległe procesy nie zobaczą połowy pliku
+        self.przytnij()
+
+    def przytnij(self) -> None:
+        """Usuwa najdawniej używane wpisy, aż łączny rozmiar zmieści się w limicie."""
+        with self._blokada:
+            wpisy = []
+            for wpis in os.scandir(self.katalog):
+                if wpis.name.endswith(('.pkl', '.json')):
+                    try:
+                        stat = wpis.stat()
+                    except FileNotFoundError:
+                        continue
+                    wpisy.append((stat.st_mtime_ns, stat.st_size, wpis.path))
+            rozmiar = sum(w[1] for w in wpisy)
+            for _, wielkosc, sciezka in sorted(wpisy):
+                if rozmiar <= self.limit_bajtow:
+                    break
+                self._usun(sciezka)
+                rozmiar -= wielkosc
+
+    @staticmethod
+    def _usun(sciezka: str) -> None:
+        try:
+            os.remove(sciezka)
+        except FileNotFoundError:
+            pass
+
+    def zapamietaj(self, funkcja):
+        @functools.wraps(funkcja)
+        def opakowanie(*args, **kwargs):
+            klucz = klucz_wywolania(funkcja, self.wersja_kodu, args, kwargs)
+            jest, wynik = self.odczytaj(klucz)
+            if jest:
+                self.trafienia += 1
+                return wynik
+            self.chybienia += 1
+            wynik = funkcja(*args, **kwargs)
+            try:
+                self.zapisz(klucz, wynik)
+            except OSError:  # brak miejsca lub uprawnień - wynik i tak zwracamy
+                pass
+            return wynik
+        return opakowanie
+
+
+class CachePamieci:
+    """
+    Cache wyników w pamięci procesu ze wspólnym budżetem bajtów dla wszystkich funkcji. Jak st.cache_data
+    trzyma wyniki zserializowane (pickle), więc każde trafienie zwraca kopię, a rozmiar wpisu jest znany
+    dokładnie. Po przekroczeniu budżetu usuwane są najdawniej używane wpisy (LRU), niezależnie od funkcji;
+    max_wpisow dodatkowo ogranicza liczbę wpisów jednej funkcji. Równoczesne wywołania z tym samym
+    kluczem liczą wynik raz.
+    """
+
+    def __init__(self, limit_bajtow: int, wersja_kodu: str = ""):
+        self.limit_bajtow = limit_bajtow
+        self.wersja_kodu = wersja_kodu
+        self.rozmiar = 0
+        self._wpisy = OrderedDict()  # klucz -> (funkcja, zserializowany wynik); od najdawniej używanego
+        self._statystyki = {}  # funkcja -> {'wpisy', 'bajty', 'trafienia', 'chybienia', 'usuniete'}
+        self._obliczane = {}  # klucz -> blokada liczenia
+        self._blokada = threading.Lock()
+
+    def _funkcja(self, nazwa: str) -> dict:
+        return self._statystyki.setdefault(nazwa, dict(wpisy=0, bajty=0, trafienia=0, chybienia=0, usuniete=0))
+
+    def _pobierz(self, klucz: str):
+        with self._blokada:
+            wpis = self._wpisy.get(klucz)
+            if wpis is None:
+                return None
+            self._wpisy.move_to_end(klucz)
+            self._funkcja(wpis[0])['trafienia'] += 1
+            return wpis[1]
+
+    def _chybienie(self, nazwa: str) -> None:
+        with self._blokada:
+            self._funkcja(nazwa)['chybienia'] += 1
+
+    def _usun(self, klucz: str) -> None:
+        nazwa, dane = self._wpisy.pop(klucz)
+        statystyki = self._funkcja(nazwa)
+        statystyki['wpisy'] -= 1
+        statystyki['bajty'] -= len(dane)
+        statystyki['usuniete'] += 1
+        self.rozmiar -= len(dane)
+
+    def _zapisz(self, nazwa: str, klucz: str, dane: bytes, max_wpisow: int = None) -> None:
+        with self._blokada:
+            statystyki = self._funkcja(nazwa)
+            if len(dane) > self.limit_bajtow:
+                return
+            self._wpisy[klucz] = (nazwa, dane)
+            statystyki['wpisy'] += 1
+            statystyki['bajty'] += len(dane)
+            self.rozmiar += len(dane)
+            if max_wpisow is not None and statystyki['wpisy'] > max_wpisow:
+                self._usun(next(k for k, (n, _) in self._wpisy.items() if n == nazwa))
+            while self.rozmiar > self.limit_bajtow:
+                self._usun(next(iter(self._wpisy)))
+
+    def zapamietaj(self, funkcja=None, *, max_wpisow: int = None):
+        """Dekorator: @cache.zapamietaj albo @cache.zapamietaj(max_wpisow=32)."""
+        if funkcja is None:
+            return functools.partial(self.zapamietaj, max_wpisow=max_wpisow)
+        nazwa = funkcja.__qualname__
+
+        @functools.wraps(funkcja)
+        def opakowanie(*args, **kwargs):
+            klucz = klucz_wywolania(funkcja, self.wersja_kodu, args, kwargs)
+            dane = self._pobierz(klucz)
+            if dane is not None:
+                return pickle.loads(dane)
+            with self._blokada:
+                blokada_klucza = self._obliczane.setdefault(klucz, threading.Lock())
+            with blokada_klucza:
+                dane = self._pobierz(klucz)  # policzone przez inne wywołanie, na które czekaliśmy
+                if dane is not None:
+                    return pickle.loads(dane)
+                # Chybienie liczymy przed wywołaniem - wywołanie zakończone wyjątkiem też jest chybieniem
+                self._chybienie(nazwa)
+                try:
+                    wynik = funkcja(*args, **kwargs)
+                    self._zapisz(nazwa, klucz, pickle.dumps(wynik, protocol=pickle.HIGHEST_PROTOCOL), max_wpisow)
+                finally:
+                    with self._blokada:
+                        self._obliczane.pop(klucz, None)
+            return wynik
+        return opakowanie
+
+    @property
+    def trafienia_proc(self) -> float:
+        trafienia = sum(s['trafienia'] for s in self._statystyki.values())
+        wywolania = trafienia + sum(s['chybienia'] for s in self._statystyki.values())
+        return 100 * trafienia / wywolania if wywolania else 0.0
+
+    def raport(self) -> pd.DataFrame:
+        """Wpisy, rozmiar rezydentny i skuteczność cache dla każdej funkcji."""
+        with self._blokada:
+            df = pd.DataFrame.from_dict(self._statystyki, orient='index')
+        if df.empty:
+            return pd.DataFrame(columns=['Funkcja', 'Wpisy', 'Rozmiar [MB]', 'Trafienia (%)', 'Trafienia', 'Chybienia', 'Usunięte'])
+        wywolania = df['trafienia'] + df['chybienia']
+        return pd.DataFrame({
+            'Funkcja': df.index,
+            'Wpisy': df['wpisy'],
+            'Rozmiar [MB]': (df['bajty'] / 1024 ** 2).round(2),
+            'Trafienia (%)': (100 * df['trafienia'] / wywolania.where(wywolania > 0)).round(1),
+            'Trafienia': df['trafienia'],
+            'Chybienia': df['chybienia'],
+            'Usunięte': df['usuniete'],
+        }).sort_values('Rozmiar [MB]', ascending=False, ignore_index=True)
+
+
+def kopia_plytka(wynik):
+    """Nowe obiekty ramek/serii na tych samych buforach - przypisanie kolumny w sesji nie zmienia danych innych sesji."""
+    if isinstance(wynik, (pd.DataFrame, pd.Series)):
+        return wynik.copy(deep=False)
+    if isinstance(wynik, dict):
+        return {klucz: kopia_plytka(wartosc) for klucz, wartosc in wynik.items()}
+    if isinstance(wynik, tuple):
+        return tuple(kopia_plytka(wartosc) for wartosc in wynik)
+    return wynik
+
+
+class MagazynMigawek:
+    """
+    Migawki wczytanych danych w plikach Arrow IPC (bez kompresji), mapowane do pamięci (mmap). Kolumny liczbowe,
+    dat i tekstowe są widokami na zmapowany plik, więc wszystkie sesje i wszystkie procesy serwera czytają
+    jedną fizyczną kopię danych z page cache zamiast własnych kopii z pickle.
+
+    Dekorator mapuj(pliki) opakowuje loader: klucz migawki to nazwa funkcji, wersja kodu, argumenty i wersja
+    plików źródłowych (czas modyfikacji, rozmiar). Pierwszy proces, który nie znajdzie migawki, wywołuje loader
+    i zapisuje wynik (ramkę, serię albo słownik/krotkę z nich); pozostałe tylko ją mapują. Puste wyniki
+    (brak plików, błędy) nie są zapisywane, żeby loader przy kolejnym przebiegu znów pokazał komunikat.
+    Każde wywołanie zwraca płytką kopię - przy Copy-on-Write zapis w sesji kopiuje tylko zmienianą kolumnę.
+    """
+
+    def __init__(self, katalog: str, wersja_kodu: str = ""):
+        self.katalog = katalog
+        self.wersja_kodu = wersja_kodu
+        self._zmapowane = {}  # (funkcja, argumenty) -> (klucz, wynik na zmapowanych plikach)
+        self._obliczane = {}
+        self._blokada = threading.Lock()
+
+    @staticmethod
+    def _pusty(wynik) -> bool:
+        if isinstance(wynik, (pd.DataFrame, pd.Series)):
+            return wynik.empty
+        if isinstance(wynik, (dict, tuple)):
+            wartosci = wynik.values() if isinstance(wynik, dict) else wynik
+            return len(wynik) == 0 or all(MagazynMigawek._pusty(w) for w in wartosci)
+        return False
+
+    @staticmethod
+    def _rozloz(wynik, ramki: list):
+        """Struktura wyniku z numerami ramek; ramki trafiają do listy w kolejności plików."""
+        if isinstance(wynik, pd.DataFrame):
+            ramki.append(wynik)
+            return ('ramka', len(ramki) - 1)
+        if isinstance(wynik, pd.Series):
+            ramki.append(wynik.to_frame('wartosci'))
+            return ('seria', len(ramki) - 1, wynik.name)
+        if isinstance(wynik, dict):
+            return ('slownik', [(klucz, MagazynMigawek._rozloz(w, ramki)) for klucz, w in wynik.items()])
+        if isinstance(wynik, tuple):
+            return ('krotka', [MagazynMigawek._rozloz(w, ramki) for w in wynik])
+        raise TypeError(f"Migawka nie obsługuje typu {type(wynik).__name__}")
+
+    @staticmethod
+    def _zloz(struktura, ramki: list):
+        if struktura[0] == 'ramka':
+            return ramki[struktura[1]]
+        if struktura[0] == 'seria':
+            return ramki[struktura[1]]['wartosci'].rename(struktura[2])
+        if struktura[0] == 'slownik':
+            return {klucz: MagazynMigawek._zloz(s, ramki) for klucz, s in struktura[1]}
+        return tuple(MagazynMigawek._zloz(s, ramki) for s in struktura[1])
+
+    @staticmethod
+    def mapuj_plik(sciezka: str) -> pd.DataFrame:
+        """Ramka z pliku Arrow IPC przez mmap - bez kopiowania buforów (split_blocks nie skleja kolumn w bloki)."""
+        return ipc.open_file(pa.memory_map(sciezka)).read_all().to_pandas(split_blocks=True)
+
+    def _zapisz(self, katalog_migawki: str, wynik) -> None:
+        ramki = []
+        struktura = self._rozloz(wynik, ramki)
+        tymczasowy = f"{katalog_migawki}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(tymczasowy, exist_ok=True)
+        try:
+            for numer, df in enumerate(ramki):
+                tabela = pa.Table.from_pandas(df)
+                with ipc.new_file(os.path.join(tymczasowy, f"{numer}.arrow"), tabela.schema) as plik:
+                    plik.write_table(tabela)
+            with open(os.path.join(tymczasowy, "struktura.pkl"), 'wb') as f:
+                pickle.dump(struktura, f)
+            os.rename(tymczasowy, katalog_migawki)  # atomowo; gdy inny proces był szybszy, używamy jego migawki
+        except OSError:
+            if not os.path.isdir(katalog_migawki):
+                raise
+        finally:
+            shutil.rmtree(tymczasowy, ignore_errors=True)
+
+    def _wczytaj(self, katalog_migawki: str):
+        with open(os.path.join(katalog_migawki, "struktura.pkl"), 'rb') as f:
+            struktura = pickle.load(f)
+        liczba_ramek = sum(1 for nazwa in os.listdir(katalog_migawki) if nazwa.endswith('.arrow'))
+        ramki = [self.mapuj_plik(os.path.join(katalog_migawki, f"{numer}.arrow")) for numer in range(liczba_ramek)]
+        return self._zloz(struktura, ramki)
+
+    def _usun_stare(self, przedrostek: str, aktualny: str) -> None:
+        # Zmapowane pliki starych wersji zostają dostępne dla procesów, które je jeszcze trzymają (Linux)
+        for wpis in os.scandir(self.katalog):
+            if wpis.name.startswith(przedrostek) and wpis.path != aktualny and not wpis.name.endswith('.tmp'):
+                shutil.rmtree(wpis.path, ignore_errors=True)
+
+    def mapuj(self, pliki):
+        """Dekorator loadera; pliki to lista plików źródłowych albo funkcja argumentów loadera zwracająca tę listę."""
+        def dekorator(funkcja):
+            @functools.wraps(funkcja)
+            def opakowanie(*args, **kwargs):
+                zrodla = pliki(*args, **kwargs) if callable(pliki) else pliki
+                klucz = klucz_wywolania(funkcja, self.wersja_kodu, (args, wersja_plikow(list(zrodla))), kwargs)
+                wywolanie = (funkcja.__qualname__, repr(args), repr(kwargs))
+                zmapowane = self._zmapowane.get(wywolanie)
+                if zmapowane is None or zmapowane[0] != klucz:
+                    with self._blokada:
+                        blokada_klucza = self._obliczane.setdefault(klucz, threading.Lock())
+                    try:
+                        with blokada_klucza:
+                            zmapowane = self._zmapowane.get(wywolanie)
+                            if zmapowane is None or zmapowane[0] != klucz:
+                                bez_migawki, wynik = self._migawka(funkcja, args, kwargs, klucz, wywolanie)
+                                if bez_migawki:
+                                    return wynik
+                                zmapowane = self._zmapowane[wywolanie]
+                    finally:
+                        with self._blokada:
+                            self._obliczane.pop(klucz, None)
+                return kopia_plytka(zmapowane[1])
+            return opakowanie
+        return dekorator
+
+    def _migawka(self, funkcja, args: tuple, kwargs: dict, klucz: str, wywolanie: tuple):
+        """Mapuje migawkę (tworząc ją w razie potrzeby). Zwraca (True, wynik loadera), gdy migawki nie będzie."""
+        przedrostek = f"{funkcja.__qualname__}-{hashlib.sha256(repr(wywolanie).encode()).hexdigest()[:8]}-"
+        katalog_migawki = os.path.join(self.katalog, przedrostek + klucz[:24])
+        if not os.path.isdir(katalog_migawki):
+            wynik = funkcja(*args, **kwargs)
+            if self._pusty(wynik):
+                return True, wynik
+            os.makedirs(self.katalog, exist_ok=True)
+            try:
+                self._zapisz(katalog_migawki, wynik)
+            except (pa.ArrowException, TypeError, ValueError):  # kolumny, których Arrow nie zapisze
+                return True, wynik
+            self._usun_stare(przedrostek, katalog_migawki)
+        self._zmapowane[wywolanie] = (klucz, self._wczytaj(katalog_migawki))
+        return False, None
+
+
+def macierz_szeregow(df: pd.DataFrame, klucz: str, miara: str) -> tuple:
+    """Long (klucz, Rok, Miesiąc, miara) -> (nazwy szeregów, macierz szeregi x kolejne miesiące, ostatni miesiąc)."""
+    numer = df['Rok'].astype(np.int64) * 12 + df['Miesiąc'].astype(np.int64) - 1
+    pierwszy, ostatni = numer.min(), numer.max()
+    nazwy, wiersze = np.unique(df[klucz].astype(str), return_inverse=True)
+    macierz = np.zeros((len(nazwy), ostatni - pierwszy + 1))
+    np.add.at(macierz, (wiersze, (numer - pierwszy).to_numpy()), df[miara].to_numpy(dtype=float))
+    return nazwy, macierz, ostatni
+
+
+PROG_ANOMALII = 3.5   # |z| powyżej progu = alert (próg Iglewicza-Hoaglina)
+OKNO_ANOMALII = 12    # liczba poprzednich miesięcy, z których liczona jest mediana i MAD poziomu
+OKNO_SEZONOWE = 6     # liczba poprzednich różnic rok do roku dla z-score sezonowego
+
+
+def z_odporny(macierz: np.ndarray, kolumny: np.ndarray, okno: int) -> np.ndarray:
+    """
+    Odporny z-score kolumn `kolumny` macierzy (szeregi x miesiące) względem mediany i MAD z `okno`
+    poprzednich miesięcy każdego szeregu. NaN, gdy historia jest za krótka albo okno jest stałe.
+    """
+    kolumny = np.asarray(kolumny, dtype=np.int64)
+    wynik = np.full((macierz.shape[0], len(kolumny)), np.nan)
+    wazne = kolumny >= okno
+    if not wazne.any():
+        return wynik
+    okna = np.lib.stride_tricks.sliding_window_view(macierz, okno, axis=1)[:, kolumny[wazne] - okno]
+    mediana = np.median(okna, axis=2)
+    odchylenia = np.abs(okna - mediana[..., None])
+    # skala: MAD/0,6745, a przy MAD = 0 (np. sprzedaż głównie zerowa) - średnie odchylenie bezwzględne
+    skala = np.median(odchylenia, axis=2) / 0.6745
+    skala = np.where(skala > 0, skala, 1.2533 * odchylenia.mean(axis=2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wynik[:, wazne] = np.where(skala > 0, (macierz[:, kolumny[wazne]] - mediana) / skala, np.nan)
+    return wynik
+
+
+class DetektorAnomalii:
+    """
+    Pamięta macierze szeregów i policzone z-score; gdy nowe dane różnią się tylko dopisanymi miesiącami,
+    liczone są wyłącznie nowe kolumny. Zmiana historii lub listy szeregów wymusza pełne przeliczenie.
+    Detektor dla nowej wersji danych przejmuje stan poprzedniego (poprzedni=...).
+    """
+    def __init__(self, poprzedni: "DetektorAnomalii" = None):
+        self._stan = {}  # klucz -> (nazwy, pierwszy miesiąc, macierz, z poziomu, z sezonowy)
+        if poprzedni is not None:
+            with poprzedni._blokada:
+                self._stan = dict(poprzedni._stan)
+        self.przeliczone_miesiace = {}  # klucz -> liczba kolumn policzonych przy ostatnim wywołaniu
+        self._blokada = threading.Lock()
+
+    @staticmethod
+    def _z_sezonowy(macierz: np.ndarray, kolumny: np.ndarray) -> np.ndarray:
+        roznice_rr = macierz[:, 12:] - macierz[:, :-12]
+        wynik = np.full((macierz.shape[0], len(kolumny)), np.nan)
+        po_roku = kolumny >= 12
+        wynik[:, po_roku] = z_odporny(roznice_rr, kolumny[po_roku] - 12, OKNO_SEZONOWE)
+        return wynik
+
+    def ocen(self, klucz: str, nazwy: np.ndarray, macierz: np.ndarray, pierwszy: int) -> tuple:
+        with self._blokada:
+            stan = self._stan.get(klucz)
+            dlugosc = macierz.shape[1]
+            if (stan is not None and np.array_equal(stan[0], nazwy) and stan[1] == pierwszy
+                    and stan[2].shape[1] <= dlugosc and np.array_equal(stan[2], macierz[:, :stan[2].shape[1]])):
+                nowe = np.arange(stan[2].shape[1], dlugosc)
+                z_poziomu = np.hstack([stan[3], z_odporny(macierz, nowe, OKNO_ANOMALII)])
+                z_sezonowy = np.hstack([stan[4], self._z_sezonowy(macierz, nowe)])
+            else:
+                nowe = np.arange(dlugosc)
+                z_poziomu = z_odporny(macierz, nowe, OKNO_ANOMALII)
+                z_sezonowy = self._z_sezonowy(macierz, nowe)
+            self._stan[klucz] = (nazwy, pierwszy, macierz, z_poziomu, z_sezonowy)
+            self.przeliczone_miesiace[klucz] = len(nowe)
+            return z_poziomu, z_sezonowy
+
+
+def lttb_indeksy(x: np.ndarray, y: np.ndarray, liczba_punktow: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: wybiera `liczba_punktow` punktów zachowujących kształt szeregu
+    (pierwszy i ostatni zawsze zostają). Zwraca indeksy wybranych punktów w kolejności x.
+    """
+    n = len(y)
+    if liczba_punktow >= n or liczba_punktow < 3:
+        return np.arange(n)
+    granice = np.linspace(1, n - 1, liczba_punktow - 1).astype(np.int64)
+    indeksy = np.empty(liczba_punktow, dtype=np.int64)
+    indeksy[0], indeksy[-1] = 0, n - 1
+    a = 0
+    for i in range(liczba_punktow - 2):
+        start, stop = granice[i], granice[i + 1]
+        nastepny_stop = granice[i + 2] if i + 2 < len(granice) else n
+        sr_x, sr_y = x[stop:nastepny_stop].mean(), y[stop:nastepny_stop].mean()
+        pola = np.abs((x[a] - sr_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (sr_y - y[a]))
+        a = start + int(np.argmax(pola))
+        indeksy[i + 1] = a
+    return indeksy
+
+
+def pivot_monthly_sales(df: pd.DataFrame) -> pd.DataFrame:
+    if 'Miesiąc_nazwa_skrot' not in df.columns:
+        df['Miesiąc_nazwa_skrot'] = df['Miesiąc'].map(month_names_short)
+
+    pivot_df = df.pivot(index='Miesiąc_nazwa_skrot', columns='Rok', values='sprzedaz_total').reindex(
+        list(month_names_short.values())
+    )
+    return pivot_df
+def agreguj_sprzedaz_kategorie(df_aggregated: pd.DataFrame, sales_col: str) -> pd.DataFrame:
+    """
+    Agreguje sprzedaż po kategoriach dla wszystkich lat z df_aggregated.
+    sales_col: nazwa kolumny sprzedaży w df_aggregated (np. 'sprzedaz_budzetowa_total')
+    """
+    if df_aggregated.empty:
+        return pd.DataFrame(columns=['Kategoria nazwa', 'sprzedaz_total', 'Rok'])
+
+    # Grupujemy po 'Kategoria nazwa' i 'Rok', sumując wybraną kolumnę sprzedaży
+    df_agg = (
+        df_aggregated.groupby(["Kategoria nazwa", "Rok"])
+        .agg(sprzedaz_total=(sales_col, "sum"))
+        .reset_index()
+    )
+    return df_agg
+
+
+def oblicz_statystyki_promocji(df: pd.DataFrame) -> dict:
+    """
+    Liczy statystyki zakładki 7 dla przetworzonego zbioru promocji w jednym przebiegu po kolumnach:
+    rozkład miesięcy rozpoczęcia i zakończenia, rabat ważony sprzedażą oraz częstość
+    i udział w sprzedaży każdego rodzaju promocji.
+    """
+    sprzedaz = df['sprzedaż_sztuki'].to_numpy(float)
+    rabat = np.abs(df['Rabat promocyjny %'].to_numpy(float))
+    poprawny_rabat = ~np.isnan(rabat)
+    suma_wag = sprzedaz[poprawny_rabat].sum()
+    rabat_wazony = (rabat[poprawny_rabat] * sprzedaz[poprawny_rabat]).sum() / suma_wag if suma_wag else 0.0
+
+    def rozklad_miesiecy(kolumna):
+        miesiace = df[kolumna].dropna().to_numpy(np.int64)
+        return np.bincount(miesiace, minlength=13)[1:13]
+
+    def top3(liczebnosci):
+        kolejnosc = np.argsort(-liczebnosci, kind='stable')[:3]
+        return [{"miesiac": month_names[m + 1], "liczba": int(liczebnosci[m])}
+                for m in kolejnosc if liczebnosci[m] > 0]
+
+    rozpoczecia = rozklad_miesiecy('Miesiąc rozpoczęcia')
+    zakonczenia = rozklad_miesiecy('Miesiąc zakończenia')
+
+    rodzaje, kod = np.unique(df['Rodzaj promocji'].fillna('brak').to_numpy(str), return_inverse=True)
+    suma_sprzedazy = sprzedaz.sum()
+    podsumowanie = pd.DataFrame({
+        "Rodzaj promocji": rodzaje,
+        "Częstość (%)": np.round(100 * np.bincount(kod) / len(df), 2) if len(df) else 0.0,
+        "Sprzedaż (%)": np.round(100 * np.bincount(kod, weights=sprzedaz) / suma_sprzedazy, 2)
+                        if suma_sprzedazy else 0.0,
+    }).set_index("Rodzaj promocji")
+
+    return {
+        "liczba_wierszy": len(df),
+        "liczba_kolumn": df.shape[1],
+        "rabat_wazony": float(rabat_wazony),
+        "rozpoczecia": rozpoczecia,
+        "zakonczenia": zakonczenia,
+        "top3_rozpoczecia": top3(rozpoczecia),
+        "top3_zakonczenia": top3(zakonczenia),
+        "podsumowanie": podsumowanie,
+    }
+
+
+def dominujacy_w_promocji(df: pd.DataFrame, rodzaj: str) -> dict:
+    """
+    Znajduje producenta dominującego w sprzedaży danego rodzaju promocji i jego najważniejszy produkt.
+    Udziały producenta i produktu liczone są względem całej sprzedaży kategorii (wszystkie promocje).
+    """
+    sprzedaz_calkowita = df['sprzedaż_sztuki'].sum()
+    w_rodzaju = df[df['Rodzaj promocji'] == rodzaj]
+    producenci_w_rodzaju = w_rodzaju.groupby('Producent sprzedażowy kod')['sprzedaż_sztuki'].sum()
+    producent = producenci_w_rodzaju.idxmax()
+    df_producenta = df[df['Producent sprzedażowy kod'] == producent]
+    produkty_producenta = df_producenta.groupby('Indeks')['sprzedaż_sztuki'].sum()
+    kanaly = {
+        'Zamówienie telefoniczne': 'telefoniczne',
+        'Zamówienie modemowe': 'modemowe',
+        'Zamówienie producenckie': 'producenckie',
+    }
+    return {
+        "producent": producent,
+        "liczba_producentow": len(producenci_w_rodzaju),
+        "udzial_producenta_w_rodzaju": 100 * producenci_w_rodzaju.max() / producenci_w_rodzaju.sum(),
+        "udzial_rodzaju_sprzedaz": 100 * w_rodzaju['sprzedaż_sztuki'].sum() / sprzedaz_calkowita,
+        "udzial_rodzaju_czestosc": 100 * len(w_rodzaju) / len(df),
+        "kanaly": [nazwa for kolumna, nazwa in kanaly.items() if w_rodzaju[kolumna].fillna(0).gt(0).any()],
+        "liczba_produktow": produkty_producenta.size,
+        "sprzedaz_producenta": int(produkty_producenta.sum()),
+        "udzial_producenta": 100 * produkty_producenta.sum() / sprzedaz_calkowita,
+        "produkt": produkty_producenta.idxmax(),
+        "sprzedaz_produktu": int(produkty_producenta.max()),
+        "udzial_produktu": 100 * produkty_producenta.max() / sprzedaz_calkowita,
+    }
+
+
+def oblicz_udzial_roczny(df_year: pd.DataFrame) -> tuple:
+    """Udział ilościowy i wartościowy NEUCA w rynku (%) w danych jednego roku, zaokrąglony do 2 miejsc."""
+    def suma(kolumna):
+        return pd.to_numeric(df_year[kolumna], errors='coerce').sum()
+
+    rynek_sum_ilosc = suma("Sprzedaż rynek ilość")
+    rynek_sum_wartosc = suma("Sprzedaż rynek wartość")
+    udzial_ilosc = (100 * suma("Sprzedaż ilość") / rynek_sum_ilosc) if rynek_sum_ilosc != 0 else 0
+    udzial_wartosc = (100 * suma("Sprzedaż budżetowa") / rynek_sum_wartosc) if rynek_sum_wartosc != 0 else 0
+    return round(udzial_ilosc, 2), round(udzial_wartosc, 2)
+
+
+# Teksty grup tysięcy: najstarsza bez zer wiodących, kolejne " 007" (ostatni element "" = brak grupy)
+_GRUPY_TYSIECY = np.arange(1000).astype(str)
+_GRUPY_TYSIECY_ZERA = np.append(np.char.add(" ", np.char.zfill(_GRUPY_TYSIECY, 3)), "")
+
+
+def formatuj_liczby(wartosci, miejsca: int = 0, przyrostek: str = "", znak: bool = False, brak: str = ""):
+    """
+    Formatuje całą kolumnę liczb po polsku: spacja jako separator tysięcy i przecinek dziesiętny, np.
+    formatuj_liczby(s, 2, "%") -> "1 234,50%". znak=True dopisuje '+' przed dodatnimi (delty, p.p.).
+    Braki i wartości nieskończone zamieniane są na `brak`. Wszystko liczone jest na tablicach numpy (bez
+    wywołań Pythona na komórkę); dla pd.Series zwraca pd.Series z tym samym indeksem, poza tym tablicę.
+    """
+    if isinstance(wartosci, np.ndarray):
+        x = wartosci.astype(float, copy=False)
+    else:  # pd.Series / lista; również typy nullable i pd.NA
+        x = pd.Series(wartosci).to_numpy(dtype=float, na_value=np.nan)
+    if x.size == 0:
+        tekst = np.array([], dtype=str)
+        return pd.Series(tekst, index=wartosci.index, name=wartosci.name) if isinstance(wartosci, pd.Series) else tekst
+    poprawne = np.isfinite(x)
+    skala = 10 ** miejsca
+    # Wartości, których jednostki nie mieszczą się w int64, formatujemy pojedynczo (ścieżka skalarna niżej)
+    duze = poprawne & (np.abs(np.where(poprawne, x, 0)) * skala >= 2 ** 63)
+    # Zaokrąglona wartość bezwzględna w jednostkach ostatniego miejsca po przecinku
+    jednostki = np.rint(np.abs(np.where(poprawne & ~duze, x, 0)) * skala).astype(np.int64)
+    calkowite, ulamkowe = np.divmod(jednostki, skala)
+
+    # Liczba grup tysięcy w części całkowitej. Teksty grup i części ułamkowej pobierane są z gotowych tablic
+    # (indeksowanie zamiast konwersji liczb na tekst), a każdy krok to jedno doklejenie do całej kolumny.
+    grupy = np.ones(x.shape, dtype=np.int64)
+    prog = 1000
+    while (calkowite >= prog).any():
+        grupy += calkowite >= prog
+        prog *= 1000
+    tekst = _GRUPY_TYSIECY[calkowite // 1000 ** (grupy - 1)]
+    for k in range(int(grupy.max()) - 2, -1, -1):
+        grupa = np.where(grupy > k + 1, calkowite // 1000 ** k % 1000, 1000)
+        tekst = np.char.add(tekst, _GRUPY_TYSIECY_ZERA[grupa])
+    if miejsca > 0:
+        ulamki = np.char.add(",", np.char.zfill(np.arange(skala).astype(str), miejsca))
+        tekst = np.char.add(tekst, ulamki[ulamkowe])
+    if duze.any():
+        tekst = tekst.astype(object)
+        tekst[duze] = [f"{abs(v):,.{miejsca}f}".replace(",", " ").replace(".", ",") for v in x[duze]]
+
+    niezerowe = (jednostki > 0) | duze
+    ujemne = (x < 0) & niezerowe
+    dodatnie = (x > 0) & niezerowe if znak else np.zeros(x.shape, dtype=bool)
+    if ujemne.any() or dodatnie.any():
+        tekst = np.char.add(np.where(ujemne, "-", np.where(dodatnie, "+", "")), tekst)
+    if przyrostek:
+        tekst = np.char.add(tekst, przyrostek)
+    tekst = np.where(poprawne, tekst, brak)
+    if isinstance(wartosci, pd.Series):
+        return pd.Series(tekst, index=wartosci.index, name=wartosci.name)
+    return tekst
+
+
+def formatuj_liczbe(x, miejsca: int = 0, przyrostek: str = "", znak: bool = False) -> str:
+    """Pojedyncza liczba w formacie formatuj_liczby (do metryk i kart HTML)."""
+    return str(formatuj_liczby([x], miejsca, przyrostek, znak)[0])
+
+
+def przygotuj_tabele_porownawcza_surowa(tabela_2024: pd.DataFrame, tabela_2023: pd.DataFrame) -> pd.DataFrame:
+    """
+    Łączy dwie tabele (dla 2024 i 2023) i formatuje kolumny do porównania.
+    Oczekuje tabel już przygotowanych z obliczeniami procentowymi.
+    """
+    # Znajdź wspólne kolumny, które nie są 'Miesiąc_str'
+    wspolne_kolumny = [col for col in tabela_2024.columns if col in tabela_2023.columns and col != "Miesiąc_str"]
+
+    # Zmieniamy nazwy kolumn, żeby były unikalne dla każdego roku przed połączeniem
+    tabela_2024_renamed = tabela_2024.rename(columns={col: f"{col}_2024" for col in wspolne_kolumny})
+    tabela_2023_renamed = tabela_2023.rename(columns={col: f"{col}_2023" for col in wspolne_kolumny})
+    # Łączymy tabele na podstawie kolumny 'Miesiąc_str'. Użyj 'outer' join, aby uwzględnić miesiące,
+    # które mogą być obecne tylko w jednym z lat.
+    tabela = tabela_2024_renamed.merge(tabela_2023_renamed, on='Miesiąc_str', how='outer').sort_values('Miesiąc_str')
+
+    def sformatuj_kolumne_porownawcza(wart_2024: pd.Series, wart_2023: pd.Series, is_percent_col=False) -> np.ndarray:
+        """
+        Formatuje całą kolumnę tabeli porównawczej: "2024 (2023)" ze zmianą r/r (▲/▼ w %, dla kolumn
+        procentowych w p.p.). Komórki bez pary lat dostają "(-)" w miejscu brakującej wartości.
+        """
+        a = wart_2024.to_numpy(dtype=float, na_value=np.nan)
+        b = wart_2023.to_numpy(dtype=float, na_value=np.nan)
+        przyrostek = "%" if is_percent_col else ""
+        miejsca = 2 if is_percent_col else 0
+        tekst_a = formatuj_liczby(a, miejsca, przyrostek)
+        tekst_b = formatuj_liczby(b, miejsca, przyrostek)
+
+        if is_percent_col:
+            zmiana, jednostka = a - b, " p.p."
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                zmiana = np.where(b != 0, (a - b) / np.abs(b) * 100, 0)
+            jednostka = "%"
+        tekst_zmiany = formatuj_liczby(np.abs(zmiana), 2, jednostka)
+        strzalka = np.select(
+            [zmiana > 0, zmiana < 0],
+            [
+                np.char.add(np.char.add("<span style='color:green'>▲ ", tekst_zmiany), "</span>"),
+                np.char.add(np.char.add("<span style='color:red'>▼ ", tekst_zmiany), "</span>"),
+            ],
+            "",
+        )
+        oba = np.char.add(np.char.add(np.char.add(tekst_a, " ("), tekst_b), ")")
+        oba = np.where(strzalka != "", np.char.add(np.char.add(oba, " "), strzalka), oba)
+
+        jest_a, jest_b = ~np.isnan(a), ~np.isnan(b)
+        return np.select(
+            [jest_a & jest_b & (b >= 0), jest_a & ~jest_b, ~jest_a & jest_b],
+            [oba, np.char.add(tekst_a, " (-)"), np.char.add(np.char.add("(-) (", tekst_b), ")")],
+            "",  # obie wartości puste lub ujemna wartość bazowa - nie ma czego porównywać
+        )
+
+    # Lista kolumn, które mają być traktowane jako procentowe
+    percent_cols = ['NEUCA%', 'PROMO%', 'ZP%', 'NORMAL%']
+
+    sformatowane = {
+        col: sformatuj_kolumne_porownawcza(tabela[f"{col}_2024"], tabela[f"{col}_2023"], is_percent_col=col in percent_cols)
+        for col in wspolne_kolumny
+    }
+    # Kolumny "Miesiąc" na początku, a potem pozostałe wspólne kolumny
+    return pd.DataFrame({"Miesiąc": tabela['Miesiąc_str'], **sformatowane}, index=tabela.index)
@@ -1,79 +1,229 @@
 import streamlit as st
 import pandas as pd
-from PIL import Image
-import plotly.express as px
-import plotly.graph_objects as go
+import numpy as np
+import plotly.graph_objects as go  # ładowany już przez samo 'import streamlit' - odroczenie nic nie daje
 import os
-import graphviz
-import streamlit.components.v1 as components
+import html
+import logging
+import threading
+import time
+import streamlit.components.v1 as components  # jw. - sprawdza to test_importy.py
+# Obliczenia żyją w module analityka (bez zależności od Streamlit) - tutaj tylko wczytywanie, cache i widoki
+from analityka import (month_names, month_names_short, wybierz_kolumne_wg, analiza_pareto_from_agg,
+                       KostkaOLAP, GrafWidokow, IndeksPromocji, POZIOMY_CZASU, RollupyCzasu,
+                       AgregatorAptek, UdzialyProduktow, HierarchiaSprzedazy, oblicz_uplift_promocji,
+                       holt_winters_wsadowo, wersja_plikow, macierz_szeregow, PROG_ANOMALII, DetektorAnomalii,
+                       lttb_indeksy, pivot_monthly_sales, agreguj_sprzedaz_kategorie, oblicz_statystyki_promocji,
+                       dominujacy_w_promocji, przygotuj_tabele_porownawcza_surowa,
+                       oblicz_udzial_roczny, CacheDyskowy, CachePamieci, MagazynMigawek, wersja_zrodel,
+                       formatuj_liczby, formatuj_liczbe, kategorie_pliki, kategorie_etykiety, kategorie_wskazniki,
+                       agreguj_hierarchie_kategorii, BEZ_PROMOCJI)
 st.set_page_config(page_title="SmartPromocje, czyli jak dane pomagają przewidywać sprzedaż leków", layout="wide")
 top_years = [2022, 2023, 2024] # Lata, dla których masz pliki
+logger = logging.getLogger(__name__)
+
+# --- Cache wyników: pamięć procesu ze wspólnym budżetem (LRU) nad cache dyskowym, który przeżywa restart ---
+# Funkcje liczące używają @pamiec.zapamietaj zamiast @st.cache_data, a loadery plików @migawki.mapuj.
+KATALOG_CACHE = ".cache_wynikow"
+KATALOG_MIGAWEK = ".migawki"
+LIMIT_CACHE_MB = 512
+BUDZET_PAMIECI_CACHE_MB = 1024
+KATALOG_KODU = os.path.dirname(os.path.abspath(__file__))
+
+@st.cache_resource(max_entries=1)
+def cache_dyskowy(wersja_kodu: str) -> CacheDyskowy:
+    return CacheDyskowy(KATALOG_CACHE, LIMIT_CACHE_MB * 1024 ** 2, wersja_kodu)
+
+@st.cache_resource(max_entries=1)
+def cache_pamieci(wersja_kodu: str) -> CachePamieci:
+    return CachePamieci(BUDZET_PAMIECI_CACHE_MB * 1024 ** 2, wersja_kodu)
+
+# Wczytane dane są migawkami Arrow mapowanymi do pamięci - jedna fizyczna kopia dla wszystkich sesji i procesów
+@st.cache_resource(max_entries=1)
+def magazyn_migawek(wersja_kodu: str) -> MagazynMigawek:
+    return MagazynMigawek(KATALOG_MIGAWEK, wersja_kodu)
+
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)  # bufory migawek są tylko do odczytu - zapis w sesji musi kopiować
+
+# Zmiana kodu (tego pliku lub modułów obliczeniowych) albo wersji pandas/numpy unieważnia wpisy
+wersja_kodu = wersja_zrodel([os.path.join(KATALOG_KODU, plik) for plik in ("prz.py", "analityka.py")])
+dysk = cache_dyskowy(wersja_kodu)
+pamiec = cache_pamieci(wersja_kodu)
+migawki = magazyn_migawek(wersja_kodu)
+
 def show_dashboard_block(df, title):
     st.subheader(f"Dashboard dla {title}")
-    st.metric(label=f"Całkowita sprzedaż {title} (sztuki)", value=f"{df['Ilość'].sum():,.0f}")
+    st.metric(label=f"Całkowita sprzedaż {title} (sztuki)", value=formatuj_liczbe(df['Ilość'].sum()))
     st.metric(label=f"Liczba unikalnych promocji {title}", value=f"{df['Rodzaj promocji'].nunique()}")
     st.dataframe(df.head(), use_container_width=True) # Pokazujemy head dla przykładu
     st.write("---")
-@st.cache_data
-def load_wsk_data():
-    try:
-        # Pamiętaj, aby te pliki zostały wcześniej wygenerowane jako Parquet!
-        wskprz_df = pd.read_parquet('wskprz.parquet')
-        wskwaga_df = pd.read_parquet('wskwaga.parquet')
-        return wskprz_df, wskwaga_df
-    except FileNotFoundError:
-        st.error("Błąd: Nie znaleziono plików 'wskprz.parquet' lub 'wskwaga.parquet'.")
-        st.stop()
+@migawki.mapuj(list(kategorie_wskazniki.values()))
+def load_wsk_data() -> dict:
+    """
+    Wczytuje pliki wskaźników (np. 'wskwaga.parquet') dla kategorii, które je mają.
+    Zwraca słownik {Kategoria nazwa: DataFrame}.
+    """
+    dane = {}
+    # Pamiętaj, aby te pliki zostały wcześniej wygenerowane skryptem 'przetworz_dane.py'!
+    for kategoria, filename in kategorie_wskazniki.items():
+        try:
+            dane[kategoria] = pd.read_parquet(filename)
+        except FileNotFoundError:
+            continue
+    return dane
 
-@st.cache_data
-def load_tab7_data():
-    try:
-        # Wczytujemy pojedyncze pliki, bo analiza jest na nich osobno
-        waga_df = pd.read_parquet('waga_processed.parquet')
-        przylepce_df = pd.read_parquet('przylepce_processed.parquet')
-        return waga_df, przylepce_df
-    except FileNotFoundError:
-        st.error("Błąd: Nie znaleziono plików 'waga_processed.parquet' lub 'przylepce_processed.parquet'. "
+@migawki.mapuj([f"{przyrostek}_processed.parquet" for przyrostek in kategorie_pliki.values()])
+def load_tab7_data() -> dict:
+    """
+    Wczytuje przetworzone pliki '<kategoria>_processed.parquet' dla wszystkich kategorii, które je mają.
+    Zwraca słownik {Kategoria nazwa: DataFrame}.
+    """
+    dane = {}
+    # Wczytujemy pojedyncze pliki, bo analiza jest na nich osobno
+    for kategoria, przyrostek in kategorie_pliki.items():
+        try:
+            dane[kategoria] = pd.read_parquet(f'{przyrostek}_processed.parquet')
+        except FileNotFoundError:
+            continue
+    if not dane:
+        st.error("Błąd: Nie znaleziono żadnego pliku '<kategoria>_processed.parquet'. "
                  "Upewnij się, że uruchomiłeś skrypt generujący te pliki!")
         st.stop() # Zatrzymaj aplikację, jeśli plików brakuje
+    return dane
 
 # Wczytaj dane raz na początku aplikacji Streamlit
-waga, przylepce = load_tab7_data()
-month_names = { # Pełne nazwy miesięcy - używane do tworzenia kolumny 'Miesiąc_nazwa' w 'przygotuj_daty_cached'
-    1: "Styczeń", 2: "Luty", 3: "Marzec", 4: "Kwiecień", 5: "Maj", 6: "Czerwiec",
-    7: "Lipiec", 8: "Sierpień", 9: "Wrzesień", 10: "Październik", 11: "Listopad", 12: "Grudzień"
-}
-month_names_short = { # Skrócone nazwy miesięcy - używane w tabelach i pivotach
-    1: "Sty", 2: "Lut", 3: "Mar", 4: "Kwi", 5: "Maj", 6: "Cze",
-    7: "Lip", 8: "Sie", 9: "Wrz", 10: "Paź", 11: "Lis", 12: "Gru"
-}
+dane_tab7 = load_tab7_data()
+
+# --- Karty i podia HTML: cała siatka w jednym elemencie, style wysyłane raz na przebieg (STYLE_KART) ---
+STYLE_KART = """
+<style>
+    .siatka-kart {
+        display: grid;
+        gap: 1rem;
+        margin-bottom: 1rem;
+    }
+    .karta {
+        border-radius: 8px;
+        text-align: center;
+        color: white;
+    }
+    .karta-info {
+        padding: 15px;
+        border: 2px solid rgba(255, 255, 255, 0.5);
+        box-shadow: 3px 3px 8px rgba(0,0,0,0.3);
+        height: 120px;
+        display: flex;
+        flex-direction: column;
+        justify-content: center;
+        align-items: center;
+    }
+    .karta-info .karta-ikona { font-size: 2.5em; margin-bottom: 5px; }
+    .karta-info .karta-tytul { font-weight: bold; font-size: 1.1em; margin-bottom: 3px; }
+    .karta-info .karta-wartosc { font-size: 1.8em; }
+    .karta-top5 {
+        border-radius: 15px;
+        padding: 12px;
+        color: inherit;
+    }
+    .karta-top5 .karta-ikona, .karta-top5 .karta-tytul { display: inline; font-size: 22px; font-weight: bold; }
+    .karta-top5 .karta-wartosc { font-size: 14px; }
+    .karta-top5 .karta-opis { font-size: 13px; }
+    .podium {
+        display: flex;
+        justify-content: center;
+        align-items: flex-end;
+        gap: 20px;
+        margin-bottom: 20px;
+        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+    }
+    .place {
+        text-align: center;
+        color: #333;
+        border-radius: 10px;
+        padding: 10px;
+        background: #e8f0fe;
+        box-shadow: 2px 2px 6px rgba(65, 105, 225, 0.3);
+    }
+    .first {
+        font-size: 1.6rem;
+        font-weight: 700;
+        height: 150px;
+        background: #4169E1;
+        color: white;
+        flex: 1.5;
+        display: flex;
+        flex-direction: column;
+        justify-content: flex-end;
+        padding-bottom: 15px;
+        border-radius: 12px;
+    }
+    .second {
+        font-size: 1.2rem;
+        font-weight: 600;
+        height: 120px;
+        background: #89a9f7;
+        color: white;
+        flex: 1.2;
+        display: flex;
+        flex-direction: column;
+        justify-content: flex-end;
+        padding-bottom: 10px;
+        border-radius: 10px;
+    }
+    .third {
+        font-size: 1rem;
+        font-weight: 600;
+        height: 100px;
+        background: #c1cfff;
+        color: #333;
+        flex: 1;
+        display: flex;
+        flex-direction: column;
+        justify-content: flex-end;
+        padding-bottom: 10px;
+        border-radius: 10px;
+    }
+    .place .rank {
+        font-weight: 900;
+        font-size: 1.4rem;
+        margin-bottom: 5px;
+    }
+    .place .month {
+        font-weight: 700;
+    }
+    .place .count {
+        font-size: 1rem;
+        opacity: 0.8;
+    }
+</style>
+"""
 
-def info_card(title, value, color, icon):
-    st.markdown(
-        f"""
-        <div style="
-            background-color: {color};
-            padding: 15px; /* Zwiększono padding */
-            border-radius: 8px; /* Lekko zwiększono zaokrąglenie rogów */
-            border: 2px solid rgba(255, 255, 255, 0.5); /* Dodano/zwiększono obwódkę */
-            text-align: center;
-            color: white;
-            box-shadow: 3px 3px 8px rgba(0,0,0,0.3); /* Zwiększono cień dla lepszego efektu */
-            height: 120px; /* Zwiększono wysokość karty */
-            display: flex;
-            flex-direction: column;
-            justify-content: center;
-            align-items: center;
-        ">
-            <div style="font-size: 2.5em; margin-bottom: 5px;">{icon}</div> 
-            <div style="font-weight: bold; font-size: 1.1em; margin-bottom: 3px;">{title}</div> 
-            <div style="font-size: 1.8em;">{value:,}</div>
-        </div>
-        """,
-        unsafe_allow_html=True
+def html_kart(df: pd.DataFrame, kolumny: int = 3, klasa: str = "karta-info") -> str:
+    """
+    HTML siatki kart z DataFrame - jedna karta na wiersz. Kolumny df: 'tytul', 'wartosc' (liczba formatowana
+    formatuj_liczby albo gotowy tekst/HTML), 'kolor', 'ikona' i opcjonalnie 'opis' (dodatkowa linia HTML).
+    HTML jest bez wcięć i w jednej linii, żeby markdown nie potraktował go jako bloku kodu.
+    """
+    wartosci = df['wartosc']
+    if pd.api.types.is_numeric_dtype(wartosci):
+        wartosci = formatuj_liczby(wartosci)
+    opisy = df['opis'] if 'opis' in df.columns else pd.Series("", index=df.index)
+    karty = (
+        f'<div class="karta {klasa}" style="background-color: {kolor};">'
+        f'<div class="karta-ikona">{ikona}</div> <div class="karta-tytul">{html.escape(str(tytul))}</div>'
+        f'<div class="karta-wartosc">{wartosc}</div>{opis}</div>'
+        for tytul, wartosc, kolor, ikona, opis in zip(df['tytul'], wartosci, df['kolor'], df['ikona'], opisy)
     )
+    return (f'<div class="siatka-kart" style="grid-template-columns: repeat({kolumny}, minmax(0, 1fr));">'
+            + "".join(karty) + "</div>")
+
+def siatka_kart(df: pd.DataFrame, kolumny: int = 3, klasa: str = "karta-info", naglowek: str = None):
+    """Renderuje siatkę kart html_kart (z opcjonalnym nagłówkiem markdown) jako jeden element st.markdown."""
+    tresc = html_kart(df, kolumny, klasa)
+    st.markdown(f"{naglowek}\n\n{tresc}" if naglowek else tresc, unsafe_allow_html=True)
 # --- Funkcje przygotowujące dane do wizualizacji (miesięczne) ---
-@st.cache_data
+@migawki.mapuj(["df_aggregated.parquet"])
 def load_df_aggregated_categories():
     """
     Ładuje dane kategoryzacyjne z pliku Parquet.
@@ -96,7 +246,7 @@ def load_df_aggregated_categories():
     except Exception as e:
         st.error(f"Inny błąd podczas wczytywania pliku kategoryzacyjnego: {e}")
         return pd.DataFrame()
-@st.cache_data
+@migawki.mapuj(['sales_by_category.parquet', 'sales_by_promotion.parquet'])
 def load_aggregated_data():
     try:
         df_sales_by_category = pd.read_parquet('sales_by_category.parquet')
@@ -109,45 +259,10 @@ def load_aggregated_data():
 
 df_sales_by_category, df_sales_by_promotion = load_aggregated_data()
 
-wskprz, wskwaga = load_wsk_data()
-# --- Funkcje pomocnicze ---
-
-# Funkcja wybierająca kolumnę (dostosowana do nowych nazw kolumn w Parquet)
-def wybierz_kolumne_wg(filtr):
-    # W plikach Parquet kolumna "Ilość" już nie ma spacji
-    return 'Sprzedaż budżetowa' if filtr == "Sprzedaż wartościowa" else 'Ilość'
-
-# Funkcja analizy Pareto (dostosowana do pracy z zagregowanymi danymi i filtrowaniem po roku)
-def analiza_pareto_from_agg(df_agg, grupa_kolumna, filtr, prog, rok_filtr=None):
-    kol = wybierz_kolumne_wg(filtr)
-
-    df_current_year = df_agg
-    if rok_filtr is not None:
-        df_current_year = df_agg[df_agg['Rok'] == rok_filtr]
-
-    # Jeśli po filtrowaniu nie ma danych, zwróć puste wyniki
-    if df_current_year.empty:
-        return 0, 0.0, pd.DataFrame(columns=[grupa_kolumna, kol, 'Skumulowany %']), pd.Series(dtype='float64')
+wskazniki_tab7 = load_wsk_data()
 
-    # Sumujemy już zagregowane dane dla danego roku/grupy
-    sprzedaz = df_current_year.groupby(grupa_kolumna)[kol].sum().sort_values(ascending=False)
 
-    # Upewniamy się, że nie dzielimy przez zero, jeśli suma sprzedaży wynosi 0
-    total_sum = sprzedaz.sum()
-    if total_sum == 0:
-        return 0, 0.0, pd.DataFrame(columns=[grupa_kolumna, kol, 'Skumulowany %']), sprzedaz
-
-    skumulowana = sprzedaz.cumsum()
-    procent = 100 * skumulowana / total_sum
-
-    ograniczone = sprzedaz[procent <= prog].to_frame(name=kol)
-    ograniczone['Skumulowany %'] = procent[procent <= prog]
-
-    liczba = len(ograniczone)
-    procent_grup = 100 * liczba / len(sprzedaz) if len(sprzedaz) > 0 else 0
-
-    return liczba, procent_grup, ograniczone, sprzedaz
-@st.cache_data
+@migawki.mapuj(lambda sales_type, year: [f"sprzedaz_mies_{sales_type}_{year}.parquet"])
 def load_monthly_sales_data(sales_type: str, year: int) -> pd.DataFrame:
     """
     Wczytuje pojedynczy plik Parquet dla sprzedaży miesięcznej.
@@ -169,7 +284,6 @@ def load_monthly_sales_data(sales_type: str, year: int) -> pd.DataFrame:
         st.error(f"Błąd podczas wczytywania pliku '{filename}': {e}")
         return pd.DataFrame()
 
-@st.cache_data
 def load_all_monthly_sales(sales_type: str) -> dict:
     """
     Wczytuje wszystkie pliki miesięczne dla danego typu sprzedaży (ilosciowa/budzetowa)
@@ -188,7 +302,90 @@ monthly_sales_ilosciowa = load_all_monthly_sales('ilosciowa')
 monthly_sales_budzetowa = load_all_monthly_sales('budzetowa')
 
 
-@st.cache_data
+# --- Kostka OLAP: wstępnie policzone agregaty sprzedaży dla filtrów globalnych ---
+
+
+def wersja_kostki() -> tuple:
+    """Wersja wszystkich plików, z których może powstać kostka (także zastępczych roll-upów)."""
+    return wersja_plikow(
+        ["kostka_sprzedazy.parquet", "df_aggregated.parquet", "sales_by_promotion.parquet"]
+        + [f"sprzedaz_mies_{typ}_{rok}.parquet" for typ in ('ilosciowa', 'budzetowa') for rok in top_years]
+        + [f"top_producent_{rok}.parquet" for rok in top_years]
+    )
+
+
+@st.cache_resource(max_entries=1)
+def zbuduj_kostke_olap(wersja_danych: tuple) -> KostkaOLAP:
+    """
+    Buduje kostkę z 'kostka_sprzedazy.parquet' (generowanego przez przetworz_dane.py).
+    Bez tego pliku kostka składa się z roll-upów odtworzonych z istniejących plików zagregowanych,
+    więc filtry łączą się tylko w obrębie jednego agregatu. wersja_danych (wersja_kostki) przebudowuje
+    kostkę po podmianie plików.
+    """
+    kostka = KostkaOLAP()
+    try:
+        kostka.dodaj_agregat(pd.read_parquet("kostka_sprzedazy.parquet"), KostkaOLAP.WYMIARY)
+        return kostka
+    except FileNotFoundError:
+        pass
+
+    df_kategorie = load_df_aggregated_categories()
+    if not df_kategorie.empty:
+        df_kategorie = df_kategorie.rename(columns={
+            'Kategoria nazwa': 'Kategoria',
+            'sprzedaz_ilosc_total': 'Ilość',
+            'sprzedaz_budzetowa_total': 'Sprzedaż budżetowa',
+        })
+        kostka.dodaj_agregat(df_kategorie, ['Rok', 'Kategoria'])
+
+        # sales_by_promotion zawiera wyłącznie sprzedaż promocyjną - resztę roku opisujemy jako "Bez promocji"
+        promocje = df_sales_by_promotion[['Rok', 'Rodzaj promocji', *KostkaOLAP.MIARY]]
+        bez_promocji = (
+            df_kategorie.groupby('Rok')[list(KostkaOLAP.MIARY)].sum()
+            - promocje.groupby('Rok')[list(KostkaOLAP.MIARY)].sum()
+        ).dropna().reset_index()
+        bez_promocji['Rodzaj promocji'] = BEZ_PROMOCJI
+        kostka.dodaj_agregat(pd.concat([promocje, bez_promocji], ignore_index=True), ['Rok', 'Rodzaj promocji'])
+
+    miesieczne = [
+        monthly_sales_ilosciowa[rok][['Rok', 'Miesiąc', 'sprzedaz_total']].rename(columns={'sprzedaz_total': 'Ilość'})
+        .merge(monthly_sales_budzetowa[rok][['Rok', 'Miesiąc', 'sprzedaz_total']]
+               .rename(columns={'sprzedaz_total': 'Sprzedaż budżetowa'}), on=['Rok', 'Miesiąc'])
+        for rok in top_years if rok in monthly_sales_ilosciowa and rok in monthly_sales_budzetowa
+    ]
+    if miesieczne:
+        kostka.dodaj_agregat(pd.concat(miesieczne, ignore_index=True), ['Rok', 'Miesiąc'])
+
+    producenci = []
+    for rok in top_years:
+        try:
+            producenci.append(pd.read_parquet(f"top_producent_{rok}.parquet"))
+        except FileNotFoundError:
+            continue
+    if producenci:
+        df_producenci = pd.concat(producenci, ignore_index=True).rename(columns={
+            'Producent sprzedażowy kod': 'Producent',
+            'Sprzedaz_ilosc': 'Ilość',
+            'Sprzedaz_wartosc': 'Sprzedaż budżetowa',
+        })
+        df_producenci['Producent'] = df_producenci['Producent'].astype(str)
+        kostka.dodaj_agregat(df_producenci, ['Rok', 'Producent'])
+    return kostka
+
+wersja_kostki_olap = wersja_kostki()
+kostka_olap = zbuduj_kostke_olap(wersja_kostki_olap)
+
+
+graf_widokow = GrafWidokow()
+graf_widokow.dodaj('kategorie_lata', ['Kategoria', 'Rok'], wymiar_wyboru='Kategoria')
+graf_widokow.dodaj('sprzedaz_miesieczna', ['Rok', 'Miesiąc'])
+graf_widokow.dodaj('producenci', ['Rok', 'Producent'])
+graf_widokow.dodaj('sumy_roczne', ['Rok'])
+graf_widokow.dodaj('pareto_kategorie', ['Rok', 'Kategoria'], wymiar_wyboru='Kategoria')
+graf_widokow.dodaj('pareto_promocje', ['Rok', 'Rodzaj promocji'], wymiar_wyboru='Rodzaj promocji')
+
+
+@migawki.mapuj(["udzial_all.parquet"])
 def load_udzialy_data() -> pd.DataFrame:
     """
     Wczytuje dane z pliku udzial_all.parquet i mapuje nazwy kolumn.
@@ -234,9 +431,388 @@ def load_udzialy_data() -> pd.DataFrame:
 df_udzialy_all = load_udzialy_data()
 
 
+@migawki.mapuj([f"promocje_{przyrostek}.parquet" for przyrostek in kategorie_pliki.values()])
+def load_promocje_data() -> pd.DataFrame:
+    """
+    Wczytuje surowe pliki promocji ('promocje_<kategoria>.parquet') dla wszystkich kategorii
+    i łączy je w jeden DataFrame z dodatkową kolumną 'Kategoria nazwa'.
+    Brakujące pliki są pomijane - zwracany jest wtedy pusty DataFrame.
+    """
+    kolumny = ['Id promocji', 'Id kartoteki', 'Id producenta sprzedaży',
+               'Data od - promocja', 'Data do - promocja']
+    ramki = []
+    for kategoria, przyrostek in kategorie_pliki.items():
+        filename = f"promocje_{przyrostek}.parquet"
+        try:
+            df = pd.read_parquet(filename, columns=kolumny)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            st.error(f"Błąd podczas wczytywania pliku '{filename}': {e}")
+            continue
+        df['Kategoria nazwa'] = kategoria
+        ramki.append(df)
+
+    if not ramki:
+        return pd.DataFrame(columns=kolumny + ['Kategoria nazwa'])
+
+    df = pd.concat(ramki, ignore_index=True)
+    df['Data od - promocja'] = pd.to_datetime(df['Data od - promocja'], errors='coerce')
+    df['Data do - promocja'] = pd.to_datetime(df['Data do - promocja'], errors='coerce')
+    df = df.dropna(subset=['Id kartoteki', 'Data od - promocja', 'Data do - promocja'])
+    # Id kartoteki to ten sam kod co 'Indeks' w plikach sprzedaży (tam jest tekstem)
+    df['Id kartoteki'] = df['Id kartoteki'].astype(str)
+    return df
+
+
+@st.cache_resource
+def zbuduj_indeks_promocji(df_promocje: pd.DataFrame) -> IndeksPromocji:
+    # Indeks jest współdzielony przez wszystkie sesje (cache_resource nie kopiuje obiektu)
+    return IndeksPromocji(df_promocje)
+
+
+@pamiec.zapamietaj
+def oblicz_koncentracje_promocji(df_promocje: pd.DataFrame) -> pd.DataFrame:
+    return zbuduj_indeks_promocji(df_promocje).koncentracja_miesieczna()
+
+
+df_promocje = load_promocje_data()
+indeks_promocji = zbuduj_indeks_promocji(df_promocje)
+koncentracja_promocji = oblicz_koncentracje_promocji(df_promocje)
+
+
+# --- Warstwa roll-upów czasowych: dzień -> tydzień / miesiąc -> kwartał -> rok ---
+
+
+@st.cache_resource(max_entries=32)
+def rollupy_sprzedazy(df_miesieczny: pd.DataFrame) -> RollupyCzasu:
+    """Roll-upy sprzedaży z miesięcznego widoku kostki - dane sprzedażowe nie mają daty dokumentu, więc bazą jest miesiąc."""
+    df = df_miesieczny.set_index(pd.PeriodIndex.from_fields(
+        year=df_miesieczny['Rok'], month=df_miesieczny['Miesiąc'], freq='M'
+    ))[list(KostkaOLAP.MIARY)]
+    return RollupyCzasu(df.groupby(level=0).sum(), 'M')
+
+
+@st.cache_resource(max_entries=32)
+def rollupy_promocji(kategorie: tuple) -> RollupyCzasu:
+    """
+    Dzienna liczba aktywnych promocji (suma = promocjodni) z dokładnych dat promocji.
+    Każda kategoria jest dopisywana osobno - roll-upy przeliczają tylko dni, których dotyczy.
+    """
+    rollupy = None
+    for kategoria in kategorie:
+        df_kat = df_promocje[df_promocje['Kategoria nazwa'] == kategoria]
+        if df_kat.empty:
+            continue
+        od = df_kat['Data od - promocja'].to_numpy('datetime64[D]').astype(np.int64)
+        do = df_kat['Data do - promocja'].to_numpy('datetime64[D]').astype(np.int64)
+        pierwszy = od.min()
+        roznice = np.zeros(do.max() - pierwszy + 2, dtype=np.int64)
+        np.add.at(roznice, od - pierwszy, 1)
+        np.add.at(roznice, do - pierwszy + 1, -1)
+        dni = pd.period_range(pd.Timestamp(pierwszy, unit='D'), periods=len(roznice) - 1, freq='D')
+        df_dzienny = pd.DataFrame({'Aktywne promocje': np.cumsum(roznice[:-1])}, index=dni)
+        if rollupy is None:
+            rollupy = RollupyCzasu(df_dzienny, 'D')
+        else:
+            rollupy.dopisz(df_dzienny)
+    return rollupy
+
+
+@migawki.mapuj([f"sprzedaz_{przyrostek}.parquet" for przyrostek in kategorie_pliki.values()])
+def load_surowa_sprzedaz_agregaty():
+    """
+    Wczytuje surowe pliki sprzedaży ('sprzedaz_<kategoria>.parquet') tylko z potrzebnymi kolumnami i zwraca:
+    - sprzedaż ilościową i wartościową per (Indeks, Rok, Miesiąc),
+    - mapowanie 'id promocji' -> 'Rodzaj promocji' (poziom 2).
+    Każdy plik jest agregowany osobno, więc w pamięci nie ma naraz wszystkich 5,6 mln wierszy.
+    """
+    kolumny = ['Indeks', 'Rok', 'Miesiąc', 'Sprzedaż ilość', 'Sprzedaż budżetowa', 'id promocji',
+               'Rodzaj promocji poziom 2']
+    sprzedaz, rodzaje = [], []
+    for przyrostek in kategorie_pliki.values():
+        filename = f"sprzedaz_{przyrostek}.parquet"
+        try:
+            df = pd.read_parquet(filename, columns=kolumny)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            st.error(f"Błąd podczas wczytywania pliku '{filename}': {e}")
+            continue
+        df['Indeks'] = df['Indeks'].astype(str)
+        sprzedaz.append(df.groupby(['Indeks', 'Rok', 'Miesiąc'], as_index=False)[['Sprzedaż ilość', 'Sprzedaż budżetowa']].sum())
+        rodzaje.append(df.dropna(subset=['id promocji'])[['id promocji', 'Rodzaj promocji poziom 2']]
+                       .drop_duplicates('id promocji'))
+
+    if not sprzedaz:
+        return (pd.DataFrame(columns=['Indeks', 'Rok', 'Miesiąc', 'Sprzedaż ilość', 'Sprzedaż budżetowa']),
+                pd.Series(dtype='object', name='Rodzaj promocji'))
+    rodzaje_promocji = pd.concat(rodzaje).drop_duplicates('id promocji').set_index('id promocji')
+    return (pd.concat(sprzedaz, ignore_index=True),
+            rodzaje_promocji['Rodzaj promocji poziom 2'].rename('Rodzaj promocji'))
+
+
+@migawki.mapuj(["rynek.parquet"])
+def load_rynek_data() -> pd.DataFrame:
+    """
+    Wczytuje dane rynkowe na poziomie produktu ('rynek.parquet'): Indeks, Rok, Miesiąc i sprzedaż rynku.
+    """
+    filename = "rynek.parquet"
+    kolumny = ['Kategoria nazwa', 'Rok', 'Miesiąc', 'Indeks', 'Sprzedaż rynek ilość', 'Sprzedaż rynek wartość']
+    try:
+        df = pd.read_parquet(filename, columns=kolumny)
+    except FileNotFoundError:
+        return pd.DataFrame(columns=kolumny)
+    except Exception as e:
+        st.error(f"Błąd podczas wczytywania pliku '{filename}': {e}")
+        return pd.DataFrame(columns=kolumny)
+    df['Indeks'] = df['Indeks'].astype(str)
+    df['Rok'] = df['Rok'].astype(int)
+    df['Miesiąc'] = df['Miesiąc'].astype(int)
+    return df
+
+
+def pliki_sprzedazy() -> dict:
+    return {kategoria: f"sprzedaz_{przyrostek}.parquet" for kategoria, przyrostek in kategorie_pliki.items()
+            if os.path.exists(f"sprzedaz_{przyrostek}.parquet")}
+
+
+@st.cache_data(show_spinner="Agregacja sprzedaży po aptekach...")
+def agregaty_aptek(wersja_danych: tuple) -> dict:
+    # wersja_danych (czas modyfikacji i rozmiar plików) unieważnia cache po podmianie plików sprzedaży
+    agregator = AgregatorAptek()
+    for kategoria, filename in pliki_sprzedazy().items():
+        try:
+            agregator.dodaj_plik(filename, kategoria)
+        except Exception as e:
+            st.error(f"Błąd podczas wczytywania pliku '{filename}': {e}")
+    return agregator.wyniki()
+
+
+@pamiec.zapamietaj
+def analiza_aptek(wersja_danych: tuple, lata: tuple, kategorie: tuple, miara: str) -> pd.DataFrame:
+    """
+    Ranking aptek w zakresie lat i kategorii: sprzedaż, udział sprzedaży promocyjnej, liczba użytych promocji,
+    dominujący rodzaj promocji i koncentracja (HHI) sprzedaży promocyjnej między rodzajami promocji.
+    """
+    agregaty = agregaty_aptek(wersja_danych)
+    if not agregaty:
+        return pd.DataFrame()
+    kol_sprzedazy, kol_promocyjna = (('Sprzedaż budżetowa', 'Wartość promocyjna') if miara == 'Sprzedaż budżetowa'
+                                     else ('Sprzedaż ilość', 'Ilość promocyjna'))
+
+    def wybrane(df):
+        return df[df['Rok'].isin(lata) & df['Kategoria'].isin(kategorie)]
+
+    sumy = wybrane(agregaty['sumy']).groupby('Kod SAP')[[kol_sprzedazy, kol_promocyjna, 'Wiersze']].sum()
+    rodzaje = wybrane(agregaty['rodzaje']).groupby(['Kod SAP', 'Rodzaj promocji'])[kol_sprzedazy].sum()
+    udzialy_rodzajow = rodzaje / rodzaje.groupby(level='Kod SAP').transform('sum')
+    promocje = wybrane(agregaty['promocje']).drop_duplicates(['Kod SAP', 'id promocji'])
+
+    wynik = pd.DataFrame({
+        'Nazwa apteki': agregaty['nazwy'].reindex(sumy.index),
+        'Sprzedaż': sumy[kol_sprzedazy],
+        'Udział sprzedaży promocyjnej (%)': 100 * sumy[kol_promocyjna] / sumy[kol_sprzedazy].where(sumy[kol_sprzedazy] != 0),
+        'Liczba promocji': promocje.groupby('Kod SAP').size().reindex(sumy.index, fill_value=0),
+        'Dominujący rodzaj promocji': rodzaje.groupby(level='Kod SAP').idxmax().str[1].reindex(sumy.index),
+        'HHI rodzajów promocji': (udzialy_rodzajow ** 2).groupby(level='Kod SAP').sum().reindex(sumy.index),
+        'Pozycje sprzedaży': sumy['Wiersze'],
+    }).sort_values('Sprzedaż', ascending=False)
+    wynik['Udział w sprzedaży (%)'] = 100 * wynik['Sprzedaż'] / wynik['Sprzedaż'].sum()
+    return wynik
+
+
+def wersja_udzialow_produktow() -> tuple:
+    """Wersja surowych plików sprzedaży i 'rynek.parquet' - źródeł złączenia udziałów produktów."""
+    return wersja_plikow([f"sprzedaz_{przyrostek}.parquet" for przyrostek in kategorie_pliki.values()]
+                         + ["rynek.parquet"])
+
+
+@st.cache_resource(max_entries=1)
+def zbuduj_udzialy_produktow(wersja_danych: tuple) -> UdzialyProduktow:
+    # Złączenie budowane raz na wersję plików i współdzielone przez sesje; None, gdy brak danych produktowych
+    sprzedaz, _ = load_surowa_sprzedaz_agregaty()
+    rynek = load_rynek_data()
+    if sprzedaz.empty or rynek.empty:
+        return None
+    return UdzialyProduktow(sprzedaz, rynek)
+
+
+def wersja_hierarchii() -> tuple:
+    """Wersja plików, z których powstaje hierarchia sprzedaży (plik liści i surowa sprzedaż)."""
+    return wersja_plikow(["hierarchia_sprzedazy.parquet"]
+                         + [f"sprzedaz_{przyrostek}.parquet" for przyrostek in kategorie_pliki.values()])
+
+
+@st.cache_resource(max_entries=1)
+def hierarchia_sprzedazy(wersja_danych: tuple) -> HierarchiaSprzedazy:
+    """
+    Hierarchia z 'hierarchia_sprzedazy.parquet' (generowanego przez przetworz_dane.py), a bez niego
+    z surowych plików sprzedaży; None, gdy nie ma żadnego z nich. wersja_danych (wersja_hierarchii)
+    przebudowuje drzewo po podmianie plików.
+    """
+    try:
+        liscie = pd.read_parquet("hierarchia_sprzedazy.parquet")
+    except FileNotFoundError:
+        fragmenty = [agreguj_hierarchie_kategorii(kategoria) for kategoria, przyrostek in kategorie_pliki.items()
+                     if os.path.exists(f"sprzedaz_{przyrostek}.parquet")]
+        if not fragmenty:
+            return None
+        liscie = pd.concat(fragmenty, ignore_index=True)
+    return HierarchiaSprzedazy(liscie)
+
+
+@pamiec.zapamietaj
+def oblicz_uplift_promocji_cached(df_promocje: pd.DataFrame) -> pd.DataFrame:
+    sprzedaz_mies, rodzaje_promocji = load_surowa_sprzedaz_agregaty()
+    return oblicz_uplift_promocji(df_promocje, sprzedaz_mies, rodzaje_promocji, load_rynek_data())
+
+
+@pamiec.zapamietaj
+def zestaw_uplift(df_uplift: pd.DataFrame, wg: str) -> pd.DataFrame:
+    """Ranking uplift'u zagregowany po wybranej kolumnie (mediana - odporna na pojedyncze skrajne promocje)."""
+    if df_uplift.empty:
+        return pd.DataFrame()
+    return (
+        df_uplift.groupby(wg)
+        .agg(**{
+            'Liczba promocji': ('Id promocji', 'count'),
+            'Mediana uplift vs przed (%)': ('Uplift vs przed (%)', 'median'),
+            'Mediana uplift r/r (%)': ('Uplift r/r (%)', 'median'),
+            'Sprzedaż w trakcie': ('Sprzedaż w trakcie', 'sum'),
+        })
+        .sort_values('Mediana uplift vs przed (%)', ascending=False)
+    )
+
+
+# --- Prognozy: addytywny Holt-Winters z sezonowością roczną, liczony wsadowo dla wszystkich szeregów ---
+
+
+def wersja_danych_sprzedazy() -> tuple:
+    """
+    Wersja plików źródłowych szeregów sprzedaży (kostka i surowa sprzedaż produktów) - klucz cache prognoz
+    i anomalii. Obejmuje wersja_kostki, więc nowa wersja oznacza też przebudowaną kostkę_olap.
+    """
+    return wersja_kostki() + wersja_plikow([f"sprzedaz_{przyrostek}.parquet" for przyrostek in kategorie_pliki.values()])
+
+
+def szeregi_sprzedazy() -> list:
+    """
+    Miesięczne szeregi sprzedaży jako lista (poziom, df long z kolumną 'Szereg', miary): łącznie i kategorie
+    z kostki, produkty z surowych agregatów - wszystkie w obu miarach.
+    """
+    zrodla = []
+    laczna, _ = kostka_olap.zestaw(['Rok', 'Miesiąc'])
+    laczna['Szereg'] = "Łącznie"
+    zrodla.append(("Łącznie", laczna, KostkaOLAP.MIARY))
+    if kostka_olap.pelna:
+        kategorie, _ = kostka_olap.zestaw(['Kategoria', 'Rok', 'Miesiąc'])
+        zrodla.append(("Kategoria", kategorie.rename(columns={'Kategoria': 'Szereg'}), KostkaOLAP.MIARY))
+    produkty, _ = load_surowa_sprzedaz_agregaty()
+    if not produkty.empty:
+        zrodla.append(("Produkt", produkty.rename(columns={'Indeks': 'Szereg', 'Sprzedaż ilość': 'Ilość'}),
+                       KostkaOLAP.MIARY))
+    return zrodla
+
+
+# Zakres suwaka horyzontu prognozy w zakładce 2 - cache mieści prognozy dla każdego horyzontu
+HORYZONTY_PROGNOZY = range(3, 13)
+
+@pamiec.zapamietaj(max_wpisow=len(HORYZONTY_PROGNOZY))
+def prognozy_sprzedazy(wersja_danych: tuple, horyzont: int) -> pd.DataFrame:
+    """Prognozy na `horyzont` miesięcy dla wszystkich szeregów sprzedaży; cache kluczowany wersją plików źródłowych."""
+    wyniki = []
+    for poziom, df, miary in szeregi_sprzedazy():
+        for miara in miary:
+            nazwy, macierz, ostatni = macierz_szeregow(df, 'Szereg', miara)
+            if macierz.shape[1] < 24:
+                continue
+            prognoza, dolna, gorna = holt_winters_wsadowo(macierz, horyzont)
+            miesiace = ostatni + np.arange(1, horyzont + 1)
+            wyniki.append(pd.DataFrame({
+                'Poziom': poziom,
+                'Szereg': np.repeat(nazwy, horyzont),
+                'Miara': miara,
+                'Rok': np.tile(miesiace // 12, len(nazwy)),
+                'Miesiąc': np.tile(miesiace % 12 + 1, len(nazwy)),
+                'Prognoza': prognoza.ravel(),
+                'Dolna granica': dolna.ravel(),
+                'Górna granica': gorna.ravel(),
+            }))
+    if not wyniki:
+        return pd.DataFrame(columns=['Poziom', 'Szereg', 'Miara', 'Rok', 'Miesiąc',
+                                     'Prognoza', 'Dolna granica', 'Górna granica'])
+    return pd.concat(wyniki, ignore_index=True)
+
+
+# --- Wykrywanie anomalii: odporne z-score poziomu i reszt sezonowych dla wszystkich szeregów naraz ---
+
+
+@st.cache_resource
+def ostatni_detektor() -> list:
+    # [detektor] ostatnio zbudowany przez detektor_anomalii - kolejna wersja danych startuje z jego stanem
+    return []
+
+
+@st.cache_resource(max_entries=1)
+def detektor_anomalii(wersja_danych: tuple) -> DetektorAnomalii:
+    """
+    Detektor dla wersji plików źródłowych (tej samej, którą kluczowane jest anomalie_szeregow). Przejmuje stan
+    poprzedniego, więc po dopisaniu nowego miesiąca oceniany jest tylko ten miesiąc.
+    """
+    ostatni = ostatni_detektor()
+    detektor = DetektorAnomalii(poprzedni=ostatni[0] if ostatni else None)
+    ostatni[:] = [detektor]
+    return detektor
+
+
+@pamiec.zapamietaj(max_wpisow=4)
+def anomalie_szeregow(wersja_danych: tuple) -> pd.DataFrame:
+    """
+    Alerty dla wszystkich szeregów sprzedaży (łącznie, kategorie, produkty) i udziałów rynkowych,
+    posortowane malejąco wg siły anomalii. Cache kluczowany wersją plików źródłowych.
+    """
+    zrodla = [("Sprzedaż", poziom, df, miary) for poziom, df, miary in szeregi_sprzedazy()]
+    udzialy = load_udzialy_data()
+    if not udzialy.empty:
+        zrodla.append(("Udział rynkowy", "Łącznie", udzialy.assign(Szereg="Łącznie"),
+                       ('Udział ilościowy (%)', 'Udział wartościowy (%)')))
+
+    detektor = detektor_anomalii(wersja_danych)
+    alerty = []
+    for zrodlo, poziom, df, miary in zrodla:
+        for miara in miary:
+            nazwy, macierz, ostatni = macierz_szeregow(df, 'Szereg', miara)
+            pierwszy = ostatni - macierz.shape[1] + 1
+            z_poziomu, z_sezonowy = detektor.ocen(f"{zrodlo}|{poziom}|{miara}", nazwy, macierz, pierwszy)
+            wynik = np.fmax(np.abs(z_poziomu), np.abs(z_sezonowy))
+            wiersze, kolumny = np.nonzero(wynik >= PROG_ANOMALII)
+            if len(wiersze) == 0:
+                continue
+            dominujacy = np.where(np.abs(z_poziomu) >= np.nan_to_num(np.abs(z_sezonowy)), z_poziomu, z_sezonowy)
+            miesiace = pierwszy + kolumny
+            alerty.append(pd.DataFrame({
+                'Źródło': zrodlo,
+                'Poziom': poziom,
+                'Szereg': nazwy[wiersze],
+                'Miara': miara,
+                'Rok': miesiace // 12,
+                'Miesiąc': miesiace % 12 + 1,
+                'Wartość': macierz[wiersze, kolumny],
+                'z poziomu': z_poziomu[wiersze, kolumny],
+                'z sezonowy': z_sezonowy[wiersze, kolumny],
+                'Siła anomalii': wynik[wiersze, kolumny],
+                'Kierunek': np.where(dominujacy[wiersze, kolumny] > 0, "wzrost", "spadek"),
+            }))
+    if not alerty:
+        return pd.DataFrame(columns=['Źródło', 'Poziom', 'Szereg', 'Miara', 'Rok', 'Miesiąc', 'Wartość',
+                                     'z poziomu', 'z sezonowy', 'Siła anomalii', 'Kierunek'])
+    return pd.concat(alerty, ignore_index=True).sort_values('Siła anomalii', ascending=False, ignore_index=True)
+
+
 # --- Funkcje wizualizacji (ogólne i dla miesięcznych) ---
 
-@st.cache_data
+@pamiec.zapamietaj
 def przygotuj_daty_cached(df: pd.DataFrame) -> pd.DataFrame:
     df_copy = df.copy()
     df_copy['Data'] = pd.to_datetime(df_copy['Rok'].astype(str) + '-' + df_copy['Miesiąc'].astype(str) + '-01')
@@ -256,106 +832,51 @@ def show_podium_months_static(data_list: list, title: str):
     months = [item["miesiac"] for item in data_list] + ["-"] * (3 - len(data_list))
     counts = [item["liczba"] for item in data_list] + [0] * (3 - len(data_list))
 
-    # HTML i CSS dla podium (bez zmian, tak jak podałeś)
-    podium_html = f"""
-    <style>
-        .podium {{
-            display: flex;
-            justify-content: center;
-            align-items: flex-end;
-            gap: 20px;
-            margin-bottom: 20px;
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-        }}
-        .place {{
-            text-align: center;
-            color: #333;
-            border-radius: 10px;
-            padding: 10px;
-            background: #e8f0fe;
-            box-shadow: 2px 2px 6px rgba(65, 105, 225, 0.3);
-        }}
-        .first {{
-            font-size: 1.6rem;
-            font-weight: 700;
-            height: 150px;
-            background: #4169E1;
-            color: white;
-            flex: 1.5;
-            display: flex;
-            flex-direction: column;
-            justify-content: flex-end;
-            padding-bottom: 15px;
-            border-radius: 12px;
-        }}
-        .second {{
-            font-size: 1.2rem;
-            font-weight: 600;
-            height: 120px;
-            background: #89a9f7;
-            color: white;
-            flex: 1.2;
-            display: flex;
-            flex-direction: column;
-            justify-content: flex-end;
-            padding-bottom: 10px;
-            border-radius: 10px;
-        }}
-        .third {{
-            font-size: 1rem;
-            font-weight: 600;
-            height: 100px;
-            background: #c1cfff;
-            color: #333;
-            flex: 1;
-            display: flex;
-            flex-direction: column;
-            justify-content: flex-end;
-            padding-bottom: 10px;
-            border-radius: 10px;
-        }}
-        .place .rank {{
-            font-weight: 900;
-            font-size: 1.4rem;
-            margin-bottom: 5px;
-        }}
-        .place .month {{
-            font-weight: 700;
-        }}
-        .place .count {{
-            font-size: 1rem;
-            opacity: 0.8;
-        }}
-    </style>
-    <div class="podium">
-        <div class="second place">
-            <div class="rank">2</div>
-            <div class="month">{months[1]}</div>
-            <div class="count">Liczba: {counts[1]:,.0f}</div>
-        </div>
-        <div class="first place">
-            <div class="rank">1</div>
-            <div class="month">{months[0]}</div>
-            <div class="count">Liczba: {counts[0]:,.0f}</div>
-        </div>
-        <div class="third place">
-            <div class="rank">3</div>
-            <div class="month">{months[2]}</div>
-            <div class="count">Liczba: {counts[2]:,.0f}</div>
-        </div>
-    </div>
-    """
+    # Style .podium/.place są w STYLE_KART - tu tylko treść, nagłówek i podium w jednym elemencie
+    liczby = formatuj_liczby(counts)
+    podium_html = '<div class="podium">' + "".join(
+        f'<div class="{klasa} place"><div class="rank">{i + 1}</div><div class="month">{months[i]}</div>'
+        f'<div class="count">Liczba: {liczby[i]}</div></div>'
+        for i, klasa in [(1, "second"), (0, "first"), (2, "third")]
+    ) + "</div>"
 
-    st.markdown(f"### 📅 Top 3 miesiące: {title}", unsafe_allow_html=True)
-    st.markdown(podium_html, unsafe_allow_html=True)
-@st.cache_data
+    st.markdown(f"### 📅 Top 3 miesiące: {title}\n\n{podium_html}", unsafe_allow_html=True)
+# --- Długie szeregi: downsampling LTTB i ślady WebGL ---
+PROG_WEBGL = 1_000     # powyżej tylu punktów w śladzie rysujemy przez WebGL (go.Scattergl)
+MAKS_PUNKTOW = 2_000   # tyle punktów śladu maksymalnie trafia do JSON-a wykresu
+
+
+def slad_liniowy(x, y, **kwargs):
+    """
+    Ślad liniowy dla dowolnej długości szeregu: powyżej MAKS_PUNKTOW downsampling LTTB, powyżej PROG_WEBGL - WebGL.
+    To decymacja o stałej rozdzielczości: LTTB wybiera punkty raz dla całego szeregu, więc przybliżenie
+    fragmentu wykresu pokazuje te same punkty, a nie gęstsze próbkowanie widocznego zakresu
+    (st.plotly_chart nie przekazuje zakresu osi do serwera, więc nie da się go próbkować ponownie).
+    """
+    x, y = np.asarray(x), np.asarray(y, dtype=float)
+    if len(y) > MAKS_PUNKTOW:
+        skonczone = np.isfinite(y)
+        x, y = x[skonczone], y[skonczone]
+        if np.issubdtype(x.dtype, np.datetime64):
+            x_liczbowe = x.astype('datetime64[ns]').astype(np.int64).astype(float)
+        elif np.issubdtype(x.dtype, np.number):
+            x_liczbowe = x.astype(float)
+        else:  # oś kategoryczna - liczy się kolejność punktów
+            x_liczbowe = np.arange(len(x), dtype=float)
+        wybrane = lttb_indeksy(x_liczbowe, y, MAKS_PUNKTOW)
+        x, y = x[wybrane], y[wybrane]
+    klasa_sladu = go.Scattergl if len(y) > PROG_WEBGL else go.Scatter
+    return klasa_sladu(x=x, y=y, **kwargs)
+
+
+@pamiec.zapamietaj
 def rysuj_wykres_liniowy_cached(df: pd.DataFrame, kolumna_do_wizualizacji: str, tytul: str) -> go.Figure:
     fig = go.Figure()
     for rok in sorted(df['Rok'].unique()):
         df_rok = df[df['Rok'] == rok]
-        fig.add_trace(go.Scatter(
-            x=df_rok['Data'],
-            y=df_rok['sprzedaz_total'],
+        fig.add_trace(slad_liniowy(
+            df_rok['Data'],
+            df_rok['sprzedaz_total'],
             mode='lines+markers',
             name=str(rok)
         ))
@@ -363,7 +884,7 @@ def rysuj_wykres_liniowy_cached(df: pd.DataFrame, kolumna_do_wizualizacji: str,
         title=tytul,
         xaxis_title='Miesiąc',
         yaxis_title=kolumna_do_wizualizacji,
-        yaxis_tickformat=',',
+        yaxis_tickformat=',', separators=', ',
         xaxis=dict(tickformat='%b'),
         yaxis_range=[0, df['sprzedaz_total'].max() * 1.1],
         hovermode='x unified'
@@ -377,15 +898,26 @@ def tabela_top_bottom(df, rok, kolumna_do_wizualizacji, st_col):
 
     st_col.markdown(f"### {rok} — Top 3 miesiące")
     top3 = df.nlargest(3, 'sprzedaz_total')[['Miesiąc_nazwa', 'sprzedaz_total']]
-    top3['sprzedaz_total'] = top3['sprzedaz_total'].map('{:,.0f}'.format)
+    top3['sprzedaz_total'] = formatuj_liczby(top3['sprzedaz_total'])
     st_col.table(top3.rename(columns={"Miesiąc_nazwa": "Miesiąc", "sprzedaz_total": kolumna_do_wizualizacji}))
 
     st_col.markdown(f"### {rok} — Bottom 3 miesiące")
     bottom3 = df.nsmallest(3, 'sprzedaz_total')[['Miesiąc_nazwa', 'sprzedaz_total']]
-    bottom3['sprzedaz_total'] = bottom3['sprzedaz_total'].map('{:,.0f}'.format)
+    bottom3['sprzedaz_total'] = formatuj_liczby(bottom3['sprzedaz_total'])
     st_col.table(bottom3.rename(columns={"Miesiąc_nazwa": "Miesiąc", "sprzedaz_total": kolumna_do_wizualizacji}))
 # --- Funkcja pomocnicza do tworzenia formatowania dla DataFrame'ów ---
-def get_numeric_columns_format_dict(df, format_string="{:,.2f}", exclude_columns=None):
+def kolumna_liczb(miejsca=0, znak=False, **kwargs):
+    """
+    Typowana kolumna liczbowa dla column_config: do przeglądarki trafiają surowe liczby, a formatuje je ona sama
+    (w ustawieniach regionalnych użytkownika, z `miejsca` miejscami po przecinku). znak=True pokazuje '+'
+    przy wartościach dodatnich (np. z-score). Pozostałe argumenty (width, help, ...) trafiają do NumberColumn.
+    """
+    if znak:
+        return st.column_config.NumberColumn(format=f"%+.{miejsca}f", **kwargs)
+    return st.column_config.NumberColumn(format="localized", step=10 ** -miejsca, **kwargs)
+
+def get_numeric_columns_format_dict(df, miejsca=2, exclude_columns=None):
+    """column_config z kolumna_liczb(miejsca) dla wszystkich kolumn liczbowych df."""
     if exclude_columns is None:
         exclude_columns = []
 
@@ -393,35 +925,89 @@ def get_numeric_columns_format_dict(df, format_string="{:,.2f}", exclude_columns
     format_dict = {}
     for col in numeric_cols:
         if col not in exclude_columns:
-            format_dict[col] = format_string
+            format_dict[col] = kolumna_liczb(miejsca)
     return format_dict
-@st.cache_data
-def pivot_monthly_sales(df: pd.DataFrame) -> pd.DataFrame:
-    if 'Miesiąc_nazwa_skrot' not in df.columns:
-        df['Miesiąc_nazwa_skrot'] = df['Miesiąc'].map(month_names_short)
-
-    pivot_df = df.pivot(index='Miesiąc_nazwa_skrot', columns='Rok', values='sprzedaz_total').reindex(
-        list(month_names_short.values())
-    )
-    return pivot_df
-@st.cache_data
-def agreguj_sprzedaz_kategorie(df_aggregated: pd.DataFrame, sales_col: str) -> pd.DataFrame:
+# --- Tabele stronicowane: sortowanie i wyszukiwanie po stronie serwera, do przeglądarki trafia tylko strona ---
+@pamiec.zapamietaj(max_wpisow=64)
+def pozycje_tabeli(df: pd.DataFrame, kolumna_sortowania, rosnaco: bool, fraza: str) -> np.ndarray:
+    """Pozycje wierszy df po odfiltrowaniu frazą (we wszystkich kolumnach i indeksie) i posortowaniu."""
+    pozycje = np.arange(len(df))
+    if fraza:
+        maska = np.asarray(df.index.astype(str).str.contains(fraza, case=False, regex=False), dtype=bool)
+        for kolumna in df.columns:
+            maska |= df[kolumna].astype(str).str.contains(fraza, case=False, regex=False).to_numpy()
+        pozycje = pozycje[maska]
+    if kolumna_sortowania is not None:
+        wartosci = df[kolumna_sortowania] if kolumna_sortowania in df.columns else df.index.to_series()
+        kolejnosc = pd.Series(wartosci.to_numpy()[pozycje]).sort_values(
+            ascending=rosnaco, kind='stable', na_position='last'
+        ).index.to_numpy()
+        pozycje = pozycje[kolejnosc]
+    return pozycje
+
+def tabela_stronicowana(df: pd.DataFrame, klucz: str, column_config=None, rozmiar_strony: int = 25):
     """
-    Agreguje sprzedaż po kategoriach dla wszystkich lat z df_aggregated.
-    sales_col: nazwa kolumny sprzedaży w df_aggregated (np. 'sprzedaz_budzetowa_total')
+    Wyświetla tabelę stroną: sortowanie i wyszukiwanie liczone są na serwerze, do przeglądarki trafia tylko
+    widoczna strona z surowymi kolumnami, a formaty liczb i szerokości opisuje column_config (bez Stylera).
+    Tabele mieszczące się na jednej stronie pokazujemy bez kontrolek.
     """
-    if df_aggregated.empty:
-        return pd.DataFrame(columns=['Kategoria nazwa', 'sprzedaz_total', 'Rok'])
-
-    # Grupujemy po 'Kategoria nazwa' i 'Rok', sumując wybraną kolumnę sprzedaży
-    df_agg = (
-        df_aggregated.groupby(["Kategoria nazwa", "Rok"])
-        .agg(sprzedaz_total=(sales_col, "sum"))
-        .reset_index()
+    if len(df) <= rozmiar_strony:
+        st.dataframe(df, column_config=column_config, use_container_width=True)
+        return
+
+    kol_szukaj, kol_sort, kol_kierunek, kol_strona = st.columns([3, 3, 2, 2])
+    fraza = kol_szukaj.text_input("Szukaj", key=f"{klucz}_szukaj")
+    opcje_sortowania = [None] + ([df.index.name] if df.index.name and df.index.name not in df.columns else []) \
+        + list(df.columns)
+    kolumna_sortowania = kol_sort.selectbox(
+        "Sortuj wg", opcje_sortowania, format_func=lambda k: "—" if k is None else str(k), key=f"{klucz}_sortuj"
     )
-    return df_agg
-@st.cache_data
-def rysuj_wykres_kategorie(df: pd.DataFrame, sales_col_name: str) -> go.Figure:
+    rosnaco = kol_kierunek.selectbox("Kolejność", ["Malejąco", "Rosnąco"], key=f"{klucz}_kierunek") == "Rosnąco"
+
+    pozycje = pozycje_tabeli(df, kolumna_sortowania, rosnaco, fraza.strip())
+    liczba_stron = max(1, -(-len(pozycje) // rozmiar_strony))
+    if st.session_state.get(f"{klucz}_strona", 1) > liczba_stron:  # np. po zawężeniu wyszukiwania
+        st.session_state[f"{klucz}_strona"] = 1
+    strona = kol_strona.number_input("Strona", min_value=1, max_value=liczba_stron, value=1, key=f"{klucz}_strona")
+
+    poczatek = (strona - 1) * rozmiar_strony
+    df_strona = df.iloc[pozycje[poczatek:poczatek + rozmiar_strony]]
+    st.dataframe(df_strona, column_config=column_config, use_container_width=True)
+    if len(pozycje) == 0:
+        st.caption("Brak wierszy spełniających kryteria wyszukiwania.")
+    else:
+        st.caption(f"Wiersze {poczatek + 1}–{poczatek + len(df_strona)} z {len(pozycje)} (strona {strona}/{liczba_stron})")
+@pamiec.zapamietaj
+@dysk.zapamietaj
+def pivot_monthly_sales_cached(df: pd.DataFrame) -> pd.DataFrame:
+    return pivot_monthly_sales(df)
+
+@pamiec.zapamietaj
+@dysk.zapamietaj
+def agreguj_sprzedaz_kategorie_cached(df_aggregated: pd.DataFrame, sales_col: str) -> pd.DataFrame:
+    return agreguj_sprzedaz_kategorie(df_aggregated, sales_col)
+
+PROGI_PARETO = [70, 80, 90]  # opcje progu koncentracji w zakładce 4 (rozgrzewka liczy każdy)
+
+@pamiec.zapamietaj
+@dysk.zapamietaj
+def analiza_pareto_cached(df_agg: pd.DataFrame, grupa_kolumna: str, filtr: str, prog: float, rok_filtr: int = None) -> tuple:
+    return analiza_pareto_from_agg(df_agg, grupa_kolumna, filtr, prog, rok_filtr=rok_filtr)
+
+@pamiec.zapamietaj
+@dysk.zapamietaj
+def tabela_porownawcza(plik_2024: str, plik_2023: str, wersja_danych: tuple) -> pd.DataFrame:
+    """Tabela porównawcza 2024 (2023) - wczytanie i budowa są pomijane, gdy wynik dla tej wersji plików jest w cache."""
+    return przygotuj_tabele_porownawcza_surowa(pd.read_parquet(plik_2024), pd.read_parquet(plik_2023))
+
+def przezroczystosc_wyboru(wartosci: pd.Series, wybrane) -> list:
+    """Podświetlenie słupków zaznaczonych filtrem krzyżowym - pozostałe są przygaszone."""
+    if not wybrane:
+        return [1.0] * len(wartosci)
+    return [1.0 if wartosc in wybrane else 0.3 for wartosc in wartosci]
+@pamiec.zapamietaj
+@dysk.zapamietaj
+def rysuj_wykres_kategorie(df: pd.DataFrame, sales_col_name: str, wybrane: tuple = ()) -> go.Figure:
     fig = go.Figure()
     if df.empty:
         fig.add_annotation(text="Brak danych o kategoriach do wyświetlenia.",
@@ -436,8 +1022,9 @@ def rysuj_wykres_kategorie(df: pd.DataFrame, sales_col_name: str) -> go.Figure:
             x=df_rok["Kategoria nazwa"],
             y=df_rok["sprzedaz_total"],
             name=str(rok),
-            text=df_rok["sprzedaz_total"].map(lambda x: f"{x:,.0f}"),
-            textposition='outside'
+            text=formatuj_liczby(df_rok["sprzedaz_total"]),
+            textposition='outside',
+            marker_opacity=przezroczystosc_wyboru(df_rok["Kategoria nazwa"], wybrane)
         ))
     fig.update_layout(
         title=f"Sprzedaż wg kategorii — porównanie lat",
@@ -445,7 +1032,7 @@ def rysuj_wykres_kategorie(df: pd.DataFrame, sales_col_name: str) -> go.Figure:
         yaxis_title=sales_col_name,
         barmode='group',
         xaxis_tickangle=-45,
-        yaxis_tickformat=',',
+        yaxis_tickformat=',', separators=', ',
         legend_title="Rok",
         bargap=0.2,
         height=700,
@@ -454,8 +1041,24 @@ def rysuj_wykres_kategorie(df: pd.DataFrame, sales_col_name: str) -> go.Figure:
     max_val = df["sprzedaz_total"].max() * 1.2
     fig.update_yaxes(range=[0, max_val])
     return fig
-@st.cache_data
-def create_total_sales_chart(df_pivot: pd.DataFrame, sales_col_name: str) -> go.Figure:
+@pamiec.zapamietaj
+def rysuj_wykres_udzialow(df: pd.DataFrame, kolumna: str, tytul: str, kolory_lat: dict) -> go.Figure:
+    """Udziały miesięczne - jedna linia na rok (odpowiednik px.line z color='Rok')."""
+    fig = go.Figure()
+    for rok in sorted(df['Rok'].unique()):
+        df_rok = df[df['Rok'] == rok]
+        fig.add_trace(slad_liniowy(
+            df_rok['Miesiąc'],
+            df_rok[kolumna],
+            mode='lines+markers',
+            name=str(rok),
+            line_color=kolory_lat.get(rok)
+        ))
+    fig.update_layout(title=tytul, xaxis_title='Miesiąc', yaxis_title=kolumna, legend_title='Rok')
+    return fig
+@pamiec.zapamietaj
+@dysk.zapamietaj
+def create_total_sales_chart(df_pivot: pd.DataFrame, sales_col_name: str, prognoza: pd.DataFrame = None) -> go.Figure:
     fig = go.Figure()
     if df_pivot.empty:
         fig.add_annotation(text="Brak danych do wyświetlenia wykresu.",
@@ -465,25 +1068,458 @@ def create_total_sales_chart(df_pivot: pd.DataFrame, sales_col_name: str) -> go.
         return fig
 
     for rok in df_pivot.columns:
-        fig.add_trace(go.Scatter(
-            x=df_pivot.index,
-            y=df_pivot[rok],
+        fig.add_trace(slad_liniowy(
+            df_pivot.index,
+            df_pivot[rok],
             mode='lines+markers',
             name=str(rok)
         ))
+    # Prognoza (Rok, Miesiąc, Prognoza, Dolna/Górna granica) - przerywana linia z pasmem przedziału
+    if prognoza is not None and not prognoza.empty:
+        for rok, df_rok in prognoza.groupby('Rok'):
+            miesiace = df_rok['Miesiąc'].map(month_names_short)
+            fig.add_trace(go.Scatter(x=miesiace, y=df_rok['Górna granica'], mode='lines', line_width=0,
+                                     showlegend=False, hoverinfo='skip'))
+            fig.add_trace(go.Scatter(x=miesiace, y=df_rok['Dolna granica'], mode='lines', line_width=0,
+                                     fill='tonexty', fillcolor='rgba(128, 128, 128, 0.25)',
+                                     name=f"{rok} (przedział 95%)", hoverinfo='skip'))
+            fig.add_trace(go.Scatter(x=miesiace, y=df_rok['Prognoza'], mode='lines+markers',
+                                     line_dash='dash', name=f"{rok} (prognoza)"))
     fig.update_layout(
         title=f'Łączna {sales_col_name} — porównanie miesięcy ({min(df_pivot.columns)}–{max(df_pivot.columns)})',
         xaxis_title='Miesiąc',
         yaxis_title=sales_col_name,
-        yaxis_tickformat=',',
+        yaxis_tickformat=',', separators=', ',
         hovermode='x unified',
         legend_title='Rok'
     )
     return fig
 
 
+# --- Filtry globalne (panel boczny) i filtry krzyżowe (kliknięcia na wykresach) ---
+# Wyniki widoków trzymamy w sesji; po zmianie filtra przeliczane są tylko widoki zależne od niego w grafie.
+st.session_state.setdefault('filtr_krzyzowy', {})
+st.session_state.setdefault('wyniki_widokow', {})
+if st.session_state.get('wersja_kostki') != wersja_kostki_olap:  # kostka przebudowana po podmianie plików
+    st.session_state['wyniki_widokow'] = {}
+    st.session_state['wersja_kostki'] = wersja_kostki_olap
+
+def uniewaznij_widoki(wymiar: str, krzyzowy: bool = False):
+    for widok in graf_widokow.zalezne_od(wymiar, krzyzowy):
+        st.session_state['wyniki_widokow'].pop(widok, None)
+
+def zaznacz_na_wykresie(klucz_wykresu: str, wymiar: str):
+    """Callback on_select wykresu Plotly - kliknięte słupki stają się filtrem krzyżowym dla pozostałych widoków."""
+    punkty = st.session_state[klucz_wykresu].selection.points
+    wartosci = sorted({punkt['x'] for punkt in punkty})
+    if (st.session_state['filtr_krzyzowy'].get(wymiar) or []) != wartosci:
+        st.session_state['filtr_krzyzowy'][wymiar] = wartosci or None
+        uniewaznij_widoki(wymiar, krzyzowy=True)
+
+def wyczysc_filtr_krzyzowy():
+    for wymiar in list(st.session_state['filtr_krzyzowy']):
+        uniewaznij_widoki(wymiar, krzyzowy=True)
+    st.session_state['filtr_krzyzowy'] = {}
+
+with st.sidebar:
+    st.header("🔎 Filtry globalne")
+    lata_kostki = kostka_olap.wartosci('Rok') or top_years
+    if len(lata_kostki) > 1:
+        rok_od, rok_do = st.select_slider(
+            "Zakres lat", options=lata_kostki, value=(lata_kostki[0], lata_kostki[-1]), key="filtr_lata",
+            on_change=uniewaznij_widoki, args=('Rok',)
+        )
+    else:
+        rok_od = rok_do = lata_kostki[0]
+    kategorie_kostki = kostka_olap.wartosci('Kategoria')
+    kategorie_wybrane = st.multiselect("Kategorie", kategorie_kostki, default=kategorie_kostki, key="filtr_kategorie",
+                                       on_change=uniewaznij_widoki, args=('Kategoria',))
+    rodzaje_kostki = kostka_olap.wartosci('Rodzaj promocji')
+    rodzaje_wybrane = st.multiselect("Rodzaje promocji", rodzaje_kostki, default=rodzaje_kostki, key="filtr_promocje",
+                                     on_change=uniewaznij_widoki, args=('Rodzaj promocji',))
+    miara_globalna = st.radio(
+        "Miara sprzedaży", ["Sprzedaż ilościowa", "Sprzedaż wartościowa"], key="filtr_miara"
+    )
+    if not kostka_olap.pelna:
+        st.caption("ℹ️ Brak pliku 'kostka_sprzedazy.parquet' - filtry kategorii i promocji "
+                   "działają tylko na wykresach z tym samym wymiarem.")
+
+    filtr_krzyzowy = {w: v for w, v in st.session_state['filtr_krzyzowy'].items() if v}
+    if filtr_krzyzowy:
+        st.markdown("**🖱️ Zaznaczone na wykresach**")
+        for wymiar, wartosci in filtr_krzyzowy.items():
+            st.caption(f"{wymiar}: {', '.join(map(str, wartosci))}")
+        st.button("Wyczyść zaznaczenie", on_click=wyczysc_filtr_krzyzowy, key="wyczysc_filtr_krzyzowy")
+
+lata_wybrane = [int(rok) for rok in lata_kostki if rok_od <= rok <= rok_do]
+# Zaznaczenie wszystkich wartości traktujemy jak brak filtra - kostka sięga wtedy po mniejszy agregat
+filtry_globalne = {
+    'Rok': (rok_od, rok_do),
+    'Kategoria': None if set(kategorie_wybrane) == set(kategorie_kostki) else kategorie_wybrane,
+    'Rodzaj promocji': None if set(rodzaje_wybrane) == set(rodzaje_kostki) else rodzaje_wybrane,
+}
+kolumna_miary = wybierz_kolumne_wg(miara_globalna)
+
+def dane_z_kostki(widok: str) -> pd.DataFrame:
+    """
+    Dane widoku z kostki z bieżącymi filtrami globalnymi i krzyżowymi. Wynik jest pamiętany w sesji
+    do czasu zmiany filtra, od którego widok zależy; informuje, które filtry nie mogły być zastosowane.
+    """
+    wyniki = st.session_state['wyniki_widokow']
+    if widok not in wyniki:
+        filtry = graf_widokow.filtry_widoku(widok, filtry_globalne, filtr_krzyzowy)
+        wyniki[widok] = kostka_olap.zestaw(graf_widokow.wymiary(widok), filtry)
+    df, pominiete = wyniki[widok]
+    if pominiete:
+        st.caption(f"ℹ️ Filtr: {', '.join(pominiete)} nie jest dostępny dla tego wykresu.")
+    return df.copy()
+
+def prognoza_widoku(df_miesieczny: pd.DataFrame, miara: str, horyzont: int) -> pd.DataFrame:
+    """
+    Prognoza dla szeregu widocznego na wykresie: bez filtrów (lub dla jednej kategorii) bierzemy ją
+    z prognoz wsadowych, w pozostałych przypadkach liczymy model dla tego jednego szeregu.
+    """
+    filtry = graf_widokow.filtry_widoku('sprzedaz_miesieczna', filtry_globalne, filtr_krzyzowy)
+    if filtry['Rodzaj promocji'] is None and (filtry['Kategoria'] is None or len(filtry['Kategoria']) == 1):
+        poziom, szereg = ("Łącznie", "Łącznie") if filtry['Kategoria'] is None else ("Kategoria", filtry['Kategoria'][0])
+        prognozy = prognozy_sprzedazy(wersja_danych_sprzedazy(), horyzont)
+        wybrana = prognozy[(prognozy['Poziom'] == poziom) & (prognozy['Szereg'] == szereg) & (prognozy['Miara'] == miara)]
+        if not wybrana.empty:
+            return wybrana
+    return prognoza_szeregu(df_miesieczny[['Rok', 'Miesiąc', 'sprzedaz_total']], horyzont)
+
+def pokaz_alerty(df_alerty: pd.DataFrame, klucz: str):
+    """Ranking alertów anomalii (najsilniejsze na górze) w tabeli stronicowanej."""
+    if df_alerty.empty:
+        st.success(f"Brak anomalii powyżej progu |z| ≥ {PROG_ANOMALII}.")
+        return
+    tabela_stronicowana(
+        df_alerty.drop(columns=['Źródło']), klucz,
+        column_config={
+            'Wartość': kolumna_liczb(2), 'z poziomu': kolumna_liczb(2, znak=True, width="small"),
+            'z sezonowy': kolumna_liczb(2, znak=True, width="small"), 'Siła anomalii': kolumna_liczb(2, width="small")
+        }
+    )
+
+@pamiec.zapamietaj(max_wpisow=32)
+def prognoza_szeregu(df_miesieczny: pd.DataFrame, horyzont: int) -> pd.DataFrame:
+    df = df_miesieczny.assign(Szereg="Widok")
+    _, macierz, ostatni = macierz_szeregow(df, 'Szereg', 'sprzedaz_total')
+    if macierz.shape[1] < 24:
+        return pd.DataFrame()
+    prognoza, dolna, gorna = holt_winters_wsadowo(macierz, horyzont)
+    miesiace = ostatni + np.arange(1, horyzont + 1)
+    return pd.DataFrame({'Rok': miesiace // 12, 'Miesiąc': miesiace % 12 + 1, 'Prognoza': prognoza[0],
+                         'Dolna granica': dolna[0], 'Górna granica': gorna[0]})
+
+
+# ======= Funkcja do wczytywania i przygotowywania danych (cachowana) =======
+@st.cache_data
+def load_and_prepare_top5_data() -> dict:
+
+    all_top_data = {}
+
+    for year in top_years:
+        # --- Wczytywanie danych dla PRODUCENTÓW ---
+        filename_producent = f"top_producent_{year}.parquet"
+        try:
+            df_prod = pd.read_parquet(filename_producent)
+            # Jeśli w plikach producentów kolumna nadal nazywa się 'Producent sprzedażowy kod',
+            # zmieniamy ją na 'Indeks', aby pasowała do reszty kodu.
+            if 'Producent sprzedażowy kod' in df_prod.columns:
+                df_prod = df_prod.rename(columns={'Producent sprzedażowy kod': 'Indeks'})
+
+            # Sprawdzenie, czy kluczowe kolumny istnieją po wczytaniu
+            if not all(col in df_prod.columns for col in ['Rok', 'Indeks', 'Sprzedaz_ilosc', 'Sprzedaz_wartosc']):
+                st.error(f"Błąd: Plik '{filename_producent}' nie zawiera wszystkich wymaganych kolumn (Rok, Indeks, Sprzedaz_ilosc, Sprzedaz_wartosc).")
+                continue # Pomiń ten rok dla producentów
+
+            all_top_data[f"producent_{year}"] = df_prod.copy()
+
+        except FileNotFoundError:
+            st.warning(f"Plik '{filename_producent}' nie znaleziony. Upewnij się, że został wygenerowany i jest w tym samym folderze.")
+        except Exception as e:
+            st.error(f"Błąd podczas wczytywania pliku '{filename_producent}': {e}")
+
+
+        # --- Wczytywanie danych dla LEKÓW (produktów) ---
+        filename_lek = f"top_lek_{year}.parquet"
+        try:
+            df_lek = pd.read_parquet(filename_lek)
+
+            # Dla leków, kolumna powinna już nazywać się 'Indeks'. Sprawdzamy dla bezpieczeństwa.
+            if 'Indeks' not in df_lek.columns:
+                 st.error(f"Błąd: Plik '{filename_lek}' nie zawiera wymaganej kolumny 'Indeks'.")
+                 continue # Pomiń ten rok dla leków
+
+            # Sprawdzenie, czy kluczowe kolumny istnieją po wczytaniu
+            if not all(col in df_lek.columns for col in ['Rok', 'Indeks', 'Sprzedaz_ilosc', 'Sprzedaz_wartosc']):
+                st.error(f"Błąd: Plik '{filename_lek}' nie zawiera wszystkich wymaganych kolumn (Rok, Indeks, Sprzedaz_ilosc, Sprzedaz_wartosc).")
+                continue # Pomiń ten rok dla leków
+
+            all_top_data[f"lek_{year}"] = df_lek.copy()
+
+        except FileNotFoundError:
+            st.warning(f"Plik '{filename_lek}' nie znaleziony. Upewnij się, że został wygenerowany i jest w tym samym folderze.")
+        except Exception as e:
+            st.error(f"Błąd podczas wczytywania pliku '{filename_lek}': {e}")
+
+    return all_top_data
+
+
+def dane_top5(producenci_kostka: pd.DataFrame) -> dict:
+    """
+    Dane podium TOP 5 z plików rocznych; producentów bierzemy z kostki (widok 'producenci'),
+    aby podium uwzględniało filtry kategorii i rodzajów promocji.
+    """
+    all_cached_data = load_and_prepare_top5_data()
+    producenci_kostka = producenci_kostka.rename(columns={
+        'Producent': 'Indeks', 'Ilość': 'Sprzedaz_ilosc', 'Sprzedaż budżetowa': 'Sprzedaz_wartosc'
+    })
+    if not producenci_kostka.empty:
+        all_cached_data = {
+            **{klucz: df for klucz, df in all_cached_data.items() if not klucz.startswith("producent_")},
+            **{f"producent_{rok}": df_rok for rok, df_rok in producenci_kostka.groupby('Rok')},
+        }
+    return all_cached_data
+
+
+# ======= Funkcja do pobierania i sortowania danych TOP 5 z wczytanych danych =======
+@pamiec.zapamietaj
+def get_top5_for_display(data_dict: dict, year: int, item_type: str, sort_by_option: str) -> pd.DataFrame:
+    """
+    Pobiera odpowiedni DataFrame z wczytanych danych i sortuje go, 
+    aby zwrócić TOP 5 dla wyświetlania.
+    """
+    # item_type będzie "producenci" lub "produkty"
+    # Zamieniamy na "producent" lub "lek" dla klucza słownika
+    key_prefix = "producent" if item_type == "producenci" else "lek"
+    df_key = f"{key_prefix}_{year}"
+
+    if df_key not in data_dict:
+        return pd.DataFrame() # Zwróć pusty DataFrame, jeśli danych nie ma
+
+    df_to_sort = data_dict[df_key].copy()
+
+    # Wybierz kolumnę do sortowania na podstawie wyboru użytkownika
+    if sort_by_option == "Sprzedaży ilościowej":
+        sort_col = 'Sprzedaz_ilosc'
+    else: # "Sprzedaży wartościowej"
+        sort_col = 'Sprzedaz_wartosc'
+
+    return df_to_sort.sort_values(by=sort_col, ascending=False).head(5)
+
+
+@pamiec.zapamietaj
+def oblicz_statystyki_promocji_cached(df: pd.DataFrame) -> dict:
+    return oblicz_statystyki_promocji(df)
+
+statystyki_tab7 = {kategoria: oblicz_statystyki_promocji_cached(df) for kategoria, df in dane_tab7.items()}
+wszystkie_kategorie_tab7 = "Wszystkie kategorie"
+
+def wersja_danych_tab7(kategoria: str) -> tuple:
+    """Wersja danych kategorii (czas modyfikacji i rozmiar pliku) - klucz cache dla diagramów."""
+    kategorie = list(dane_tab7) if kategoria == wszystkie_kategorie_tab7 else [kategoria]
+    return wersja_plikow([f"{kategorie_pliki[k]}_processed.parquet" for k in kategorie])
+
+
+def dane_kategorii_tab7(kategoria: str) -> pd.DataFrame:
+    if kategoria == wszystkie_kategorie_tab7:
+        return pd.concat(dane_tab7.values(), ignore_index=True)
+    return dane_tab7[kategoria]
+
+
+@pamiec.zapamietaj
+def diagram_promocji(kategoria: str, rodzaj: str, wersja_danych: tuple) -> tuple:
+    """
+    Buduje diagram producenta dominującego w rodzaju promocji i zwraca (svg, źródło DOT).
+    Układ grafu liczony jest raz na (kategoria, rodzaj promocji, wersja danych); gdy program 'dot'
+    nie jest zainstalowany, svg to None i diagram rysuje przeglądarka ze źródła DOT.
+    """
+    import graphviz  # tylko dla diagramów zakładki 7 - nie spowalnia startu aplikacji
+
+    d = dominujacy_w_promocji(dane_kategorii_tab7(kategoria), rodzaj)
+    opis_producenta = (f"(jedyny uczestniczący w promocji {rodzaj})" if d["liczba_producentow"] == 1
+                       else f"({formatuj_liczbe(d['udzial_producenta_w_rodzaju'], 2, '%')} sprzedaży w promocji {rodzaj})")
+    graf = graphviz.Digraph()
+    graf.node("Producent", f" Producent: {d['producent']}\n{opis_producenta}", shape='folder', style='filled', fillcolor='#E0F7FA')
+    graf.node("Udział", f"Udział promocyjny ({rodzaj})\n {formatuj_liczbe(d['udzial_rodzaju_sprzedaz'], 2, '%')} sprzedaży "
+                        f"przy {formatuj_liczbe(d['udzial_rodzaju_czestosc'], 2, '%')} wystąpień", shape='folder', style='filled', fillcolor='#FFF3E0')
+    graf.node("Typ zamówienia", "W tej promocji zamówienia:\n " + (", ".join(d["kanaly"]) or "brak danych"),
+              shape='folder', style='filled', fillcolor='#FFF3E0')
+    graf.node("Produkty", f"💊 Produkty {d['producent']}:\n{d['liczba_produktow']} unikalnych", shape='folder', style='filled', fillcolor='#F3E5F5')
+    graf.node("Sprzedaż", f"📈 Sprzedaż produktów {d['producent']}:\n{formatuj_liczbe(d['sprzedaz_producenta'])} sztuk\n"
+                          f"({formatuj_liczbe(d['udzial_producenta'], 2, '%')} ogółem)", shape='folder', style='filled', fillcolor='#E1F5FE')
+    graf.node("Przykład", f"📌 Przykład leku:\nIndeks {d['produkt']}\n(należy do {d['producent']})", shape='folder', style='filled', fillcolor='#FFEBEE')
+    graf.node("Lek", f"📌 \nIndeks {d['produkt']}\n sprzedaż {formatuj_liczbe(d['sprzedaz_produktu'])}, a jego udział {formatuj_liczbe(d['udzial_produktu'], 2, '%')}",
+              shape='folder', style='filled', fillcolor='#FFEBEE')
+    graf.edge("Producent", "Typ zamówienia", style='dashed')
+    graf.edge("Producent", "Udział", style='dashed')
+    graf.edge("Producent", "Produkty", style='dashed')
+    graf.edge("Produkty", "Sprzedaż", style='dashed')
+    graf.edge("Produkty", "Przykład", style='dashed')
+    graf.edge("Przykład", "Lek", style='dashed')
+    try:
+        svg = graf.pipe(format='svg').decode('utf-8')
+    except graphviz.ExecutableNotFound:
+        svg = None
+    return svg, graf.source
+
+
+class RozgrzewkaCache:
+    """
+    Rozgrzewanie cache w wątku w tle: zadania (nazwa, funkcja) wywołują funkcje cache'owane z argumentami,
+    jakie poda interfejs, więc pierwsza zmiana widżetu trafia w gotowy wynik. Postęp i czasy zadań są
+    dostępne dla panelu bocznego i zapisywane w logu serwera (logger modułu).
+    """
+    NAZWA_WATKU = "rozgrzewka-cache"
+
+    def __init__(self, zadania: list):
+        self.zadania = zadania
+        self.czasy = []  # (zadanie, czas [s], błąd)
+        self.czas_calkowity = None
+        self._watek = threading.Thread(target=self._uruchom, name=self.NAZWA_WATKU, daemon=True)
+        self._watek.start()
+
+    def _uruchom(self):
+        poczatek = time.perf_counter()
+        for nazwa, zadanie in self.zadania:
+            start = time.perf_counter()
+            try:
+                zadanie()
+                blad = None
+            except Exception as e:  # pojedyncze zadanie nie może zatrzymać rozgrzewki
+                blad = str(e)
+            czas = time.perf_counter() - start
+            self.czasy.append((nazwa, czas, blad))
+            if blad:
+                logger.warning("Rozgrzewka %d/%d %s: %.2f s (błąd: %s)", len(self.czasy), len(self.zadania), nazwa, czas, blad)
+            else:
+                logger.info("Rozgrzewka %d/%d %s: %.2f s", len(self.czasy), len(self.zadania), nazwa, czas)
+        self.czas_calkowity = time.perf_counter() - poczatek
+        logger.info("Rozgrzewka zakończona w %.1f s", self.czas_calkowity)
+
+    @property
+    def zakonczona(self) -> bool:
+        return self.czas_calkowity is not None
+
+    def raport(self) -> pd.DataFrame:
+        return pd.DataFrame(self.czasy, columns=['Zadanie', 'Czas [s]', 'Błąd']).sort_values('Czas [s]', ascending=False)
+
+
+class _BezOstrzezenRozgrzewki(logging.Filter):
+    # Wątek rozgrzewki nie ma sesji, więc Streamlit ostrzega przy każdym wywołaniu funkcji cache'owanej
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.threadName != RozgrzewkaCache.NAZWA_WATKU
+
+
+def zadania_rozgrzewki() -> list:
+    """
+    Zadania dla skończonej dziedziny widżetów przy domyślnych filtrach: zapytania wszystkich widoków kostki,
+    wszystkie szczegółowości czasu, każdy horyzont prognozy, anomalie, udziały produktów, hierarchia,
+    Pareto dla każdego progu, podia TOP 5 i apteki dla obu miar, grupowania upliftu i diagramy każdej
+    pary (kategoria, rodzaj promocji) z zakładki 7. Argumenty budujemy tak jak interfejs, bo klucz cache
+    zależy od typów wartości.
+    """
+    filtry_domyslne = {'Rok': (lata_kostki[0], lata_kostki[-1]), 'Kategoria': None, 'Rodzaj promocji': None}
+    kategorie = tuple(sorted(kategorie_kostki))
+    lata_domyslne = [int(rok) for rok in lata_kostki]
+    miary = ["Sprzedaż ilościowa", "Sprzedaż wartościowa"]
+
+    def zestaw_domyslny(widok):
+        return kostka_olap.zestaw(graf_widokow.wymiary(widok), graf_widokow.filtry_widoku(widok, filtry_domyslne, {}))
+
+    def rollupy_sprzedazy_wszystkie():
+        df_miesieczny = zestaw_domyslny('sprzedaz_miesieczna')[0]
+        if not df_miesieczny.empty:
+            rollupy = rollupy_sprzedazy(df_miesieczny)
+            for poziom in POZIOMY_CZASU.values():
+                if rollupy.dostepny(poziom):
+                    rollupy.poziom(poziom)
+
+    def rollupy_promocji_wszystkie():
+        rollupy = rollupy_promocji(kategorie) if not df_promocje.empty else None
+        if rollupy is not None:
+            for poziom in POZIOMY_CZASU.values():
+                rollupy.poziom(poziom)
+
+    def uplift_wszystkie():
+        df_uplift = oblicz_uplift_promocji_cached(df_promocje)
+        if not df_uplift.empty:
+            for wg in ["Rodzaj promocji", "Id producenta sprzedaży", "Kategoria nazwa"]:
+                zestaw_uplift(df_uplift, wg)
+
+    def pareto_wszystkie(analiza_wg):
+        df_kat_kostka = zestaw_domyslny('pareto_kategorie')[0]
+        df_prom_kostka = zestaw_domyslny('pareto_promocje')[0]
+        df_prom_kostka = df_prom_kostka[df_prom_kostka['Rodzaj promocji'] != BEZ_PROMOCJI]
+        for prog_pareto in [*PROGI_PARETO, 100]:
+            for rok in lata_domyslne:
+                analiza_pareto_cached(df_kat_kostka, 'Kategoria', analiza_wg, prog_pareto, rok_filtr=rok)
+                analiza_pareto_cached(df_prom_kostka, 'Rodzaj promocji', analiza_wg, prog_pareto, rok_filtr=rok)
+
+    def top5_wszystkie(sortowanie_po):
+        all_cached_data = dane_top5(zestaw_domyslny('producenci')[0])
+        for rok in lata_domyslne:
+            for rodzaj in ["producenci", "produkty"]:
+                get_top5_for_display(all_cached_data, rok, rodzaj, sortowanie_po)
+
+    def diagramy_kategorii(kategoria):
+        if kategoria == wszystkie_kategorie_tab7:
+            podsumowanie = oblicz_statystyki_promocji_cached(pd.concat(dane_tab7.values(), ignore_index=True))["podsumowanie"]
+        else:
+            podsumowanie = statystyki_tab7[kategoria]["podsumowanie"]
+        for rodzaj in podsumowanie.index:
+            diagram_promocji(kategoria, rodzaj, wersja_danych_tab7(kategoria))
+
+    zadania = [(f"Kostka: {widok}", lambda widok=widok: zestaw_domyslny(widok)) for widok in graf_widokow.nazwy()]
+    zadania += [
+        ("Roll-upy sprzedaży", rollupy_sprzedazy_wszystkie),
+        ("Roll-upy promocji", rollupy_promocji_wszystkie),
+        ("Anomalie", lambda: anomalie_szeregow(wersja_danych_sprzedazy() + wersja_plikow(["udzial_all.parquet"]))),
+    ]
+    zadania += [(f"Prognozy: horyzont {h}", lambda h=h: prognozy_sprzedazy(wersja_danych_sprzedazy(), h))
+                for h in HORYZONTY_PROGNOZY]
+    zadania += [
+        ("Udziały rynkowe produktów", lambda: zbuduj_udzialy_produktow(wersja_udzialow_produktow())),
+        ("Hierarchia sprzedaży", lambda: hierarchia_sprzedazy(wersja_hierarchii())),
+        ("Uplift promocji", uplift_wszystkie),
+    ]
+    zadania += [(f"Pareto: {miara}", lambda miara=miara: pareto_wszystkie(miara)) for miara in miary]
+    zadania += [(f"Podium TOP 5: {sortowanie}", lambda sortowanie=sortowanie: top5_wszystkie(sortowanie))
+                for sortowanie in ["Sprzedaży ilościowej", "Sprzedaży wartościowej"]]
+    if pliki_sprzedazy():
+        zadania += [(f"Apteki: {miara}", lambda miara=miara: analiza_aptek(
+            wersja_plikow(list(pliki_sprzedazy().values())), tuple(lata_domyslne),
+            tuple(filtry_domyslne['Kategoria'] or kategorie_kostki or kategorie_pliki), wybierz_kolumne_wg(miara)
+        )) for miara in miary]
+    zadania += [(f"Diagramy: {kategorie_etykiety.get(k, k)}", lambda k=k: diagramy_kategorii(k))
+                for k in [wszystkie_kategorie_tab7, *statystyki_tab7]]
+    return zadania
+
+
+@st.cache_resource
+def rozgrzewka_cache() -> RozgrzewkaCache:
+    """
+    Jedna rozgrzewka na proces serwera. Streamlit nie ma zdarzenia startu serwera, więc wątek startuje
+    dopiero przy pierwszym przebiegu skryptu: pierwsza sesja tylko ją uruchamia i sama płaci koszt zimnego
+    startu (zadania już liczone przez wątek odbiera bez ponownego liczenia). Zyskują kolejne sesje i widżety;
+    żeby nie płacił za to użytkownik, po wdrożeniu wystarczy jedno otwarcie strony.
+    """
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(_BezOstrzezenRozgrzewki())
+    return RozgrzewkaCache(zadania_rozgrzewki())
+
+
+# Rozgrzewka startuje przed rysowaniem zakładek (przy pierwszej sesji procesu, nie przy starcie serwera) -
+# loadery i funkcje cache'owane są już zdefiniowane, więc wątek liczy w tle, podczas gdy przebieg rysuje stronę
+rozgrzewka = rozgrzewka_cache()
+
+
+# Style kart i podiów - raz na przebieg; st.html z samym <style> nie zajmuje miejsca na stronie
+st.html(STYLE_KART)
+
 # Zakładki
-tytul,tab00,tab0, tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
+tytul,tab00,tab0, tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs([
     "QR",
     "🏢 O firmie", 
     "📂 Charakterystyka danych", 
@@ -493,7 +1529,8 @@ tytul,tab00,tab0, tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
     "🧮 Analiza Pareto",
     "🧩 Udziały rynkowe",
     "🛠️ Modele i dane",
-    "📉 Statystyki najlepszego i najgorszego modelu"
+    "📉 Statystyki najlepszego i najgorszego modelu",
+    "🏪 Apteki"
 ])
 with tytul:
        # Tytuł
@@ -531,8 +1568,7 @@ with tytul:
     
     with col2:
         st.markdown("<h2 style='font-size: 40px;'>📎 Kod QR</h2>", unsafe_allow_html=True)
-        qr_image = Image.open("qr2.png")  # Ścieżka do Twojego pliku
-        st.image(qr_image)
+        st.image("qr2.png")  # Ścieżka do Twojego pliku
         st.markdown('<p style="font-size: 37px; text-align: center; font-weight: bold;">Zeskanuj mnie! </p>', unsafe_allow_html=True)
     
     # Stopka
@@ -546,8 +1582,7 @@ with tytul:
 # --- Funkcje pomocnicze ---
 with tab00:
     logo_path = "neuca_logo.png"
-    logo = Image.open(logo_path)
-    st.image(logo, width=300)
+    st.image(logo_path, width=300)
 
     html_code = """
     <style>
@@ -844,27 +1879,15 @@ with tab1:
  icons = {
     'drugs': "💊", 'promos': "🎯", 'prod': "🏭"
  }
- col1, col2, col3, col4, col5, col6, col7,col8,col9 = st.columns(9)
-
- # Wywołujemy funkcję dla każdego roku i wyświetlamy wyniki
- with col1:
-     info_card("Unikalne leki 2022",288, "#1e8449", "💊")
- with col2:
-     info_card("Promocje 2022", 5193, "#0066cc", "🎯")    
- with col3:
-     info_card("Unikalni producenci 2022",73, "#6c3483", "📂")  
- with col4:
-     info_card("Unikalne leki 2023", 297, "#58d68d", "💊")
- with col5:
-     info_card("Promocje 2023", 5377, "#66b3ff", "🎯")
- with col6:
-     info_card("Unikalni producenci 2023",80, "#af7ac5", "📂")
- with col7:
-     info_card("Unikalne leki 2024", 309, "#a3d9a5", "💊")
- with col8:
-     info_card("Promocje 2024",4606, "#869CE8", "🎯")
- with col9:
-     info_card("Unikalni producenci 2024", 81,  "#CF6FED", "📂")
+ # Wszystkie karty podsumowania w jednej siatce (jeden element zamiast dziewięciu)
+ siatka_kart(pd.DataFrame({
+    'tytul': ["Unikalne leki 2022", "Promocje 2022", "Unikalni producenci 2022",
+              "Unikalne leki 2023", "Promocje 2023", "Unikalni producenci 2023",
+              "Unikalne leki 2024", "Promocje 2024", "Unikalni producenci 2024"],
+    'wartosc': [288, 5193, 73, 297, 5377, 80, 309, 4606, 81],
+    'kolor': ["#1e8449", "#0066cc", "#6c3483", "#58d68d", "#66b3ff", "#af7ac5", "#a3d9a5", "#869CE8", "#CF6FED"],
+    'ikona': ["💊", "🎯", "📂"] * 3,
+ }), kolumny=9)
  precalculated_data = {
     'LECZENIE NAŁOGÓW': {
         2022: {'unique_drugs': 36, 'unique_promos': 1223, 'unique_prod': 8},
@@ -897,109 +1920,149 @@ with tab1:
  kategorie = list(precalculated_data.keys())
 
 
+ # Kafelki kategorii – 3 rzędy (lata) po 3 kolumny; wszystkie kategorie w jednym elemencie
+ rodzaje_kafelkow = [('drugs', 'unique_drugs', "Leki"), ('promos', 'unique_promos', "Promocje"),
+                     ('prod', 'unique_prod', "Producenci")]
+ sekcje_kategorii = []
  for kat in kategorie:
-    st.markdown(f"## 🧬 {kat}")
-
-    # Pobieranie danych dla bieżącej kategorii z precalculated_data
-    counts_2022 = precalculated_data[kat][2022]
-    counts_2023 = precalculated_data[kat][2023]
-    counts_2024 = precalculated_data[kat][2024]
-
-    # Kafelki – 3 rzędy po 3 kolumny
-    r1 = st.columns(3)
-    r2 = st.columns(3)
-    r3 = st.columns(3)
-
-    with r1[0]:
-        info_card("Leki 2022", counts_2022['unique_drugs'], colors['drugs_2022'], icons['drugs'])
-    with r1[1]:
-        info_card("Promocje 2022", counts_2022['unique_promos'], colors['promos_2022'], icons['promos'])
-    with r1[2]:
-        info_card("Producenci 2022", counts_2022['unique_prod'], colors['prod_2022'], icons['prod'])
-
-    with r2[0]:
-        info_card("Leki 2023", counts_2023['unique_drugs'], colors['drugs_2023'], icons['drugs'])
-    with r2[1]:
-        info_card("Promocje 2023", counts_2023['unique_promos'], colors['promos_2023'], icons['promos'])
-    with r2[2]:
-        info_card("Producenci 2023", counts_2023['unique_prod'], colors['prod_2023'], icons['prod'])
-
-    with r3[0]:
-        info_card("Leki 2024", counts_2024['unique_drugs'], colors['drugs_2024'], icons['drugs'])
-    with r3[1]:
-        info_card("Promocje 2024", counts_2024['unique_promos'], colors['promos_2024'], icons['promos'])
-    with r3[2]:
-        info_card("Producenci 2024", counts_2024['unique_prod'], colors['prod_2024'], icons['prod'])
-
-    st.markdown("---")
+    df_kafelki = pd.DataFrame([
+        {'tytul': f"{nazwa} {rok}", 'wartosc': precalculated_data[kat][rok][klucz],
+         'kolor': colors[f"{rodzaj}_{rok}"], 'ikona': icons[rodzaj]}
+        for rok in (2022, 2023, 2024) for rodzaj, klucz, nazwa in rodzaje_kafelkow
+    ])
+    sekcje_kategorii.append(f"## 🧬 {kat}\n\n{html_kart(df_kafelki, kolumny=3)}\n\n---")
+ st.markdown("\n\n".join(sekcje_kategorii), unsafe_allow_html=True)
 with tab2: # Odpowiada za "Wykresy czasowe"
-    # WYBÓR TYPU DANYCH DLA WIZUALIZACJI
-    # Ten radio button będzie wpływał zarówno na wykresy miesięczne, jak i kategoryczne.
-    kolumna_wybor = st.radio(
-        " ## Wybierz typ danych do analizy:",
-        [" Sprzedaż ilościowa", " Sprzedaż wartościowa"],
-        horizontal=True,
-        key="sales_type_radio"
-    )
-
-    # Ustawienie nazw kolumn i źródeł danych na podstawie wyboru
-    if kolumna_wybor == "Sprzedaż wartościowa":
-        selected_monthly_data_by_year = monthly_sales_budzetowa
-        sales_col_display_name = "Sprzedaż wartość"
-        # Ta zmienna zawiera teraz nazwę kolumny w df_aggregated do sumowania
-        sales_col_for_category_agg = "sprzedaz_budzetowa_total"
-    else: # Sprzedaż ilościowa
-        selected_monthly_data_by_year = monthly_sales_ilosciowa
-        sales_col_display_name = "Sprzedaż ilość"
-        # Ta zmienna zawiera teraz nazwę kolumny w df_aggregated do sumowania
-        sales_col_for_category_agg = "sprzedaz_ilosc_total"
+    # Typ danych (ilość / wartość) i zakres lat wybiera się w panelu bocznym - wpływa na wykresy miesięczne i kategoryczne.
+    sales_col_display_name = "Sprzedaż wartość" if miara_globalna == "Sprzedaż wartościowa" else "Sprzedaż ilość"
 
     st.subheader("Sprzedaż wg kategorii w podziale na lata")
 
-    # --- Wczytywanie df_aggregated TUTAJ ---
-    df_aggregated_categories_data = load_df_aggregated_categories() # <--- This is the line from your error
-    
-    if not df_aggregated_categories_data.empty: # Use the new variable name here
-        df_kategorie = agreguj_sprzedaz_kategorie(df_aggregated_categories_data, sales_col_for_category_agg)
-        fig_kategorie = rysuj_wykres_kategorie(df_kategorie, sales_col_display_name)
-        st.plotly_chart(fig_kategorie, use_container_width=True)
+    df_kategorie_kostka = dane_z_kostki('kategorie_lata').rename(columns={'Kategoria': 'Kategoria nazwa'})
+
+    if not df_kategorie_kostka.empty:
+        df_kategorie = agreguj_sprzedaz_kategorie_cached(df_kategorie_kostka, kolumna_miary)
+        fig_kategorie = rysuj_wykres_kategorie(
+            df_kategorie, sales_col_display_name, tuple(filtr_krzyzowy.get('Kategoria', ()))
+        )
+        # Kliknięcie słupka (lub zaznaczenie kilku) filtruje pozostałe widoki po kategorii
+        st.plotly_chart(fig_kategorie, use_container_width=True, key="wykres_kategorie",
+                        on_select=lambda: zaznacz_na_wykresie("wykres_kategorie", 'Kategoria'),
+                        selection_mode=("points", "box"))
     else:
         st.warning("Brak danych kategoryzacyjnych do wyświetlenia.")
 
     # --- Wykresy czasowe łącznej sprzedaży miesięcznej ---
     st.subheader("Wykresy czasowe łącznej sprzedaży miesięcznej")
 
-    all_monthly_df_for_chart = pd.concat(selected_monthly_data_by_year.values(), ignore_index=True)
+    all_monthly_df_for_chart = dane_z_kostki('sprzedaz_miesieczna').rename(columns={kolumna_miary: 'sprzedaz_total'})
+
+    kol_prognoza, kol_horyzont = st.columns([1, 3])
+    pokaz_prognoze = kol_prognoza.checkbox("Pokaż prognozę", value=True, key="prognoza_pokaz")
+    horyzont_prognozy = kol_horyzont.slider("Horyzont prognozy (mies.)", HORYZONTY_PROGNOZY.start, HORYZONTY_PROGNOZY.stop - 1, 6,
+                                         key="prognoza_horyzont")
 
     if not all_monthly_df_for_chart.empty:
+        all_monthly_df_for_chart['Miesiąc_nazwa'] = all_monthly_df_for_chart['Miesiąc'].map(month_names)
         all_monthly_df_for_chart = przygotuj_daty_cached(all_monthly_df_for_chart)
+        prognoza_wykresu = None
+        if pokaz_prognoze and rok_do == lata_kostki[-1]:
+            prognoza_wykresu = prognoza_widoku(all_monthly_df_for_chart, kolumna_miary, horyzont_prognozy)
         fig_total_sales = create_total_sales_chart(
-            pivot_monthly_sales(all_monthly_df_for_chart),
-            sales_col_display_name
+            pivot_monthly_sales_cached(all_monthly_df_for_chart),
+            sales_col_display_name,
+            prognoza_wykresu
         )
         st.plotly_chart(fig_total_sales, use_container_width=True)
+        if pokaz_prognoze:
+            with st.expander("🔮 Prognozy wszystkich szeregów (łącznie, kategorie, produkty)"):
+                tabela_stronicowana(
+                    prognozy_sprzedazy(wersja_danych_sprzedazy(), horyzont_prognozy), "prognozy_szeregow",
+                    column_config={
+                        'Prognoza': kolumna_liczb(), 'Dolna granica': kolumna_liczb(), 'Górna granica': kolumna_liczb()
+                    }
+                )
     else:
         st.warning("Brak danych miesięcznych do wyświetlenia wykresu liniowego.")
 
+    # --- Sprzedaż i promocje w wybranej szczegółowości (z roll-upów czasowych) ---
+    st.subheader("Sprzedaż i aktywne promocje w wybranej szczegółowości")
+    szczegolowosc = st.radio(
+        "Szczegółowość", list(POZIOMY_CZASU), index=2, horizontal=True, key="szczegolowosc_czasu"
+    )
+    poziom_czasu = POZIOMY_CZASU[szczegolowosc]
+    kol_sprzedaz, kol_promocje = st.columns(2)
+
+    with kol_sprzedaz:
+        df_sprzedaz_miesieczna = dane_z_kostki('sprzedaz_miesieczna')
+        if df_sprzedaz_miesieczna.empty:
+            st.warning("Brak danych sprzedaży do wyświetlenia.")
+        else:
+            rollupy_sprz = rollupy_sprzedazy(df_sprzedaz_miesieczna)
+            poziom_sprzedazy = poziom_czasu if rollupy_sprz.dostepny(poziom_czasu) else rollupy_sprz.poziom_bazowy
+            if poziom_sprzedazy != poziom_czasu:
+                st.caption("ℹ️ Dane sprzedaży nie mają daty dokumentu - najdrobniejszą szczegółowością jest miesiąc.")
+            df_okresy = rollupy_sprz.poziom(poziom_sprzedazy)
+            fig_okresy = go.Figure(slad_liniowy(
+                df_okresy.index.start_time, df_okresy[kolumna_miary], mode='lines+markers', name=sales_col_display_name
+            ))
+            fig_okresy.update_layout(title=f"{sales_col_display_name} — {szczegolowosc.lower()}",
+                                     yaxis_title=sales_col_display_name, yaxis_tickformat=',', separators=', ', height=350)
+            st.plotly_chart(fig_okresy, use_container_width=True)
+
+    with kol_promocje:
+        kategorie_promocji = graf_widokow.filtry_widoku(
+            'sprzedaz_miesieczna', filtry_globalne, filtr_krzyzowy
+        )['Kategoria'] or kategorie_kostki
+        rollupy_prom = rollupy_promocji(tuple(sorted(kategorie_promocji))) if not df_promocje.empty else None
+        if rollupy_prom is None:
+            st.info("Brak surowych plików promocji ('promocje_<kategoria>.parquet') - wykres niedostępny.")
+        else:
+            dni_bazowe = rollupy_prom.poziom('D').index
+            df_okresy_prom = rollupy_prom.poziom(poziom_czasu)
+            # liczba dni okresu przycięta do zakresu danych (pierwszy/ostatni tydzień bywa niepełny)
+            dni_w_okresie = (
+                np.minimum(df_okresy_prom.index.end_time.normalize(), dni_bazowe[-1].start_time)
+                - np.maximum(df_okresy_prom.index.start_time, dni_bazowe[0].start_time)
+            ).days + 1
+            fig_promocje_okresy = go.Figure(slad_liniowy(
+                df_okresy_prom.index.start_time,
+                df_okresy_prom['Aktywne promocje'].to_numpy() / dni_w_okresie,
+                mode='lines', name="Aktywne promocje"
+            ))
+            fig_promocje_okresy.update_layout(title=f"Średnia dzienna liczba aktywnych promocji — {szczegolowosc.lower()}",
+                                              yaxis_title="Aktywne promocje", height=350)
+            st.plotly_chart(fig_promocje_okresy, use_container_width=True)
+
 
     st.markdown("---")
     st.subheader("Miesięczne Top/Bottom 3 - Przegląd")
-    cols = st.columns(len(top_years))
-    for i, rok in enumerate(top_years):
-        df_rok_for_table = selected_monthly_data_by_year.get(rok, pd.DataFrame())
-        with cols[i]:
-            if not df_rok_for_table.empty:
-                tabela_top_bottom(df_rok_for_table, rok, sales_col_display_name, cols[i])
-            else:
-                st.markdown(f"### {rok}")
-                st.write("Brak danych.")
+    if lata_wybrane:
+        cols = st.columns(len(lata_wybrane))
+        for i, rok in enumerate(lata_wybrane):
+            df_rok_for_table = all_monthly_df_for_chart[all_monthly_df_for_chart['Rok'] == rok] \
+                if not all_monthly_df_for_chart.empty else pd.DataFrame()
+            with cols[i]:
+                if not df_rok_for_table.empty:
+                    tabela_top_bottom(df_rok_for_table, rok, sales_col_display_name, cols[i])
+                else:
+                    st.markdown(f"### {rok}")
+                    st.write("Brak danych.")
+    else:
+        st.info("Brak lat w wybranym zakresie.")
+
+    st.markdown("---")
+    st.subheader("🚨 Anomalie sprzedaży (łącznie, kategorie, produkty)")
+    alerty = anomalie_szeregow(wersja_danych_sprzedazy() + wersja_plikow(["udzial_all.parquet"]))
+    pokaz_alerty(alerty[(alerty['Źródło'] == "Sprzedaż") & alerty['Rok'].between(rok_od, rok_do)], "anomalie_sprzedazy")
 
 
     st.markdown("---")
     
 with tab3:
     st.header("TOP 5 producentów i produktów wg sprzedaży")
-    sortowanie_po = st.radio("Sortuj TOP 5 wg", ["Sprzedaży ilościowej", "Sprzedaży wartościowej"])
+    # Kolejność TOP 5 wynika z miary wybranej w panelu bocznym
+    sortowanie_po = "Sprzedaży wartościowej" if miara_globalna == "Sprzedaż wartościowa" else "Sprzedaży ilościowej"
     
     # --- Stałe i konfiguracja ---
     top_years = [2022, 2023, 2024] # Lata, dla których masz pliki
@@ -1011,187 +2074,144 @@ with tab3:
         "#99ccff",  # 🏅 pastelowy
         "#b3d9ff"    # 🎖️ mniej jasny niż wcześniej, nadal czytelny z białym tekstem
     ]
+
+    def karty_top5(df_top5: pd.DataFrame) -> pd.DataFrame:
+        """Ramka kart podium (html_kart, klasa 'karta-top5') z wyniku get_top5_for_display."""
+        miejsca = range(len(df_top5))
+        return pd.DataFrame({
+            'tytul': df_top5["Indeks"].to_numpy(),
+            'wartosc': ("💊 " + formatuj_liczby(df_top5["Sprzedaz_ilosc"]) + " szt. &nbsp;&nbsp; 💰 "
+                        + formatuj_liczby(df_top5["Sprzedaz_wartosc"]) + " zł").to_numpy(),
+            'kolor': [kolory_tla_top5[m] if m < len(kolory_tla_top5) else "#f8f9fa" for m in miejsca],
+            'ikona': [podium_ikony[m] if m < len(podium_ikony) else f"{m+1}." for m in miejsca],
+        })
     
-    # ======= Funkcja do wczytywania i przygotowywania danych (cachowana) =======
-    @st.cache_data
-    def load_and_prepare_top5_data() -> dict:
-        
-        all_top_data = {}
-        
-        for year in top_years:
-            # --- Wczytywanie danych dla PRODUCENTÓW ---
-            filename_producent = f"top_producent_{year}.parquet"
-            try:
-                df_prod = pd.read_parquet(filename_producent)
-                # Jeśli w plikach producentów kolumna nadal nazywa się 'Producent sprzedażowy kod',
-                # zmieniamy ją na 'Indeks', aby pasowała do reszty kodu.
-                if 'Producent sprzedażowy kod' in df_prod.columns:
-                    df_prod = df_prod.rename(columns={'Producent sprzedażowy kod': 'Indeks'})
-                
-                # Sprawdzenie, czy kluczowe kolumny istnieją po wczytaniu
-                if not all(col in df_prod.columns for col in ['Rok', 'Indeks', 'Sprzedaz_ilosc', 'Sprzedaz_wartosc']):
-                    st.error(f"Błąd: Plik '{filename_producent}' nie zawiera wszystkich wymaganych kolumn (Rok, Indeks, Sprzedaz_ilosc, Sprzedaz_wartosc).")
-                    continue # Pomiń ten rok dla producentów
-                
-                all_top_data[f"producent_{year}"] = df_prod.copy()
-    
-            except FileNotFoundError:
-                st.warning(f"Plik '{filename_producent}' nie znaleziony. Upewnij się, że został wygenerowany i jest w tym samym folderze.")
-            except Exception as e:
-                st.error(f"Błąd podczas wczytywania pliku '{filename_producent}': {e}")
-    
-    
-            # --- Wczytywanie danych dla LEKÓW (produktów) ---
-            filename_lek = f"top_lek_{year}.parquet"
-            try:
-                df_lek = pd.read_parquet(filename_lek)
-                
-                # Dla leków, kolumna powinna już nazywać się 'Indeks'. Sprawdzamy dla bezpieczeństwa.
-                if 'Indeks' not in df_lek.columns:
-                     st.error(f"Błąd: Plik '{filename_lek}' nie zawiera wymaganej kolumny 'Indeks'.")
-                     continue # Pomiń ten rok dla leków
-    
-                # Sprawdzenie, czy kluczowe kolumny istnieją po wczytaniu
-                if not all(col in df_lek.columns for col in ['Rok', 'Indeks', 'Sprzedaz_ilosc', 'Sprzedaz_wartosc']):
-                    st.error(f"Błąd: Plik '{filename_lek}' nie zawiera wszystkich wymaganych kolumn (Rok, Indeks, Sprzedaz_ilosc, Sprzedaz_wartosc).")
-                    continue # Pomiń ten rok dla leków
-    
-                all_top_data[f"lek_{year}"] = df_lek.copy()
-    
-            except FileNotFoundError:
-                st.warning(f"Plik '{filename_lek}' nie znaleziony. Upewnij się, że został wygenerowany i jest w tym samym folderze.")
-            except Exception as e:
-                st.error(f"Błąd podczas wczytywania pliku '{filename_lek}': {e}")
-                
-        return all_top_data
-    
-    # Wczytaj i przygotuj dane raz na początku działania aplikacji
-    all_cached_data = load_and_prepare_top5_data()
-    
-    
-    # ======= Funkcja do pobierania i sortowania danych TOP 5 z wczytanych danych =======
-    @st.cache_data
-    def get_top5_for_display(data_dict: dict, year: int, item_type: str, sort_by_option: str) -> pd.DataFrame:
-        """
-        Pobiera odpowiedni DataFrame z wczytanych danych i sortuje go, 
-        aby zwrócić TOP 5 dla wyświetlania.
-        """
-        # item_type będzie "producenci" lub "produkty"
-        # Zamieniamy na "producent" lub "lek" dla klucza słownika
-        key_prefix = "producent" if item_type == "producenci" else "lek"
-        df_key = f"{key_prefix}_{year}"
-        
-        if df_key not in data_dict:
-            return pd.DataFrame() # Zwróć pusty DataFrame, jeśli danych nie ma
-            
-        df_to_sort = data_dict[df_key].copy()
-        
-        # Wybierz kolumnę do sortowania na podstawie wyboru użytkownika
-        if sort_by_option == "Sprzedaży ilościowej":
-            sort_col = 'Sprzedaz_ilosc'
-        else: # "Sprzedaży wartościowej"
-            sort_col = 'Sprzedaz_wartosc'
-            
-        return df_to_sort.sort_values(by=sort_col, ascending=False).head(5)
-    
-    
+    # Dane podium: pliki roczne TOP 5 i producenci z kostki (z filtrami globalnymi)
+    all_cached_data = dane_top5(dane_z_kostki('producenci'))
+
+
+    # ======= Średnia miesięczna liczba aktywnych promocji produktu w roku (z indeksu promocji) =======
+    @pamiec.zapamietaj
+    def srednia_liczba_promocji(koncentracja: pd.DataFrame) -> dict:
+        if koncentracja.empty:
+            return {}
+        return koncentracja.groupby(['Id kartoteki', 'Rok'])['Liczba promocji'].mean().to_dict()
+
+    promocje_produktu_w_roku = srednia_liczba_promocji(koncentracja_promocji)
+
+
     # ======= Sekcja producentów =======
     st.subheader("Podium producentów")
-    kolumny = st.columns(len(top_years))
-    for idx, rok in enumerate(top_years):
+    hierarchia = hierarchia_sprzedazy(wersja_hierarchii())
+    if hierarchia is None:
+        st.caption("ℹ️ Rozwijanie producentów wymaga pliku 'hierarchia_sprzedazy.parquet' lub surowych plików sprzedaży.")
+    elif filtry_globalne['Rodzaj promocji'] is not None:
+        st.caption("ℹ️ Rozwinięcia producentów nie uwzględniają filtra rodzajów promocji.")
+    kolumny = st.columns(max(len(lata_wybrane), 1))
+    for idx, rok in enumerate(lata_wybrane):
         # Wywołujemy nową funkcję get_top5_for_display
         df_rok_producenci = get_top5_for_display(all_cached_data, rok, "producenci", sortowanie_po)
     
         with kolumny[idx]:
-            st.markdown(f"### Rok {rok}")
             if not df_rok_producenci.empty:
-                for miejsce, (_, rzad) in enumerate(df_rok_producenci.iterrows()):
-                    producent = rzad["Indeks"] # Kolumna już nazywa się 'Indeks'
-                    ilosc = int(rzad["Sprzedaz_ilosc"])
-                    wartosc = int(rzad["Sprzedaz_wartosc"])
-                    ikona = podium_ikony[miejsce] if miejsce < len(podium_ikony) else f"{miejsce+1}."
-                    
-                    kolor_tla = kolory_tla_top5[miejsce] if miejsce < len(kolory_tla_top5) else "#f8f9fa"
-                    
-                    st.markdown(f"""
-                    <div style='
-                        background-color: {kolor_tla};
-                        border-radius: 15px;
-                        padding: 12px;
-                        margin-bottom: 10px;
-                        text-align:center;
-                    '>
-                        <div style='font-size:22px; font-weight:bold;'>{ikona} {producent}</div>
-                        <div style='font-size:14px;'>💊 {ilosc:,.0f} szt. &nbsp;&nbsp; 💰 {wartosc:,.0f} zł</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+                siatka_kart(karty_top5(df_rok_producenci), kolumny=1, klasa="karta-top5", naglowek=f"### Rok {rok}")
+                for producent in df_rok_producenci["Indeks"] if hierarchia is not None else []:
+                    with st.expander(f"Produkty i trend: {producent}"):
+                        produkty = hierarchia.produkty_producenta(rok, producent, kolumna_miary,
+                                                                  filtry_globalne['Kategoria'])
+                        tabela_stronicowana(produkty, f"hierarchia_{rok}_{producent}", rozmiar_strony=10)
+                        produkt = st.selectbox("Trend produktu", [None, *produkty.index],
+                                               format_func=lambda i: "—" if i is None else i,
+                                               key=f"hierarchia_{rok}_{producent}_produkt")
+                        trendy = {producent: hierarchia.trend_producenta(rok, producent, kolumna_miary,
+                                                                         filtry_globalne['Kategoria'])}
+                        if produkt is not None:
+                            trendy[produkt] = hierarchia.trend_produktu(rok, produkt, kolumna_miary)
+                        fig_trend = go.Figure([
+                            slad_liniowy(trend.index.map(month_names_short), trend, mode='lines+markers', name=nazwa)
+                            for nazwa, trend in trendy.items()
+                        ])
+                        fig_trend.update_layout(height=280, margin=dict(l=10, r=10, t=30, b=10),
+                                                title=f"{miara_globalna} po miesiącach ({rok})")
+                        st.plotly_chart(fig_trend, use_container_width=True,
+                                        key=f"hierarchia_{rok}_{producent}_wykres")
             else:
-                st.write("Brak danych do wyświetlenia.")
+                st.markdown(f"### Rok {rok}\n\nBrak danych do wyświetlenia.")
     
     # ======= Sekcja produktów =======
     st.subheader("Podium produktów")
-    kolumny_p = st.columns(len(top_years))
-    for idx, rok in enumerate(top_years):
+    kolumny_p = st.columns(max(len(lata_wybrane), 1))
+    for idx, rok in enumerate(lata_wybrane):
         # Wywołujemy nową funkcję get_top5_for_display
         df_rok_produkty = get_top5_for_display(all_cached_data, rok, "produkty", sortowanie_po)
     
         with kolumny_p[idx]:
-            st.markdown(f"### Rok {rok}")
             if not df_rok_produkty.empty:
-                for miejsce, (_, rzad) in enumerate(df_rok_produkty.iterrows()):
-                    indeks = rzad["Indeks"]
-                    ilosc = int(rzad["Sprzedaz_ilosc"])
-                    wartosc = int(rzad["Sprzedaz_wartosc"])
-                    ikona = podium_ikony[miejsce] if miejsce < len(podium_ikony) else f"{miejsce+1}."
-                    
-                    kolor_tla = kolory_tla_top5[miejsce] if miejsce < len(kolory_tla_top5) else "#f8f9fa"
-                    
-                    st.markdown(f"""
-                    <div style='
-                        background-color: {kolor_tla};
-                        border-radius: 15px;
-                        padding: 12px;
-                        margin-bottom: 10px;
-                        text-align:center;
-                    '>
-                        <div style='font-size:22px; font-weight:bold;'>{ikona} {indeks}</div>
-                        <div style='font-size:14px;'>💊 {ilosc:,.0f} szt. &nbsp;&nbsp; 💰 {wartosc:,.0f} zł</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+                srednio_promocji = [promocje_produktu_w_roku.get((str(indeks), rok)) for indeks in df_rok_produkty["Indeks"]]
+                opisy = [
+                    f"<div class='karta-opis'>🎯 śr. {formatuj_liczbe(srednio, 1)} aktywnych promocji / mies.</div>"
+                    if srednio is not None else ""
+                    for srednio in srednio_promocji
+                ]
+                siatka_kart(karty_top5(df_rok_produkty).assign(opis=opisy), kolumny=1, klasa="karta-top5",
+                            naglowek=f"### Rok {rok}")
             else:
-                st.write("Brak danych do wyświetlenia.")
+                st.markdown(f"### Rok {rok}\n\nBrak danych do wyświetlenia.")
+
+    # ======= Promocje aktywne dla produktu w wybranym miesiącu =======
+    with st.expander("🔎 Promocje aktywne dla produktu w miesiącu"):
+        if len(indeks_promocji) == 0:
+            st.info("Brak surowych plików promocji ('promocje_<kategoria>.parquet') - wyszukiwanie niedostępne.")
+        else:
+            kol_produkt, kol_rok, kol_miesiac = st.columns(3)
+            produkt_wybrany = kol_produkt.selectbox("Indeks produktu", indeks_promocji.produkty, key="promocje_produkt")
+            rok_promocji = kol_rok.selectbox("Rok", top_years, index=len(top_years) - 1, key="promocje_rok")
+            miesiac_promocji = kol_miesiac.selectbox(
+                "Miesiąc", list(month_names.keys()), format_func=month_names.get, key="promocje_miesiac"
+            )
+            poczatek_miesiaca = pd.Timestamp(year=rok_promocji, month=miesiac_promocji, day=1)
+            koniec_miesiaca = poczatek_miesiaca + pd.offsets.MonthEnd(0)
+            aktywne_id = indeks_promocji.aktywne(produkt_wybrany, poczatek_miesiaca, koniec_miesiaca)
+            st.metric("Promocje nakładające się na miesiąc", len(aktywne_id))
+            if len(aktywne_id) > 0:
+                tabela_stronicowana(
+                    df_promocje[df_promocje['Id promocji'].isin(aktywne_id)
+                                & (df_promocje['Id kartoteki'] == produkt_wybrany)],
+                    "promocje_aktywne"
+                )
 
 with tab4:
     kolory = ['#7EC8E3', '#0074D9', '#F6A5A5']
-    prog_pareto = st.selectbox("Wybierz próg koncentracji (Pareto)", [70, 80, 90], index=1)
+    prog_pareto = st.selectbox("Wybierz próg koncentracji (Pareto)", PROGI_PARETO, index=1)
     st.header("📊 Podsumowanie sprzedaży wg lat")
-    analiza_wg = st.radio(
-        "Wybierz typ danych:",
-        ("Ilość sztuk", "Sprzedaż wartościowa"),
-        horizontal=True,
-        key="analiza_wg_radio"
-    )
-    
+    analiza_wg = miara_globalna # Typ danych wybierany w panelu bocznym
+
+    # Agregaty z kostki z uwzględnieniem filtrów globalnych (lata, kategorie, rodzaje promocji)
+    df_kat_kostka = dane_z_kostki('pareto_kategorie')
+    df_prom_kostka = dane_z_kostki('pareto_promocje')
+    df_prom_kostka = df_prom_kostka[df_prom_kostka['Rodzaj promocji'] != BEZ_PROMOCJI]
+    df_lata_kostka = dane_z_kostki('sumy_roczne')
+
     def suma_wg_roku_agg(df_agg, kolumna_do_sumowania):
-        yearly_sums = df_sales_by_category.groupby('Rok')[kolumna_do_sumowania].sum()
-        return yearly_sums.reindex([2022, 2023, 2024]) # Upewnij się, że lata są w odpowiedniej kolejności
+        yearly_sums = df_agg.groupby('Rok')[kolumna_do_sumowania].sum()
+        return yearly_sums.reindex(lata_wybrane) # Upewnij się, że lata są w odpowiedniej kolejności
     
     
     left_col, right_col = st.columns([3, 2])
     
     with left_col:
-        kol1, kol2, kol3 = st.columns(3)
-        for i, rok in enumerate([2022, 2023, 2024]):
+        kolumny_lat = st.columns(max(len(lata_wybrane), 1))
+        for i, rok in enumerate(lata_wybrane):
             # Obliczanie sum rocznych bezpośrednio z zagregowanych danych
-            sprzedaz_ilosc = df_sales_by_category[df_sales_by_category['Rok'] == rok]['Ilość'].sum()
-            sprzedaz_wartosc = df_sales_by_category[df_sales_by_category['Rok'] == rok]['Sprzedaż budżetowa'].sum()
-            kol = [kol1, kol2, kol3][i]
+            sprzedaz_ilosc = df_lata_kostka[df_lata_kostka['Rok'] == rok]['Ilość'].sum()
+            sprzedaz_wartosc = df_lata_kostka[df_lata_kostka['Rok'] == rok]['Sprzedaż budżetowa'].sum()
+            kol = kolumny_lat[i]
     
             with kol:
                 st.markdown(f"""
                     <div style="font-size:30px; font-weight:bold; margin-bottom:3px;">Rok {rok}</div>
-                    <div style="font-size:25px;">Ilość sztuk:<br><b>{int(sprzedaz_ilosc):,}</b></div>
-                    <div style="font-size:25px;">Wartość sprzedaży:<br><b>{sprzedaz_wartosc:,.2f} zł</b></div>
+                    <div style="font-size:25px;">Ilość sztuk:<br><b>{formatuj_liczbe(sprzedaz_ilosc)}</b></div>
+                    <div style="font-size:25px;">Wartość sprzedaży:<br><b>{formatuj_liczbe(sprzedaz_wartosc, 2, ' zł')}</b></div>
                 """, unsafe_allow_html=True)
     
     with right_col:
@@ -1200,12 +2220,12 @@ with tab4:
         y_label = "Wartość sprzedaży [zł]" if analiza_wg == "Sprzedaż wartościowa" else "Sprzedaż ilość" # Etykieta może być nadal "Sprzedaż ilość"
     
         # Obliczamy sumy roczne za pomocą nowej funkcji na zagregowanych danych
-        wartosci_roczne = suma_wg_roku_agg(df_sales_by_category, kolumna_wykres_do_plot)
+        wartosci_roczne = suma_wg_roku_agg(df_lata_kostka, kolumna_wykres_do_plot)
     
         fig_lata = go.Figure(go.Bar(
             x=wartosci_roczne.index.astype(str),
             y=wartosci_roczne.values,
-            marker_color=kolory
+            marker_color=kolory[:len(wartosci_roczne)]
         ))
         fig_lata.update_layout(
             title="Podsumowanie wg lat",
@@ -1223,72 +2243,65 @@ with tab4:
     
     # Kolumna dla wykresów Pareto będzie teraz dynamicznie nazywana
     kolumna_wykres_for_pareto = wybierz_kolumne_wg(analiza_wg)
+
+    kolumny_pareto = {
+        kolumna_wykres_for_pareto: kolumna_liczb(),
+        'Skumulowany %': kolumna_liczb(1, width="small"),
+    }
     
     
-    # --- Sekcja koncentracji sprzedaży wg kategorii (Używa df_sales_by_category) ---
+    # --- Sekcja koncentracji sprzedaży wg kategorii (z kostki) ---
     with left_col:
         st.header("📊 Koncentracja sprzedaży wg kategorii")
-        kat_cols = st.columns(3)
-        for i, rok in enumerate([2022, 2023, 2024]):
+        kat_cols = st.columns(max(len(lata_wybrane), 1))
+        for i, rok in enumerate(lata_wybrane):
             with kat_cols[i]:
-                # Używamy nowej funkcji analiza_pareto_from_agg z df_sales_by_category
-                liczba_kat, procent_kat, kat_ogran, sprzedaz_kat = analiza_pareto_from_agg(
-                    df_sales_by_category, 'Kategoria', analiza_wg, prog_pareto, rok_filtr=rok
+                # Używamy nowej funkcji analiza_pareto_from_agg z agregatem kategorii z kostki
+                liczba_kat, procent_kat, kat_ogran, sprzedaz_kat = analiza_pareto_cached(
+                    df_kat_kostka, 'Kategoria', analiza_wg, prog_pareto, rok_filtr=rok
                 )
                 st.markdown(f"### Rok {rok}")
                 st.markdown(
                     f"""
                     <table style='font-size:12px; width:100%;'>
                         <tr><td><b>Liczba kategorii ({prog_pareto}%)</b></td><td>{liczba_kat}</td></tr>
-                        <tr><td><b>Procent kategorii</b></td><td>{procent_kat:.1f}%</td></tr>
+                        <tr><td><b>Procent kategorii</b></td><td>{formatuj_liczbe(procent_kat, 1, '%')}</td></tr>
                     </table>
                     """, unsafe_allow_html=True
                 )
-                styl_df = kat_ogran.style \
-                    .format({kolumna_wykres_for_pareto: "{:,.0f}", 'Skumulowany %': "{:.1f} %"}) \
-                    .set_table_styles([
-                        {'selector': 'th', 'props': [('font-size', '11px')]},
-                        {'selector': 'td', 'props': [('font-size', '11px')]},
-                    ])
-                st.dataframe(styl_df, use_container_width=True)
+                tabela_stronicowana(kat_ogran, f"pareto_kategorie_{rok}", column_config=kolumny_pareto)
         st.write("---")
     
-    # --- Sekcja koncentracji sprzedaży wg promocji (Używa df_sales_by_promotion) ---
+    # --- Sekcja koncentracji sprzedaży wg promocji (z kostki, bez sprzedaży poza promocjami) ---
     with left_col:
         st.header("📊 Koncentracja sprzedaży wg promocji")
-        promo_cols = st.columns(3)
-        for i, rok in enumerate([2022, 2023, 2024]):
+        promo_cols = st.columns(max(len(lata_wybrane), 1))
+        for i, rok in enumerate(lata_wybrane):
             with promo_cols[i]:
-                # Używamy nowej funkcji analiza_pareto_from_agg z df_sales_by_promotion
-                liczba_prom, procent_prom, prom_ogran, sprzedaz_prom = analiza_pareto_from_agg(
-                    df_sales_by_promotion, 'Rodzaj promocji', analiza_wg, prog_pareto, rok_filtr=rok
+                # Używamy nowej funkcji analiza_pareto_from_agg z agregatem promocji z kostki
+                liczba_prom, procent_prom, prom_ogran, sprzedaz_prom = analiza_pareto_cached(
+                    df_prom_kostka, 'Rodzaj promocji', analiza_wg, prog_pareto, rok_filtr=rok
                 )
                 st.markdown(f"### Rok {rok}")
                 st.markdown(
                     f"""
                     <table style='font-size:12px; width:100%;'>
                         <tr><td><b>Liczba promocji ({prog_pareto}%)</b></td><td>{liczba_prom}</td></tr>
-                        <tr><td><b>Procent promocji</b></td><td>{procent_prom:.1f}%</td></tr>
+                        <tr><td><b>Procent promocji</b></td><td>{formatuj_liczbe(procent_prom, 1, '%')}</td></tr>
                     </table>
                     """, unsafe_allow_html=True
                 )
-                styl_df = prom_ogran.style \
-                    .format({kolumna_wykres_for_pareto: "{:,.0f}", 'Skumulowany %': "{:.1f} %"}) \
-                    .set_table_styles([
-                        {'selector': 'th', 'props': [('font-size', '11px')]},
-                        {'selector': 'td', 'props': [('font-size', '11px')]},
-                    ])
-                st.dataframe(styl_df, use_container_width=True)
+                tabela_stronicowana(prom_ogran, f"pareto_promocje_{rok}", column_config=kolumny_pareto)
         st.write("---")
     
-    # --- Sekcja wykresów Pareto (Używa df_sales_by_category i df_sales_by_promotion) ---
+    # --- Sekcja wykresów Pareto (z kostki) ---
     with right_col:
         st.header("📊 Wykresy Pareto - kategorie i promocje")
     
         df_kat_all_plot = []
-        for rok in [2022, 2023, 2024]:
+        for rok in lata_wybrane:
             # Aby wykres pokazywał wszystkie kategorie/promocje, ustawiamy próg Pareto na 100
-            _, _, _, sprzedaz_kat = analiza_pareto_from_agg(df_sales_by_category, 'Kategoria', analiza_wg, 100, rok_filtr=rok)
+            _, _, _, sprzedaz_kat = analiza_pareto_cached(df_kat_kostka, 'Kategoria', analiza_wg, 100, rok_filtr=rok)
             df_tmp = sprzedaz_kat.reset_index()
             df_tmp['Rok'] = rok
             df_kat_all_plot.append(df_tmp)
@@ -1296,13 +2309,14 @@ with tab4:
     
         fig_kat = go.Figure()
     
-        for i, rok in enumerate([2022, 2023, 2024]):
+        for i, rok in enumerate(lata_wybrane):
             df_rok_plot = df_kat_all_plot[df_kat_all_plot['Rok'] == rok]
             fig_kat.add_trace(go.Bar(
                 x=df_rok_plot['Kategoria'],
                 y=df_rok_plot[kolumna_wykres_for_pareto],
                 name=str(rok),
-                marker_color=kolory[i]
+                marker_color=kolory[i % len(kolory)],
+                marker_opacity=przezroczystosc_wyboru(df_rok_plot['Kategoria'], filtr_krzyzowy.get('Kategoria', ()))
             ))
         fig_kat.update_layout(
             barmode='group',
@@ -1312,25 +2326,30 @@ with tab4:
             margin=dict(l=10, r=10, t=40, b=40),
             xaxis_tickangle=-45
         )
-        st.plotly_chart(fig_kat, use_container_width=True)
+        st.plotly_chart(fig_kat, use_container_width=True, key="wykres_pareto_kategorie",
+                        on_select=lambda: zaznacz_na_wykresie("wykres_pareto_kategorie", 'Kategoria'),
+                        selection_mode=("points", "box"))
     
         df_prom_all_plot = []
-        for rok in [2022, 2023, 2024]:
+        for rok in lata_wybrane:
             # Aby wykres pokazywał wszystkie kategorie/promocje, ustawiamy próg Pareto na 100
-            _, _, _, sprzedaz_prom = analiza_pareto_from_agg(df_sales_by_promotion, 'Rodzaj promocji', analiza_wg, 100, rok_filtr=rok)
+            _, _, _, sprzedaz_prom = analiza_pareto_cached(df_prom_kostka, 'Rodzaj promocji', analiza_wg, 100, rok_filtr=rok)
             df_tmp = sprzedaz_prom.reset_index()
             df_tmp['Rok'] = rok
             df_prom_all_plot.append(df_tmp)
         df_prom_all_plot = pd.concat(df_prom_all_plot)
     
         fig_prom = go.Figure()
-        for i, rok in enumerate([2022, 2023, 2024]):
+        for i, rok in enumerate(lata_wybrane):
             df_rok_plot = df_prom_all_plot[df_prom_all_plot['Rok'] == rok]
             fig_prom.add_trace(go.Bar(
                 x=df_rok_plot['Rodzaj promocji'],
                 y=df_rok_plot[kolumna_wykres_for_pareto],
                 name=str(rok),
-                marker_color=kolory[i]
+                marker_color=kolory[i % len(kolory)],
+                marker_opacity=przezroczystosc_wyboru(
+                    df_rok_plot['Rodzaj promocji'], filtr_krzyzowy.get('Rodzaj promocji', ())
+                )
             ))
         fig_prom.update_layout(
             barmode='group',
@@ -1341,9 +2360,40 @@ with tab4:
             xaxis_tickangle=-45
         )
     
-        st.plotly_chart(fig_prom, use_container_width=True)
+        st.plotly_chart(fig_prom, use_container_width=True, key="wykres_pareto_promocje",
+                        on_select=lambda: zaznacz_na_wykresie("wykres_pareto_promocje", 'Rodzaj promocji'),
+                        selection_mode=("points", "box"))
+
+        # --- Równoległe promocje wg kategorii (z indeksu przedziałów promocji) ---
+        st.header("📊 Równoległe promocje wg kategorii")
+        if koncentracja_promocji.empty or 'Kategoria nazwa' not in koncentracja_promocji.columns:
+            st.info("Brak surowych plików promocji ('promocje_<kategoria>.parquet') - wykres niedostępny.")
+        else:
+            rownolegle_kat = (
+                koncentracja_promocji[koncentracja_promocji['Rok'].isin(lata_wybrane)]
+                .groupby(['Kategoria nazwa', 'Rok'])['Liczba promocji'].mean()
+                .reset_index()
+            )
+            fig_rownolegle = go.Figure()
+            for i, rok in enumerate(lata_wybrane):
+                df_rok_plot = rownolegle_kat[rownolegle_kat['Rok'] == rok]
+                fig_rownolegle.add_trace(go.Bar(
+                    x=df_rok_plot['Kategoria nazwa'],
+                    y=df_rok_plot['Liczba promocji'],
+                    name=str(rok),
+                    marker_color=kolory[i % len(kolory)]
+                ))
+            fig_rownolegle.update_layout(
+                barmode='group',
+                title="Średnia liczba aktywnych promocji na produkt w miesiącu",
+                yaxis_title="Liczba promocji",
+                height=350,
+                margin=dict(l=10, r=10, t=40, b=40),
+                xaxis_tickangle=-45
+            )
+            st.plotly_chart(fig_rownolegle, use_container_width=True)
+
 
-        
 with tab5:
     st.title("Analiza udziałów rynkowych i struktury sprzedaży Neuca na podstawie wybranych kategorii leków")
 
@@ -1353,24 +2403,9 @@ with tab5:
         udzialy_2023 = df_udzialy_all[df_udzialy_all["Rok"] == 2023].copy()
         udzialy_2024 = df_udzialy_all[df_udzialy_all["Rok"] == 2024].copy()
         
-        @st.cache_data
-        def oblicz_udzial_roczny_cached(df_year: pd.DataFrame):
-            # Upewnij się, że kolumny są typu numerycznego
-            df_year['Sprzedaż ilość'] = pd.to_numeric(df_year['Sprzedaż ilość'], errors='coerce')
-            df_year['Sprzedaż budżetowa'] = pd.to_numeric(df_year['Sprzedaż budżetowa'], errors='coerce')
-            df_year['Sprzedaż rynek ilość'] = pd.to_numeric(df_year['Sprzedaż rynek ilość'], errors='coerce')
-            df_year['Sprzedaż rynek wartość'] = pd.to_numeric(df_year['Sprzedaż rynek wartość'], errors='coerce')
-    
-            neuca_sum_ilosc = df_year["Sprzedaż ilość"].sum()
-            neuca_sum_budzet = df_year["Sprzedaż budżetowa"].sum()
-            
-            rynek_sum_ilosc = df_year["Sprzedaż rynek ilość"].sum()
-            rynek_sum_wartosc = df_year["Sprzedaż rynek wartość"].sum()
-            
-            udzial_ilosc = (100 * neuca_sum_ilosc / rynek_sum_ilosc) if rynek_sum_ilosc != 0 else 0
-            udzial_wartosc = (100 * neuca_sum_budzet / rynek_sum_wartosc) if rynek_sum_wartosc != 0 else 0
-            
-            return round(udzial_ilosc, 2), round(udzial_wartosc, 2)
+        @pamiec.zapamietaj
+        def oblicz_udzial_roczny_cached(df_year: pd.DataFrame) -> tuple:
+            return oblicz_udzial_roczny(df_year)
         
         udzial_ilosc_2023, udzial_wartosc_2023 = oblicz_udzial_roczny_cached(udzialy_2023)
         udzial_ilosc_2024, udzial_wartosc_2024 = oblicz_udzial_roczny_cached(udzialy_2024)
@@ -1388,15 +2423,15 @@ with tab5:
         with col1:
             st.metric(
                 label=f" Udział ilościowy Neuca ({rok_wybrany}) w odniesieniu do 2023",
-                value=f"{pokaz_ilosc:.2f}%",
-                delta=f"{delta_ilosc:+.2f} pp"  # <== zmiana tu
+                value=formatuj_liczbe(pokaz_ilosc, 2, "%"),
+                delta=formatuj_liczbe(delta_ilosc, 2, " pp", znak=True)  # <== zmiana tu
             )
 
         with col2:
             st.metric(
                 label=f" Udział wartościowy Neuca ({rok_wybrany}) w odniesieniu do 2023",
-                value=f"{pokaz_wartosc:.2f}%",
-                delta=f"{delta_wartosc:+.2f} pp"  # <== zmiana tu
+                value=formatuj_liczbe(pokaz_wartosc, 2, "%"),
+                delta=formatuj_liczbe(delta_wartosc, 2, " pp", znak=True)  # <== zmiana tu
             )
         st.subheader("Miesięczne udziały Neuca w rynku")
         st.markdown("---") # separator dla wykresów miesięcznych
@@ -1404,26 +2439,14 @@ with tab5:
             2023: '#0074D9',  # przykładowy kolor dla 2023 (niebieski)
             2024: '#F6A5A5'   # przykładowy kolor dla 2024 (pomarańczowy)
         }
-        df_udzialy_all['Miesiąc'] = df_udzialy_all['Miesiąc'].map(month_names_short)
-        # Wykresy miesięczne bazujące bezpośrednio na df_udzialy_all
-        fig_ilosc = px.line(
-            df_udzialy_all,
-            x="Miesiąc",
-            y="Udział ilościowy (%)",
-            color='Rok',
-            markers=True,
-            title="Udział ilościowy Neuca w rynku po miesiącach",
-            color_discrete_map=koly
+        # Wykresy miesięczne bazujące bezpośrednio na df_udzialy_all (w zakresie lat z panelu bocznego)
+        df_udzialy_wykres = df_udzialy_all[df_udzialy_all['Rok'].between(rok_od, rok_do)]
+        df_udzialy_wykres = df_udzialy_wykres.assign(Miesiąc=df_udzialy_wykres['Miesiąc'].map(month_names_short))
+        fig_ilosc = rysuj_wykres_udzialow(
+            df_udzialy_wykres, "Udział ilościowy (%)", "Udział ilościowy Neuca w rynku po miesiącach", koly
         )
-        
-        fig_wartosc = px.line(
-            df_udzialy_all,
-            x="Miesiąc",
-            y="Udział wartościowy (%)",
-            color='Rok',
-            markers=True,
-            title="Udział wartościowy Neuca w rynku po miesiącach",
-            color_discrete_map=koly
+        fig_wartosc = rysuj_wykres_udzialow(
+            df_udzialy_wykres, "Udział wartościowy (%)", "Udział wartościowy Neuca w rynku po miesiącach", koly
         )
         
         fig_ilosc.update_yaxes(range=[0, 60])
@@ -1436,104 +2459,25 @@ with tab5:
             st.plotly_chart(fig_wartosc, use_container_width=True)
 
   
-    def formatuj_liczbe(x):
-     if pd.isna(x):
-        return ""
-     return f"{int(x):,}".replace(",", " ")
-
-    def przygotuj_tabele_porownawcza_surowa(tabela_2024, tabela_2023):
-        """
-        Łączy dwie tabele (dla 2024 i 2023) i formatuje kolumny do porównania.
-        Oczekuje tabel już przygotowanych z obliczeniami procentowymi.
-        """
-        tabela_2024 = tabela_2024.copy()
-        tabela_2023 = tabela_2023.copy()
-    
-        # Znajdź wspólne kolumny, które nie są 'Miesiąc_str'
-        wspolne_kolumny = [col for col in tabela_2024.columns if col in tabela_2023.columns and col != "Miesiąc_str"]
-    
-        # Zmieniamy nazwy kolumn, żeby były unikalne dla każdego roku przed połączeniem
-        tabela_2024_renamed = tabela_2024.rename(columns={col: f"{col}_2024" for col in wspolne_kolumny})
-        tabela_2023_renamed = tabela_2023.rename(columns={col: f"{col}_2023" for col in wspolne_kolumny})
-        # Łączymy tabele na podstawie kolumny 'Miesiąc_str'. Użyj 'outer' join, aby uwzględnić miesiące,
-        # które mogą być obecne tylko w jednym z lat.
-        tabela = tabela_2024_renamed.merge(tabela_2023_renamed, on='Miesiąc_str', how='outer').sort_values('Miesiąc_str')
-    
-        def sformatuj_kolumne_porownawcza(wart_2024, wart_2023, is_percent_col=False):
-            """
-            Formatuje pojedynczą komórkę w tabeli porównawczej, dodając informacje o zmianie.
-            """
-            if pd.isna(wart_2024) and pd.isna(wart_2023):
-                return ""
-                
-            if pd.notna(wart_2024) and pd.notna(wart_2023) and wart_2023 >= 0:
-                if is_percent_col:
-                    delta_pp = wart_2024 - wart_2023
-                    if delta_pp > 0:
-                        return f"{wart_2024:.2f}% ({wart_2023:.2f}%) <span style='color:green'>▲ {delta_pp:.2f} p.p.</span>"
-                    elif delta_pp < 0:
-                        return f"{wart_2024:.2f}% ({wart_2023:.2f}%) <span style='color:red'>▼ {abs(delta_pp):.2f} p.p.</span>"
-                    else:
-                        return f"{wart_2024:.2f}% ({wart_2023:.2f}%)"
-                else:
-                    tekst = f"{formatuj_liczbe(wart_2024)} ({formatuj_liczbe(wart_2023)})"
-                    if wart_2023 != 0:
-                        zmiana_procentowa = ((wart_2024 - wart_2023) / abs(wart_2023)) * 100
-                        if zmiana_procentowa > 0:
-                            tekst += f" <span style='color:green'>▲ {zmiana_procentowa:.2f}%</span>"
-                        elif zmiana_procentowa < 0:
-                            tekst += f" <span style='color:red'>▼ {abs(zmiana_procentowa):.2f}%</span>"
-                    return tekst
-            else: # Obsługa NaN lub przypadków, gdzie nie ma sensu porównywać
-                if pd.notna(wart_2024) and pd.isna(wart_2023):
-                    return f"{formatuj_liczbe(wart_2024)} (-)" if not is_percent_col else f"{wart_2024:.2f}% (-)"
-                elif pd.isna(wart_2024) and pd.notna(wart_2023):
-                    return f"(-) ({formatuj_liczbe(wart_2023)})" if not is_percent_col else f"(-) ({wart_2023:.2f}%)"
-                return "" # Jeśli obie NaN, pusty string
-    
-        # Lista kolumn, które mają być traktowane jako procentowe
-        percent_cols = ['NEUCA%', 'PROMO%', 'ZP%', 'NORMAL%']
-    
-        for col in wspolne_kolumny:
-            is_percent = col in percent_cols
-            tabela[col] = tabela.apply(
-                lambda row: sformatuj_kolumne_porownawcza(
-                    row.get(f"{col}_2024", pd.NA), # Użyj .get() z wartością domyślną pd.NA
-                    row.get(f"{col}_2023", pd.NA), # Użyj .get() z wartością domyślną pd.NA
-                    is_percent_col=is_percent
-                ),
-                axis=1
-            )
-    
-        tabela.rename(columns={'Miesiąc_str': 'Miesiąc'}, inplace=True)
-    
-        # Sortuj kolumny, aby "Miesiąc" był pierwszy, a potem pozostałe wspólne kolumny
-        return tabela[["Miesiąc"] + wspolne_kolumny]
 
     
-    # --- Ładowanie danych dla wartości ---
+    # --- Ładowanie danych i generowanie tabel porównawczych ---
+    # Tabela wartości
+    pliki_wartosc = ['tabela_2024_wartosc.parquet', 'tabela_2023_wartosc.parquet']
     try:
-        tabela_2024_wartosc = pd.read_parquet('tabela_2024_wartosc.parquet')
-        tabela_2023_wartosc = pd.read_parquet('tabela_2023_wartosc.parquet')
+        tabela_porownawcza_wartosc = tabela_porownawcza(*pliki_wartosc, wersja_plikow(pliki_wartosc))
     except FileNotFoundError as e:
         st.error(f"Błąd: Nie znaleziono pliku danych dla wartości: {e}. Upewnij się, że pliki .parquet są w odpowiednim katalogu.")
         st.stop() # Zatrzymuje aplikację
     
-    # --- Ładowanie danych dla ilości ---
+    # Tabela ilości
+    pliki_ilosc = ['tabela_2024_ilosc.parquet', 'tabela_2023_ilosc.parquet']
     try:
-        tabela_2024_ilosc = pd.read_parquet('tabela_2024_ilosc.parquet')
-        tabela_2023_ilosc = pd.read_parquet('tabela_2023_ilosc.parquet')
+        tabela_porownawcza_ilosc = tabela_porownawcza(*pliki_ilosc, wersja_plikow(pliki_ilosc))
     except FileNotFoundError as e:
         st.error(f"Błąd: Nie znaleziono pliku danych dla ilości: {e}. Upewnij się, że pliki .parquet są w odpowiednim katalogu.")
         st.stop() # Zatrzymuje aplikację
     
-    # --- Generowanie tabel porównawczych ---
-    # Tabela wartości
-    tabela_porownawcza_wartosc = przygotuj_tabele_porownawcza_surowa(tabela_2024_wartosc, tabela_2023_wartosc)
-    
-    # Tabela ilości
-    tabela_porownawcza_ilosc = przygotuj_tabele_porownawcza_surowa(tabela_2024_ilosc, tabela_2023_ilosc)
-    
     # --- Wyświetlanie w st.expander ---
     
     with st.expander("📊 Tabela sprzedaży wg wartości dla roku 2024 w porównaniu do 2023", expanded=False):
@@ -1543,6 +2487,53 @@ with tab5:
     with st.expander("📦 Tabela sprzedaży wg ilości dla roku 2024 w porównaniu do 2023", expanded=False):
         st.subheader("Sprzedaż ilościowa 2024 (2023)")
         st.html(tabela_porownawcza_ilosc.to_html(escape=False, index=False))
+
+    st.subheader("🚨 Anomalie udziałów rynkowych")
+    alerty_udzialow = anomalie_szeregow(wersja_danych_sprzedazy() + wersja_plikow(["udzial_all.parquet"]))
+    pokaz_alerty(alerty_udzialow[alerty_udzialow['Źródło'] == "Udział rynkowy"], "anomalie_udzialow")
+
+    st.subheader("🏷️ Udziały rynkowe produktów")
+    udzialy_produktow = zbuduj_udzialy_produktow(wersja_udzialow_produktow())
+    if udzialy_produktow is None:
+        st.info("Ranking produktów wymaga pliku 'rynek.parquet' oraz surowych plików 'sprzedaz_<kategoria>.parquet'.")
+    else:
+        lata_rynku = udzialy_produktow.lata
+        kol_rok, kol_k, kol_min = st.columns(3)
+        rok_rankingu = kol_rok.selectbox("Rok", lata_rynku[::-1], key="udzialy_produktow_rok")
+        top_k = kol_k.slider("Liczba produktów (k)", 5, 50, 10, key="udzialy_produktow_k")
+        min_rynek = kol_min.number_input("Min. sprzedaż rynku w roku", min_value=0, value=0, step=100,
+                                         key="udzialy_produktow_min_rynek")
+        # Produkty z marginalną sprzedażą rynku mają przypadkowe udziały - próg odcina je z rankingów
+        df_udzialy_rok = udzialy_produktow.udzialy_roczne(rok_rankingu, miara_globalna, filtry_globalne['Kategoria'])
+        df_udzialy_rok = df_udzialy_rok[df_udzialy_rok['Rynek'] >= min_rynek].set_index('Indeks')
+
+        st.markdown(f"**Top {top_k} produktów wg udziału ({miara_globalna.lower()}, {rok_rankingu})**")
+        tabela_stronicowana(df_udzialy_rok.nlargest(top_k, 'Udział (%)'), "udzialy_produktow_top")
+
+        if rok_rankingu - 1 in lata_rynku:
+            df_zmiany = udzialy_produktow.zmiany_rr(rok_rankingu, miara_globalna, filtry_globalne['Kategoria'])
+            df_zmiany = df_zmiany[df_zmiany['Rynek'] >= min_rynek].set_index('Indeks')
+            col_wzrosty, col_spadki = st.columns(2)
+            with col_wzrosty:
+                st.markdown(f"**📈 Największe wzrosty udziału {rok_rankingu} vs {rok_rankingu - 1}**")
+                tabela_stronicowana(df_zmiany.nlargest(top_k, 'Zmiana (pp)'), "udzialy_produktow_wzrosty")
+            with col_spadki:
+                st.markdown(f"**📉 Największe spadki udziału {rok_rankingu} vs {rok_rankingu - 1}**")
+                tabela_stronicowana(df_zmiany.nsmallest(top_k, 'Zmiana (pp)'), "udzialy_produktow_spadki")
+        else:
+            st.caption(f"Brak danych rynkowych za {rok_rankingu - 1} - zmiany r/r są niedostępne.")
+
+        produkt = st.selectbox(
+            "Szczegóły produktu", df_udzialy_rok.sort_values('Udział (%)', ascending=False).index,
+            key="udzialy_produktow_produkt"
+        )
+        if produkt is not None:
+            df_produkt = udzialy_produktow.szereg(produkt, miara_globalna)
+            df_produkt['Miesiąc'] = df_produkt['Miesiąc'].map(month_names_short)
+            st.plotly_chart(
+                rysuj_wykres_udzialow(df_produkt, 'Udział (%)', f"Miesięczny udział NEUCA - produkt {produkt}", {}),
+                use_container_width=True
+            )
         
 with tab6:
     st.markdown("# 🛠️ Modele i dane")
@@ -1627,7 +2618,7 @@ with tab6:
         'MAE': [13.256088689730703, 38.244279871610075, 20.698899244465498,58.28214017262464, 9.162161988206265],
         'MAPE(%)': [2.5224405921311193, 4.382407356704275, 3.000465067380612,5.799360158805493, 1.8526702732328826]
     })
-    st.dataframe(df_nested.style.format(precision=2), use_container_width=True)
+    st.dataframe(df_nested, column_config=get_numeric_columns_format_dict(df_nested), use_container_width=True)
 
     # 📊 Dodanie Twojej tabeli w expanderze
     with st.expander(" 📊 Szczegółowe wyniki modeli dla wszystkich zestawów"):
@@ -1691,12 +2682,12 @@ with tab6:
         df_final = pd.DataFrame(data)
         df_final.index = range(1, len(df_final) + 1)
 
-        st.dataframe(df_final.style.format({
-            'MSE': "{:.2f}",
-            'RMSE': "{:.2f}",
-            'MAE': "{:.2f}",
-            'MAPE (%)': "{:.2f}"
-        }), use_container_width=True)
+        st.dataframe(df_final, column_config={
+            'MSE': kolumna_liczb(2),
+            'RMSE': kolumna_liczb(2),
+            'MAE': kolumna_liczb(2),
+            'MAPE (%)': kolumna_liczb(2)
+        }, use_container_width=True)
 
 
     st.markdown("---")
@@ -1749,15 +2740,12 @@ with tab6:
     # Sprawdzanie, czy pliki istnieją, zanim spróbujemy je otworzyć
     if os.path.exists(shap_image_path) and os.path.exists(feature_image_path):
         try:
-            i = Image.open(shap_image_path)
-            n = Image.open(feature_image_path)
-
             st.subheader("📊 Ważność predyktorów dla modelu")
-            st.image(n, caption="Feature Importance", use_container_width=False, width=700)
+            st.image(feature_image_path, caption="Feature Importance", use_container_width=False, width=700)
             st.markdown("---")
 
             st.subheader("📊 Wykres SHAP")
-            st.image(i, caption="SHAP Summary Plot", use_container_width=False, width=700)
+            st.image(shap_image_path, caption="SHAP Summary Plot", use_container_width=False, width=700)
 
         except Exception as e:
             st.error(f"Błąd podczas ładowania obrazów SHAP/Feature Importance: {e}")
@@ -1766,93 +2754,67 @@ with tab6:
     else:
         st.warning("Nie znaleziono lokalnych plików obrazów SHAP/Feature Importance.")
         st.info(f"Upewnij się, że pliki '{shap_image_path}' i '{feature_image_path}' znajdują się w tym samym katalogu co Twój skrypt Streamlit.")
-# Dla "Wagi" (lewa kolumna)
-top3_rozpoczecia_waga = [
-    {"miesiac": "Kwiecień", "liczba": 299, "medal": "🥇", "color": "#E3F2FD"},
-    {"miesiac": "Lipiec", "liczba": 279, "medal": "🥈", "color": "#F3E5F5"},
-    {"miesiac": "Wrzesień", "liczba": 167, "medal": "🥉", "color": "#FFF3E0"},
-]
-
-top3_zakonczenia_waga = [
-    {"miesiac": "Czerwiec", "liczba": 264, "medal": "🥇", "color": "#E3F2FD"},
-    {"miesiac": "Wrzesień", "liczba": 259, "medal": "🥈", "color": "#F3E5F5"},
-    {"miesiac": "Sierpień", "liczba": 169, "medal": "🥉", "color": "#FFF3E0"},
-]
-
-# Dla "Przylepców" (prawa kolumna)
-top3_rozpoczecia_przylepce = [
-    {"miesiac": "Kwiecień", "liczba": 532, "medal": "🥇", "color": "#E3F2FD"},
-    {"miesiac": "Marzec", "liczba": 486, "medal": "🥈", "color": "#F3E5F5"},
-    {"miesiac": "Lipiec", "liczba": 466, "medal": "🥉", "color": "#FFF3E0"},
-]
-
-top3_zakonczenia_przylepce = [
-    {"miesiac": "Czerwiec", "liczba": 500, "medal": "🥇", "color": "#E3F2FD"},
-    {"miesiac": "Wrzesień", "liczba": 470, "medal": "🥈", "color": "#F3E5F5"},
-    {"miesiac": "Marzec", "liczba": 413, "medal": "🥉", "color": "#FFF3E0"},
-]
 
-with tab7:
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            rabat_wazony_waga = 10.09 # Jeśli to jest stała wartość
-
-            st.markdown(f"""
-            <div style='border: 2px solid #6c757d; border-radius: 15px; padding: 15px; background-color: #f0f4ff; box-shadow: 2px 2px 5px rgba(100, 149, 237, 0.3);'>
-                <h3 style='color: #4169E1;'>📊 Dane: Waga </h3>
-                <p style='color: black;'><b>Liczba wierszy:</b> 1670</p>
-                <p style='color: black;'><b>Liczba kolumn:</b> 21</p>
-                <p style='color: black; font-weight: bold;'>🎯 Średni rabat ważony: {rabat_wazony_waga:.2f}%</p>
-            </div>
-            """, unsafe_allow_html=True)
+def pokaz_panel_kategorii(kategoria: str):
+    """
+    Panel zakładki 7 dla jednej kategorii: karta z rozmiarem danych i rabatem ważonym,
+    tabela wskaźników oraz podium miesięcy rozpoczęcia i zakończenia promocji.
+    """
+    etykieta = kategorie_etykiety.get(kategoria, kategoria)
+    statystyki = statystyki_tab7[kategoria]
+
+    st.markdown(f"""
+    <div style='border: 2px solid #6c757d; border-radius: 15px; padding: 15px; background-color: #f0f4ff; box-shadow: 2px 2px 5px rgba(100, 149, 237, 0.3);'>
+        <h3 style='color: #4169E1;'>📊 Dane: {etykieta} </h3>
+        <p style='color: black;'><b>Liczba wierszy:</b> {statystyki["liczba_wierszy"]}</p>
+        <p style='color: black;'><b>Liczba kolumn:</b> {statystyki["liczba_kolumn"]}</p>
+        <p style='color: black; font-weight: bold;'>🎯 Średni rabat ważony: {formatuj_liczbe(statystyki["rabat_wazony"], 2, "%")}</p>
+    </div>
+    """, unsafe_allow_html=True)
 
-            st.markdown("### 📊 Statystyki wybranych wskaźników (Waga)")
-            format_for_wskwaga = get_numeric_columns_format_dict(
-                wskwaga,
-                format_string="{:,.2f}",
-                exclude_columns=[] # Dostosuj, jeśli masz kolumny, których nie chcesz formatować
-            )
-            styl_wskwaga = wskwaga.style.format(format_for_wskwaga)
-            st.dataframe(styl_wskwaga, use_container_width=True)
+    st.markdown(f"### 📊 Statystyki wybranych wskaźników ({etykieta})")
+    wsk = wskazniki_tab7.get(kategoria)
+    if wsk is None:
+        st.warning(f"Brak pliku wskaźników '{kategorie_wskazniki[kategoria]}' - uruchom 'przetworz_dane.py'.")
+    else:
+        format_for_wsk = get_numeric_columns_format_dict(
+            wsk,
+            miejsca=2,
+            exclude_columns=[] # Dostosuj, jeśli masz kolumny, których nie chcesz formatować
+        )
+        tabela_stronicowana(wsk, f"wskazniki_{kategoria}", column_config=format_for_wsk)
 
-        # --- Wywołanie nowej funkcji dla statycznych danych Wagi ---
-            show_podium_months_static(top3_rozpoczecia_waga, "rozpoczęcia promocji (Waga)")
-            show_podium_months_static(top3_zakonczenia_waga, "zakończenia promocji (Waga)")
+    show_podium_months_static(statystyki["top3_rozpoczecia"], f"rozpoczęcia promocji ({etykieta})")
+    show_podium_months_static(statystyki["top3_zakonczenia"], f"zakończenia promocji ({etykieta})")
 
-        with col2:
-            rabat_wazony_przylepce = 21.97 # Jeśli to jest stała wartość
-
-            st.markdown(f"""
-            <div style='border: 2px solid #6c757d; border-radius: 15px; padding: 15px; background-color: #f0f4ff; box-shadow: 2px 2px 5px rgba(100, 149, 237, 0.3);'>
-                <h3 style='color: #4169E1;'>📊 Dane: Przylepce </h3>
-                <p style='color: black;'><b>Liczba wierszy:</b> 2998</p>
-                <p style='color: black;'><b>Liczba kolumn:</b> 21</p>
-                <p style='color: black; font-weight: bold;'>🎯 Średni rabat ważony: {rabat_wazony_przylepce:.2f}%</p>
-                </div>
-            """, unsafe_allow_html=True)
-
-            st.markdown("### 📊 Statystyki wybranych wskaźników (Przylepce)")
-            format_for_wskprz = get_numeric_columns_format_dict(
-                wskprz,
-                format_string="{:,.2f}",
-                exclude_columns=[] # Dostosuj, jeśli masz kolumny, których nie chcesz formatować
-                )
-            styl_wskprz = wskprz.style.format(format_for_wskprz)
-            st.dataframe(styl_wskprz, use_container_width=True)
 
-            # --- Wywołanie nowej funkcji dla statycznych danych Przylepców ---
-            show_podium_months_static(top3_rozpoczecia_przylepce, "rozpoczęcia promocji (Przylepce)")
-            show_podium_months_static(top3_zakonczenia_przylepce, "zakończenia promocji (Przylepce)")
+with tab7:
+        kol_panele, col3 = st.columns([2, 1])
+        with kol_panele:
+            # Jeden panel na każdą kategorię z przetworzonymi danymi
+            kategorie_tab7 = list(statystyki_tab7.keys())
+            zakladki_kategorii = st.tabs([kategorie_etykiety.get(k, k) for k in kategorie_tab7])
+            for zakladka, kategoria in zip(zakladki_kategorii, kategorie_tab7):
+                with zakladka:
+                    pokaz_panel_kategorii(kategoria)
 
         with col3:
-            # Tworzymy DataFrame podsumowujący bezpośrednio z danych z tabeli na zdjęciu
-            podsumowanie_data = {
-                "Rodzaj promocji": ['Centralne','IPRA','Partner','RPM','Regionalne pozostałe','Sieciowe','Synoptis - akcje własne','ZGZ'],
-                "Częstość (%)": [7.9, 10.66, 13.17, 32.16, 5.99, 22.4, 2.46, 5.27],
-                "Sprzedaż (%)": [12.47, 11.83, 16.54, 15.58, 3.02, 17.26, 21.24, 2.07]
-            }
-
-            podsumowanie = pd.DataFrame(podsumowanie_data).set_index("Rodzaj promocji")
+            # Podsumowanie rodzajów promocji policzone z przetworzonych danych wybranej kategorii
+            opcje_podsumowania = [wszystkie_kategorie_tab7] + list(statystyki_tab7.keys())
+            kategoria_podsumowania = st.selectbox(
+                "Kategoria podsumowania promocji",
+                opcje_podsumowania,
+                index=opcje_podsumowania.index("PREPARATY SŁUŻĄCE DO ZMNIEJSZENIA WAGI CIAŁA")
+                if "PREPARATY SŁUŻĄCE DO ZMNIEJSZENIA WAGI CIAŁA" in opcje_podsumowania else 0,
+                format_func=lambda k: kategorie_etykiety.get(k, k),
+                key="podsumowanie_kategoria"
+            )
+            if kategoria_podsumowania == wszystkie_kategorie_tab7:
+                podsumowanie = oblicz_statystyki_promocji_cached(
+                    pd.concat(dane_tab7.values(), ignore_index=True)
+                )["podsumowanie"]
+            else:
+                podsumowanie = statystyki_tab7[kategoria_podsumowania]["podsumowanie"]
     
             # ------------------ PIERWSZE PODIUM ------------------
             st.markdown("### 🏆 Najczęstsze rodzaje promocji (wg częstości wystąpień)")
@@ -1861,18 +2823,13 @@ with tab7:
             medale = ["🥇", "🥈", "🥉"]
             cols = st.columns(3)
     
-            # Dokładne dane z obrazka
-            top_czestosc_data = [
-                ("RPM", 32.16),
-                ("Sieciowe", 22.40),
-                ("Partner", 13.17)
-            ]
+            top_czestosc_data = list(podsumowanie["Częstość (%)"].nlargest(3).items())
     
             for i, (nazwa, wartosc) in enumerate(top_czestosc_data):
                 with cols[i]:
                     st.markdown(f"""
                     <div style='background-color: {colors[i]}; padding: 15px; border-radius: 12px; text-align: center; box-shadow: 2px 2px 8px rgba(0,0,0,0.15);'>
-                        <h4 style='color: black;'>{medale[i]} {nazwa}: {wartosc}%</h4>
+                        <h4 style='color: black;'>{medale[i]} {nazwa}: {formatuj_liczbe(wartosc, 2, '%')}</h4>
                     </div>
                     """, unsafe_allow_html=True)
     
@@ -1881,57 +2838,124 @@ with tab7:
     
             cols = st.columns(3)
     
-            # Dokładne dane z obrazka
-            top_sprzedaz_data = [
-                ("Synoptis-akcje", 21.24),
-                ("Sieciowe", 17.26),
-                ("Partner", 16.54)
-            ]
+            top_sprzedaz_data = list(podsumowanie["Sprzedaż (%)"].nlargest(3).items())
     
             for i, (nazwa, wartosc) in enumerate(top_sprzedaz_data):
                 with cols[i]:
                     st.markdown(f"""
                     <div style='background-color: {colors[i]}; padding: 15px; border-radius: 12px; text-align: center; box-shadow: 2px 2px 8px rgba(0,0,0,0.15);'>
-                        <h4 style='color: black;'>{medale[i]} {nazwa}: {wartosc}%</h4>
+                        <h4 style='color: black;'>{medale[i]} {nazwa}: {formatuj_liczbe(wartosc, 2, '%')}</h4>
                     </div>
                     """, unsafe_allow_html=True)
     
             # ------------------ TABELA PODSUMOWUJĄCA ------------------
             st.markdown("### 📋 Pozostałe rodzaje promocji")
-            podsumowanie_do_wyswietlenia = podsumowanie.copy()
-            podsumowanie_do_wyswietlenia["Częstość (%)"] = podsumowanie_do_wyswietlenia["Częstość (%)"].astype(str) + "%"
-            podsumowanie_do_wyswietlenia["Sprzedaż (%)"] = podsumowanie_do_wyswietlenia["Sprzedaż (%)"].astype(str) + "%"
-            st.dataframe(podsumowanie_do_wyswietlenia, use_container_width=True)
+            # Procenty zostają liczbami (sortowanie w tabeli), jednostka jest w nazwie kolumny
+            st.dataframe(podsumowanie, use_container_width=True,
+                         column_config={"Częstość (%)": kolumna_liczb(2), "Sprzedaż (%)": kolumna_liczb(2)})
     
-            # Udział procentowy sprzedaży D19 (dokładne dane z obrazka)
-            liczba_lekow_d19 = 5 
-            sprzedaz_d19_stale = 10270
-            udzial_d19_stale = 29.08
-            sprzedaz_leku_69065 = 2373
-            udzial_leku_69065 = 6.72
             st.markdown("### Diagram ważniejszych predyktorów")
-            # Tworzenie grafu (zaktualizowane wartości na podstawie obrazka)
-            graf = graphviz.Digraph()
-            graf.node("Producent", " Producent: D19\n(jedyny uczestniczący w promocji Synoptis)",shape='folder', style='filled', fillcolor='#E0F7FA')
-            graf.node("Udział", "Udział promocyjny (Synoptis)\n w sprzedaży leków największy mimo bycia najrzadszą kategorią",shape='folder', style='filled', fillcolor='#FFF3E0')
-            graf.node("Typ zamówienia", "W tej promocji jedynie \n zamówienia modemowe i telefoniczne", shape='folder', style='filled', fillcolor='#FFF3E0')
-            graf.node("Produkty", f"💊 Produkty D19:\n{liczba_lekow_d19} unikalnych",shape='folder', style='filled', fillcolor='#F3E5F5')
-            graf.node("Sprzedaż", f"📈 Sprzedaż produktów D19:\n{sprzedaz_d19_stale:,} sztuk\n({udzial_d19_stale}% ogółem)",shape='folder', style='filled', fillcolor='#E1F5FE')
-            graf.node("Przykład", "📌 Przykład leku:\nIndeks 69065\n(należy do D19)", shape='folder', style='filled', fillcolor='#FFEBEE')
-            graf.node("Lek", f"📌 \nIndeks 69065\n sprzedaż {sprzedaz_leku_69065}, a jego udział {udzial_leku_69065}%", shape='folder', style='filled', fillcolor='#FFEBEE')
-            graf.edge("Producent", "Typ zamówienia", style='dashed')
-            graf.edge("Producent", "Udział", style='dashed')
-            graf.edge("Producent", "Produkty", style='dashed')
-            graf.edge("Produkty", "Sprzedaż", style='dashed')
-            graf.edge("Produkty", "Przykład", style='dashed')
-            graf.edge("Przykład", "Lek", style='dashed')
+            # Domyślnie promocja o największym udziale w sprzedaży - dla niej diagram jest najciekawszy
+            rodzaje_diagramu = podsumowanie["Sprzedaż (%)"].sort_values(ascending=False).index.tolist()
+            rodzaj_diagramu = st.selectbox("Rodzaj promocji na diagramie", rodzaje_diagramu, key="diagram_rodzaj")
+            svg_diagramu, zrodlo_diagramu = diagram_promocji(
+                kategoria_podsumowania, rodzaj_diagramu, wersja_danych_tab7(kategoria_podsumowania)
+            )
             # Wyświetlenie
-            st.graphviz_chart(graf)
-            
-            
-            
-            
-            
+            if svg_diagramu is not None:
+                st.image(svg_diagramu, use_container_width=True)
+            else:
+                st.graphviz_chart(zrodlo_diagramu)
+
+        # ------------------ UPLIFT PROMOCJI ------------------
+        st.markdown("---")
+        st.markdown("### 📈 Uplift promocji (udział w rynku produktu: w trakcie vs przed i vs rok wcześniej)")
+        df_uplift = oblicz_uplift_promocji_cached(df_promocje)
+        if df_uplift.empty:
+            st.info("Brak surowych plików promocji lub sprzedaży ('promocje_<kategoria>.parquet', "
+                    "'sprzedaz_<kategoria>.parquet') - uplift niedostępny.")
+        else:
+            if df_uplift['Uplift vs przed (%)'].isna().all():
+                st.warning("Brak danych rynkowych na poziomie produktu ('rynek.parquet') - "
+                           "uplift znormalizowany rynkiem nie może zostać policzony.")
+            uplift_wg = st.radio(
+                "Grupuj uplift wg",
+                ["Rodzaj promocji", "Id producenta sprzedaży", "Kategoria nazwa"],
+                horizontal=True,
+                key="uplift_wg_radio"
+            )
+            tabela_stronicowana(
+                zestaw_uplift(df_uplift, uplift_wg), f"uplift_{uplift_wg}",
+                column_config={
+                    'Mediana uplift vs przed (%)': kolumna_liczb(2),
+                    'Mediana uplift r/r (%)': kolumna_liczb(2),
+                    'Sprzedaż w trakcie': kolumna_liczb(),
+                }
+            )
+            with st.expander("🏅 Promocje wg upliftu (od największego)"):
+                tabela_stronicowana(
+                    df_uplift.sort_values('Uplift vs przed (%)', ascending=False, na_position='last'),
+                    "uplift_promocje"
+                )
 
 
- 
\ No newline at end of file
+with tab8:
+    st.header("🏪 Sprzedaż i promocje w aptekach")
+    if not pliki_sprzedazy():
+        st.info("Analiza aptek wymaga surowych plików 'sprzedaz_<kategoria>.parquet'.")
+    else:
+        # Surowe pliki są agregowane strumieniowo raz na wersję danych; filtry działają już na agregatach aptek
+        df_apteki = analiza_aptek(
+            wersja_plikow(list(pliki_sprzedazy().values())), tuple(lata_wybrane),
+            tuple(filtry_globalne['Kategoria'] or kategorie_kostki or kategorie_pliki), kolumna_miary
+        )
+        if filtry_globalne['Rodzaj promocji'] is not None:
+            st.caption("ℹ️ Analiza aptek nie uwzględnia filtra rodzajów promocji.")
+        if df_apteki.empty:
+            st.info("Brak sprzedaży aptek dla wybranych filtrów.")
+        else:
+            udzialy_aptek = df_apteki['Udział w sprzedaży (%)'].to_numpy() / 100
+            krzywa = np.concatenate([[0.0], np.cumsum(udzialy_aptek)])
+            odsetek_aptek = np.linspace(0, 100, len(krzywa))
+            # Gini z krzywej Lorenza (apteki rosnąco wg sprzedaży)
+            lorenz = np.concatenate([[0.0], np.cumsum(udzialy_aptek[::-1])])
+            gini = 1 - (lorenz[1:] + lorenz[:-1]).sum() / len(udzialy_aptek)
+            apteki_80 = int(np.searchsorted(krzywa, 0.8 - 1e-12))
+
+            kol1, kol2, kol3, kol4 = st.columns(4)
+            kol1.metric("Liczba aptek", formatuj_liczbe(len(df_apteki)))
+            kol2.metric("Apteki generujące 80% sprzedaży", formatuj_liczbe(100 * apteki_80 / len(df_apteki), 1, "%"),
+                        help=f"{formatuj_liczbe(apteki_80)} najlepszych aptek")
+            kol3.metric("Współczynnik Giniego", formatuj_liczbe(gini, 3))
+            kol4.metric("Udział sprzedaży promocyjnej",
+                        formatuj_liczbe((df_apteki['Sprzedaż'] * df_apteki['Udział sprzedaży promocyjnej (%)']).sum()
+                                        / df_apteki['Sprzedaż'].sum(), 1, "%"))
+
+            fig_koncentracja = go.Figure([
+                slad_liniowy(odsetek_aptek, 100 * krzywa, mode='lines', name="Apteki"),
+                go.Scatter(x=[0, 100], y=[0, 100], mode='lines', name="Równy podział", line=dict(dash='dash', color='gray')),
+            ])
+            fig_koncentracja.update_layout(
+                title=f"Koncentracja sprzedaży ({miara_globalna.lower()}) w aptekach",
+                xaxis_title="Odsetek aptek (od największej sprzedaży) [%]", yaxis_title="Skumulowany udział w sprzedaży [%]"
+            )
+            st.plotly_chart(fig_koncentracja, use_container_width=True)
+
+            st.subheader("Ranking aptek")
+            tabela_stronicowana(df_apteki, "apteki")
+
+# Postęp rozgrzewki na końcu przebiegu - panel pokazuje stan po narysowaniu zakładek
+with st.sidebar:
+    if not rozgrzewka.zakonczona:
+        st.progress(len(rozgrzewka.czasy) / max(len(rozgrzewka.zadania), 1),
+                    text=f"🔥 Rozgrzewanie cache: {len(rozgrzewka.czasy)}/{len(rozgrzewka.zadania)}")
+    else:
+        with st.expander("⏱️ Rozgrzewka cache"):
+            st.caption(f"{len(rozgrzewka.zadania)} zadań w {formatuj_liczbe(rozgrzewka.czas_calkowity, 1, ' s')}")
+            st.dataframe(rozgrzewka.raport(), hide_index=True, use_container_width=True)
+    with st.expander("🧠 Pamięć cache"):
+        kol_rozmiar, kol_trafienia = st.columns(2)
+        kol_rozmiar.metric("Rozmiar", formatuj_liczbe(pamiec.rozmiar / 1024 ** 2, 1, " MB"),
+                           help=f"Budżet: {formatuj_liczbe(BUDZET_PAMIECI_CACHE_MB, 0, ' MB')} - po przekroczeniu usuwane są najdawniej używane wyniki")
+        kol_trafienia.metric("Trafienia", formatuj_liczbe(pamiec.trafienia_proc, 1, "%"))
+        st.dataframe(pamiec.raport(), hide_index=True, use_container_width=True)
@@ -0,0 +1,241 @@
+"""
+Generuje pliki wejściowe zakładki 7 dashboardu dla wszystkich kategorii leków:
+- '<kategoria>_processed.parquet' - cechy promocji używane przez modele,
+- plik wskaźników (np. 'wskwaga.parquet') - średnia, mediana, odchylenie i maksimum wybranych cech,
+oraz bazową kostkę sprzedaży dashboardu ('kostka_sprzedazy.parquet') i liście hierarchii
+kategoria → producent → produkt → miesiąc ('hierarchia_sprzedazy.parquet').
+
+Każda kategoria jest przetwarzana w osobnym procesie, bo pliki są niezależne,
+a największy z nich (przeciwalergiczne, 2,39 mln wierszy sprzedaży) dominuje czas.
+
+Istniejące pliki cech i wskaźników (np. dane, na których trenowano modele z zakładki 6) nie są nadpisywane,
+jeśli nowy wynik ma inną zawartość - trafia on wtedy obok, do '<nazwa>.nowy.parquet'. --nadpisz to wyłącza.
+
+Uruchomienie:  python przetworz_dane.py [--katalog DANE] [--procesy N] [--nadpisz]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+# Kategorie, stałe kostki i funkcje liczące wspólne z dashboardem żyją w module analityka
+from analityka import (BEZ_PROMOCJI, MIARY_KOSTKI, agreguj_hierarchie_kategorii, kategorie_etykiety,
+                       kategorie_pliki, kategorie_wskazniki, macierz_miesieczna, sumy_okien)
+
+KOLUMNY_PROCESSED = [
+    'Producent sprzedażowy kod', 'Indeks', 'sprzedaż_sztuki', 'czas_trwania',
+    'Wyłączenie rabatowania', 'Zamówienie telefoniczne', 'Zamówienie modemowe', 'Zamówienie producenckie',
+    'Rabat promocyjny %', 'Rabat kwotowy', 'Miesiąc rozpoczęcia', 'Miesiąc zakończenia',
+    'Neuca_sprzedaz_przed', 'Sprzedaz_rynkowa_przed', 'Rodzaj promocji',
+    'Neuca_sprzedaz_przed_rok_wczesniej', 'Neuca_sprzedaz_w_trakcie_rok_wczesniej',
+    'Neuca_sprzedaz_po_rok_wczesniej', 'Sprzedaz_rynkowa_przed_rok_wczesniej',
+    'Sprzedaz_rynkowa_w_trakcie_rok_wczesniej', 'Sprzedaz_rynkowa_po_rok_wczesniej',
+]
+KOLUMNY_WSKAZNIKOW = [
+    'sprzedaż_sztuki', 'Rabat promocyjny %', 'Rabat kwotowy', 'Neuca_sprzedaz_przed', 'Sprzedaz_rynkowa_przed',
+    'Neuca_sprzedaz_przed_rok_wczesniej', 'Neuca_sprzedaz_w_trakcie_rok_wczesniej',
+    'Neuca_sprzedaz_po_rok_wczesniej', 'Sprzedaz_rynkowa_przed_rok_wczesniej',
+    'Sprzedaz_rynkowa_w_trakcie_rok_wczesniej', 'Sprzedaz_rynkowa_po_rok_wczesniej',
+]
+
+
+def oblicz_wskazniki(df_processed: pd.DataFrame) -> pd.DataFrame:
+    """Tabela wskaźników: średnia, mediana, odchylenie std. i maksimum wybranych cech (rabaty bez znaku)."""
+    cechy = df_processed[KOLUMNY_WSKAZNIKOW].astype(float)
+    cechy[['Rabat promocyjny %', 'Rabat kwotowy']] = cechy[['Rabat promocyjny %', 'Rabat kwotowy']].abs()
+    return pd.DataFrame({
+        'Wskaźnik': KOLUMNY_WSKAZNIKOW,
+        'średnia': cechy.mean().to_numpy(),
+        'mediana': cechy.median().to_numpy(),
+        'odchylenie std.': cechy.std().to_numpy(),
+        'max': cechy.max().to_numpy(),
+    })
+
+
+def te_same_dane(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    """Czy ramki mają te same kolumny i ten sam zbiór wierszy (kolejność wierszy i typy liczbowe bez znaczenia)."""
+    if sorted(a.columns) != sorted(b.columns) or len(a) != len(b):
+        return False
+    kolumny = sorted(a.columns)
+    a = a[kolumny].sort_values(kolumny).reset_index(drop=True)
+    b = b[kolumny].sort_values(kolumny).reset_index(drop=True)
+    try:
+        pd.testing.assert_frame_equal(a, b, check_dtype=False)
+    except AssertionError:
+        return False
+    return True
+
+
+def zapisz_bez_nadpisywania(df: pd.DataFrame, sciezka: str, nadpisz: bool = False) -> str:
+    """
+    Zapisuje df do pliku parquet. Istniejącego pliku o innej zawartości nie nadpisuje (chyba że nadpisz=True) -
+    wynik trafia wtedy do '<nazwa>.nowy.parquet'. Zwraca ścieżkę, pod którą zapisano dane.
+    """
+    if not nadpisz and os.path.exists(sciezka) and not te_same_dane(pd.read_parquet(sciezka), df):
+        sciezka = os.path.splitext(sciezka)[0] + ".nowy.parquet"
+    df.to_parquet(sciezka, index=False)
+    return sciezka
+
+
+def przetworz_kategorie(kategoria: str, katalog: str = ".", nadpisz: bool = False) -> tuple:
+    """
+    Buduje cechy promocji jednej kategorii z surowych plików promocji, sprzedaży i rynku
+    i zapisuje plik '<kategoria>_processed.parquet' oraz plik wskaźników (patrz zapisz_bez_nadpisywania).
+    Zwraca (kategoria, liczba wierszy, czas w sekundach, ścieżki zapisanych plików).
+    """
+    start = time.perf_counter()
+    przyrostek = kategorie_pliki[kategoria]
+    promocje = pd.read_parquet(os.path.join(katalog, f"promocje_{przyrostek}.parquet"), columns=[
+        'Id promocji', 'Id kartoteki', 'Data od - promocja', 'Data do - promocja',
+        'Wyłączenie rabatowania', 'Zamówienie telefoniczne', 'Zamówienie modemowe', 'Zamówienie producenckie',
+        'Rabat promocyjny %', 'Rabat kwotowy',
+    ])
+    sprzedaz = pd.read_parquet(os.path.join(katalog, f"sprzedaz_{przyrostek}.parquet"), columns=[
+        'Rok', 'Miesiąc', 'id promocji', 'Rodzaj promocji poziom 2', 'Producent sprzedażowy kod',
+        'Indeks', 'Sprzedaż ilość',
+    ])
+    rynek = pd.read_parquet(os.path.join(katalog, "rynek.parquet"), columns=[
+        'Kategoria nazwa', 'Rok', 'Miesiąc', 'Indeks', 'Sprzedaż rynek ilość',
+    ])
+    rynek = rynek[rynek['Kategoria nazwa'] == kategoria]
+    rynek['Indeks'] = rynek['Indeks'].astype(str)
+    sprzedaz['Indeks'] = sprzedaz['Indeks'].astype(str)
+    promocje['Indeks'] = promocje['Id kartoteki'].astype(str)
+    promocje['Data od - promocja'] = pd.to_datetime(promocje['Data od - promocja'], errors='coerce')
+    promocje['Data do - promocja'] = pd.to_datetime(promocje['Data do - promocja'], errors='coerce')
+    promocje = promocje.dropna(subset=['Data od - promocja', 'Data do - promocja'])
+
+    # Sprzedaż w ramach promocji: suma po (id promocji, Indeks), razem z rodzajem promocji
+    w_promocji = (
+        sprzedaz.dropna(subset=['id promocji'])
+        .groupby(['id promocji', 'Indeks'], as_index=False)
+        .agg(**{'sprzedaż_sztuki': ('Sprzedaż ilość', 'sum'),
+                'Rodzaj promocji': ('Rodzaj promocji poziom 2', 'first')})
+    )
+    cechy = promocje.merge(w_promocji, left_on=['Id promocji', 'Indeks'],
+                           right_on=['id promocji', 'Indeks'], how='inner')
+    producenci = sprzedaz.drop_duplicates('Indeks').set_index('Indeks')['Producent sprzedażowy kod']
+    cechy['Producent sprzedażowy kod'] = cechy['Indeks'].map(producenci).astype(str)
+
+    m_od = (cechy['Data od - promocja'].dt.year * 12 + cechy['Data od - promocja'].dt.month - 1).to_numpy(np.int64)
+    m_do = (cechy['Data do - promocja'].dt.year * 12 + cechy['Data do - promocja'].dt.month - 1).to_numpy(np.int64)
+    cechy['czas_trwania'] = m_do - m_od + 1
+    cechy['Miesiąc rozpoczęcia'] = cechy['Data od - promocja'].dt.month
+    cechy['Miesiąc zakończenia'] = cechy['Data do - promocja'].dt.month.astype(float)
+
+    # Sprzedaż NEUCA i rynku w oknach o długości promocji: przed, w trakcie i po (także rok wcześniej)
+    # Okna wychodzące poza miesiące obecne w sprzedaży dają NaN, więc zakres bierzemy tylko ze sprzedaży
+    mies_sprzedaz = sprzedaz.groupby(['Indeks', 'Rok', 'Miesiąc'], as_index=False)['Sprzedaż ilość'].sum()
+    m_sprzedaz = (mies_sprzedaz['Rok'] * 12 + mies_sprzedaz['Miesiąc'] - 1).to_numpy(np.int64)
+    m_min = int(m_sprzedaz.min()) if len(m_sprzedaz) else 0
+    n_mies = int(m_sprzedaz.max()) - m_min + 1 if len(m_sprzedaz) else 1
+    produkty = np.unique(np.concatenate([mies_sprzedaz['Indeks'].to_numpy(str), cechy['Indeks'].to_numpy(str)]))
+    neuca = np.nan_to_num(macierz_miesieczna(mies_sprzedaz, 'Sprzedaż ilość', produkty, m_min, n_mies))
+    rynek_ilosc = macierz_miesieczna(rynek, 'Sprzedaż rynek ilość', produkty, m_min, n_mies)
+
+    wiersze = np.searchsorted(produkty, cechy['Indeks'].to_numpy(str))
+    od, do = m_od - m_min, m_do - m_min
+    dlugosc = do - od + 1
+    cechy['Neuca_sprzedaz_przed'] = sumy_okien(neuca, wiersze, od - dlugosc, od - 1)
+    cechy['Sprzedaz_rynkowa_przed'] = sumy_okien(rynek_ilosc, wiersze, od - dlugosc, od - 1)
+    for nazwa, (a, b) in {'przed': (od - dlugosc, od - 1), 'w_trakcie': (od, do),
+                          'po': (do + 1, do + dlugosc)}.items():
+        cechy[f'Neuca_sprzedaz_{nazwa}_rok_wczesniej'] = sumy_okien(neuca, wiersze, a - 12, b - 12)
+        cechy[f'Sprzedaz_rynkowa_{nazwa}_rok_wczesniej'] = sumy_okien(rynek_ilosc, wiersze, a - 12, b - 12)
+
+    # Modele wymagają kompletnych cech - odrzucamy promocje bez pełnej historii
+    processed = cechy.dropna(subset=KOLUMNY_PROCESSED)[KOLUMNY_PROCESSED].reset_index(drop=True)
+    # Typy kolumn zgodne z plikami, na których trenowano modele
+    for kolumna in ['Indeks', 'sprzedaż_sztuki', 'Miesiąc rozpoczęcia', 'Neuca_sprzedaz_przed',
+                    'Sprzedaz_rynkowa_przed', 'Neuca_sprzedaz_przed_rok_wczesniej',
+                    'Neuca_sprzedaz_w_trakcie_rok_wczesniej', 'Neuca_sprzedaz_po_rok_wczesniej']:
+        processed[kolumna] = processed[kolumna].astype(np.int64)
+    for kolumna in ['Wyłączenie rabatowania', 'Zamówienie telefoniczne', 'Zamówienie modemowe',
+                    'Zamówienie producenckie', 'Rabat promocyjny %', 'Rabat kwotowy']:
+        processed[kolumna] = processed[kolumna].astype(float)
+
+    zapisane = [
+        zapisz_bez_nadpisywania(processed, os.path.join(katalog, f"{przyrostek}_processed.parquet"), nadpisz),
+        zapisz_bez_nadpisywania(oblicz_wskazniki(processed), os.path.join(katalog, kategorie_wskazniki[kategoria]),
+                                nadpisz),
+    ]
+    return kategoria, len(processed), time.perf_counter() - start, zapisane
+
+
+WYMIARY_KOSTKI = ['Rok', 'Miesiąc', 'Kategoria', 'Rodzaj promocji', 'Producent']
+
+
+def agreguj_kostke_kategorii(kategoria: str, katalog: str = ".") -> pd.DataFrame:
+    """Fragment kostki sprzedaży jednej kategorii: suma ilości i wartości po wszystkich wymiarach kostki."""
+    sprzedaz = pd.read_parquet(
+        os.path.join(katalog, f"sprzedaz_{kategorie_pliki[kategoria]}.parquet"),
+        columns=['Rok', 'Miesiąc', 'Rodzaj promocji poziom 2', 'Producent sprzedażowy kod',
+                 'Sprzedaż ilość', 'Sprzedaż budżetowa'],
+    )
+    sprzedaz = sprzedaz.rename(columns={
+        'Rodzaj promocji poziom 2': 'Rodzaj promocji',
+        'Producent sprzedażowy kod': 'Producent',
+        'Sprzedaż ilość': 'Ilość',
+    })
+    sprzedaz['Kategoria'] = kategoria
+    sprzedaz['Rodzaj promocji'] = sprzedaz['Rodzaj promocji'].fillna(BEZ_PROMOCJI)
+    sprzedaz['Producent'] = sprzedaz['Producent'].astype(str)
+    return sprzedaz.groupby(WYMIARY_KOSTKI, as_index=False)[MIARY_KOSTKI].sum()
+
+
+def zbuduj_kostke_sprzedazy(katalog: str = ".", procesy: int = None) -> pd.DataFrame:
+    """Buduje bazową kostkę sprzedaży ('kostka_sprzedazy.parquet') - każda kategoria w osobnym procesie."""
+    procesy = procesy or min(len(kategorie_pliki), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=procesy) as pula:
+        fragmenty = list(pula.map(agreguj_kostke_kategorii, kategorie_pliki, [katalog] * len(kategorie_pliki)))
+    kostka = pd.concat(fragmenty, ignore_index=True)
+    kostka.to_parquet(os.path.join(katalog, "kostka_sprzedazy.parquet"), index=False)
+    print(f"Kostka sprzedaży: {len(kostka)} wierszy")
+    return kostka
+
+
+def zbuduj_hierarchie_sprzedazy(katalog: str = ".", procesy: int = None) -> pd.DataFrame:
+    """Buduje liście hierarchii sprzedaży ('hierarchia_sprzedazy.parquet') - każda kategoria w osobnym procesie."""
+    procesy = procesy or min(len(kategorie_pliki), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=procesy) as pula:
+        fragmenty = list(pula.map(agreguj_hierarchie_kategorii, kategorie_pliki, [katalog] * len(kategorie_pliki)))
+    hierarchia = pd.concat(fragmenty, ignore_index=True)
+    hierarchia.to_parquet(os.path.join(katalog, "hierarchia_sprzedazy.parquet"), index=False)
+    print(f"Hierarchia sprzedaży: {len(hierarchia)} wierszy")
+    return hierarchia
+
+
+def przetworz_wszystkie(katalog: str = ".", procesy: int = None, nadpisz: bool = False) -> list:
+    """Przetwarza wszystkie kategorie równolegle - od największego pliku sprzedaży, żeby skrócić czas całości."""
+    kategorie = sorted(
+        kategorie_pliki,
+        key=lambda k: os.path.getsize(os.path.join(katalog, f"sprzedaz_{kategorie_pliki[k]}.parquet")),
+        reverse=True,
+    )
+    procesy = procesy or min(len(kategorie), os.cpu_count() or 1)
+    wyniki = []
+    with ProcessPoolExecutor(max_workers=procesy) as pula:
+        zadania = [pula.submit(przetworz_kategorie, kategoria, katalog, nadpisz) for kategoria in kategorie]
+        for zadanie in as_completed(zadania):
+            kategoria, liczba_wierszy, czas, zapisane = zadanie.result()
+            print(f"{kategorie_etykiety[kategoria]}: {liczba_wierszy} wierszy ({czas:.1f} s)")
+            for sciezka in zapisane:
+                if sciezka.endswith(".nowy.parquet"):
+                    print(f"  ⚠️ wynik różni się od istniejącego pliku - zapisano do '{sciezka}' (--nadpisz, aby zastąpić)")
+            wyniki.append((kategoria, liczba_wierszy, czas))
+    return wyniki
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--katalog", default=".", help="katalog z surowymi plikami i plikami wynikowymi")
+    parser.add_argument("--procesy", type=int, default=None, help="liczba procesów (domyślnie: liczba kategorii)")
+    parser.add_argument("--nadpisz", action="store_true",
+                        help="nadpisuj pliki cech i wskaźników także wtedy, gdy nowy wynik ma inną zawartość")
+    args = parser.parse_args()
+    przetworz_wszystkie(args.katalog, args.procesy, args.nadpisz)
+    zbuduj_kostke_sprzedazy(args.katalog, args.procesy)
+    zbuduj_hierarchie_sprzedazy(args.katalog, args.procesy)
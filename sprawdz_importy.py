@@ -0,0 +1,100 @@
+"""
+Sprawdza budżet czasu importu dashboardu na podstawie wyjścia 'python -X importtime'.
+
+Mierzy importy z najwyższego poziomu prz.py i analityka.py w świeżym procesie (bez uruchamiania
+dashboardu) i kończy się kodem 1, gdy:
+- łączny czas importu przekracza budżet,
+- załadowany został moduł, który ma być importowany dopiero w sekcji, która go potrzebuje (ODROCZONE),
+- sam Streamlit przestał ładować moduł, który prz.py importuje na starcie (Z_STREAMLITEM) - wtedy
+  trzeba go odroczyć.
+
+Uruchomienie:  python sprawdz_importy.py [--budzet-ms 1500] [--top 10]
+Te same warunki sprawdza test_importy.py (python -m pytest -q).
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+KATALOG = os.path.dirname(os.path.abspath(__file__))
+PLIKI = ["prz.py", "analityka.py"]
+BUDZET_MS = 1500
+# Ciężkie zależności używane tylko w pojedynczych sekcjach - nie mogą być ładowane przy starcie
+ODROCZONE = ["graphviz", "PIL.Image"]
+# Importowane w prz.py na starcie, bo i tak ładuje je 'import streamlit' - odroczenie nic by nie dało
+Z_STREAMLITEM = ["plotly.graph_objects", "streamlit.components.v1"]
+
+
+def importy_najwyzszego_poziomu(plik: str) -> list:
+    """Instrukcje importu z najwyższego poziomu pliku (importy wewnątrz funkcji i bloków są pomijane)."""
+    with open(os.path.join(KATALOG, plik), encoding="utf-8") as f:
+        drzewo = ast.parse(f.read())
+    return [ast.unparse(wezel) for wezel in drzewo.body if isinstance(wezel, (ast.Import, ast.ImportFrom))]
+
+
+def czasy_importu(instrukcje: list) -> list:
+    """Lista (moduł, czas własny µs, czas łączny µs, poziom zagnieżdżenia) z 'python -X importtime'."""
+    wynik = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "\n".join(instrukcje)],
+        cwd=KATALOG, capture_output=True, text=True,
+    )
+    if wynik.returncode != 0:
+        raise RuntimeError(f"Import zakończył się błędem:\n{wynik.stderr[-2000:]}")
+    czasy = []
+    for linia in wynik.stderr.splitlines():
+        if not linia.startswith("import time:") or "self [us]" in linia:
+            continue
+        wlasny, laczny, nazwa = linia[len("import time:"):].split("|")
+        czasy.append((nazwa.strip(), int(wlasny), int(laczny), (len(nazwa) - len(nazwa.lstrip())) // 2))
+    return czasy
+
+
+def zmierz() -> tuple:
+    """(instrukcje importu, czasy z 'python -X importtime', łączny czas [ms]) dla importów z PLIKI."""
+    instrukcje = list(dict.fromkeys(i for plik in PLIKI for i in importy_najwyzszego_poziomu(plik)))
+    czasy = czasy_importu(instrukcje)
+    return instrukcje, czasy, sum(wlasny for _, wlasny, _, _ in czasy) / 1000
+
+
+def bledy_importu(czasy: list, laczny_ms: float, budzet_ms: float = BUDZET_MS) -> list:
+    """Naruszenia budżetu importu (pusta lista, gdy wszystko w porządku)."""
+    bledy = []
+    if laczny_ms > budzet_ms:
+        bledy.append(f"przekroczony budżet czasu importu o {laczny_ms - budzet_ms:.1f} ms")
+    zaladowane = {nazwa for nazwa, _, _, _ in czasy}
+    for modul in ODROCZONE:
+        if modul in zaladowane:
+            bledy.append(f"moduł '{modul}' jest ładowany przy starcie - powinien być importowany tam, gdzie jest używany")
+    ze_streamlitem = {nazwa for nazwa, _, _, _ in czasy_importu(["import streamlit"])}
+    for modul in Z_STREAMLITEM:
+        if modul not in ze_streamlitem:
+            bledy.append(f"moduł '{modul}' nie jest już ładowany przez Streamlit - odrocz jego import w prz.py")
+    return bledy
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budzet-ms", type=float, default=BUDZET_MS, help="maksymalny łączny czas importu [ms]")
+    parser.add_argument("--top", type=int, default=10, help="liczba najwolniejszych importów do wypisania")
+    args = parser.parse_args()
+
+    instrukcje, czasy, laczny_ms = zmierz()
+
+    print(f"Importy z najwyższego poziomu ({', '.join(PLIKI)}): {len(instrukcje)} instrukcji")
+    print("\nNajwolniejsze importy (czas łączny):")
+    najwyzszy_poziom = [c for c in czasy if c[3] == 0]
+    for nazwa, _, laczny, _ in sorted(najwyzszy_poziom, key=lambda c: -c[2])[:args.top]:
+        print(f"  {laczny / 1000:8.1f} ms  {nazwa}")
+    print(f"\nŁączny czas importu: {laczny_ms:.1f} ms (budżet {args.budzet_ms:.0f} ms)")
+
+    bledy = bledy_importu(czasy, laczny_ms, args.budzet_ms)
+    for blad in bledy:
+        print(f"❌ {blad}")
+    if not bledy:
+        print("✅ Budżet importu dotrzymany")
+    return 1 if bledy else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+Test obciążenia dashboardu: N równoczesnych sesji przeglądarki symulowanych przez websocket Streamlit.
+
+Narzędzie uruchamia lokalnie 'streamlit run prz.py' (albo łączy się z działającym serwerem przez --url),
+otwiera sesje tak jak przeglądarka (/_stcore/stream, komunikaty BackMsg/ForwardMsg) i w każdej sesji
+zmienia losowo radia i selectboxy wykryte na stronie. Czas przebiegu to czas od wysłania 'rerun_script'
+do komunikatu 'script_finished'. Dla każdego poziomu liczby sesji wypisuje p50/p95/p99 czasu przebiegu,
+liczbę błędów, CPU i RSS procesu serwera - kolejne poziomy pokazują, gdzie serwer się nasyca.
+
+Przełączanie zakładek nie jest symulowane osobno: st.tabs wykonuje wszystkie zakładki w każdym przebiegu,
+a zmiana zakładki w przeglądarce nie wysyła niczego do serwera.
+
+Uruchomienie (z katalogu z plikami danych):
+    python sprawdz_obciazenie.py --sesje 1 10 25 50 [--akcje 10] [--pauza 0.5] [--port 8599] [--url ws://host:port]
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+from websockets.asyncio.client import connect
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+KATALOG = os.path.dirname(os.path.abspath(__file__))
+WIDZETY = ("radio", "selectbox")  # widżety z listą opcji przesyłaną jako string_value
+
+
+def uruchom_serwer(port: int) -> subprocess.Popen:
+    """Serwer Streamlit w katalogu bieżącym (tam są pliki danych); czeka na /_stcore/health."""
+    serwer = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.join(KATALOG, "prz.py"), "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(120):
+        try:
+            urllib.request.urlopen(f"http://localhost:{port}/_stcore/health", timeout=1)
+            return serwer
+        except OSError:
+            if serwer.poll() is not None:
+                raise RuntimeError("Serwer Streamlit zakończył działanie przy starcie")
+            time.sleep(0.5)
+    serwer.terminate()
+    raise RuntimeError("Serwer Streamlit nie odpowiada na /_stcore/health")
+
+
+class MonitorProcesu:
+    """Próbki CPU (% jednego rdzenia) i RSS procesu serwera co okres sekund - z /proc (Linux) albo psutil."""
+
+    def __init__(self, pid: int, okres: float = 0.5):
+        self.pid = pid
+        self.okres = okres
+        self.cpu, self.rss = [], []
+        self._stop = threading.Event()
+        try:
+            import psutil  # opcjonalnie - poza Linuksem
+            self._proces = psutil.Process(pid)
+        except ImportError:
+            self._proces = None
+        self._watek = threading.Thread(target=self._probkuj, daemon=True)
+
+    def _czasy(self) -> tuple:
+        """(czas CPU [s], RSS [B])."""
+        if self._proces is not None:
+            czasy = self._proces.cpu_times()
+            return czasy.user + czasy.system, self._proces.memory_info().rss
+        with open(f"/proc/{self.pid}/stat") as f:
+            pola = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{self.pid}/statm") as f:
+            strony = int(f.read().split()[1])
+        return (int(pola[11]) + int(pola[12])) / os.sysconf("SC_CLK_TCK"), strony * os.sysconf("SC_PAGE_SIZE")
+
+    def _probkuj(self):
+        poprzedni, t_poprzedni = self._czasy()[0], time.perf_counter()
+        while not self._stop.wait(self.okres):
+            cpu, rss = self._czasy()
+            teraz = time.perf_counter()
+            self.cpu.append(100 * (cpu - poprzedni) / (teraz - t_poprzedni))
+            self.rss.append(rss)
+            poprzedni, t_poprzedni = cpu, teraz
+
+    def __enter__(self):
+        self._watek.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._watek.join()
+
+
+class Sesja:
+    """Jedna sesja przeglądarki: wczytanie strony i kolejne zmiany widżetów, każda z pomiarem czasu przebiegu."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.widzety = {}  # id -> (etykieta, opcje)
+        self.stan = {}  # id -> wybrana opcja (widżety niezmienione mają wartość domyślną)
+        self.czasy_wczytania, self.czasy_zmian = [], []
+        self.bledy = 0
+
+    async def _przebieg(self, ws) -> float:
+        stany = [WidgetState(id=id_widzetu, string_value=wartosc) for id_widzetu, wartosc in self.stan.items()]
+        wiadomosc = BackMsg()
+        wiadomosc.rerun_script.widget_states.widgets.extend(stany)
+        start = time.perf_counter()
+        await ws.send(wiadomosc.SerializeToString())
+        while True:
+            msg = ForwardMsg.FromString(await ws.recv())
+            typ = msg.WhichOneof("type")
+            if typ == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                rodzaj = element.WhichOneof("type")
+                if rodzaj in WIDZETY:
+                    widzet = getattr(element, rodzaj)
+                    if len(widzet.options) > 1 and not widzet.disabled:
+                        self.widzety[widzet.id] = (widzet.label, list(widzet.options))
+                elif rodzaj == "exception":
+                    self.bledy += 1
+            elif typ == "script_finished":
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    self.bledy += 1
+                if msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return time.perf_counter() - start
+
+    async def uruchom(self, akcje: int, pauza: float, losowanie: random.Random):
+        async with connect(self.url, subprotocols=["streamlit"], max_size=None) as ws:
+            self.czasy_wczytania.append(await self._przebieg(ws))
+            for _ in range(akcje):
+                await asyncio.sleep(losowanie.uniform(0, 2 * pauza))  # czas "czytania" strony przez użytkownika
+                if not self.widzety:
+                    break
+                id_widzetu = losowanie.choice(list(self.widzety))
+                self.stan[id_widzetu] = losowanie.choice(self.widzety[id_widzetu][1])
+                self.czasy_zmian.append(await self._przebieg(ws))
+
+
+async def poziom_obciazenia(url: str, sesje: int, akcje: int, pauza: float, ziarno: int) -> list:
+    wszystkie = [Sesja(url) for _ in range(sesje)]
+    wyniki = await asyncio.gather(
+        *(s.uruchom(akcje, pauza, random.Random(ziarno + i)) for i, s in enumerate(wszystkie)), return_exceptions=True
+    )
+    for s, wynik in zip(wszystkie, wyniki):
+        if isinstance(wynik, Exception):
+            s.bledy += 1
+    return wszystkie
+
+
+def percentyle(czasy: list) -> str:
+    if not czasy:
+        return f"{'-':>8} {'-':>8} {'-':>8}"
+    p50, p95, p99 = np.percentile(czasy, [50, 95, 99]) * 1000
+    return f"{p50:8.0f} {p95:8.0f} {p99:8.0f}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sesje", type=int, nargs="+", default=[1, 10, 25], help="liczby równoczesnych sesji (poziomy)")
+    parser.add_argument("--akcje", type=int, default=10, help="liczba zmian widżetów w każdej sesji")
+    parser.add_argument("--pauza", type=float, default=0.5, help="średni czas między akcjami użytkownika [s]")
+    parser.add_argument("--port", type=int, default=8599, help="port lokalnie uruchamianego serwera")
+    parser.add_argument("--url", help="adres działającego serwera (ws://host:port) - bez uruchamiania lokalnego")
+    parser.add_argument("--pid", type=int, help="PID działającego serwera do pomiaru CPU/RSS (z --url)")
+    parser.add_argument("--ziarno", type=int, default=0, help="ziarno losowania akcji")
+    args = parser.parse_args()
+
+    serwer = None if args.url else uruchom_serwer(args.port)
+    url = (args.url or f"ws://localhost:{args.port}").rstrip("/") + "/_stcore/stream"
+    pid = serwer.pid if serwer else args.pid
+    try:
+        # Rozgrzewka: pierwsza sesja wczytuje dane i uruchamia rozgrzewkę cache - nie wchodzi do pomiarów
+        rozgrzewka = asyncio.run(poziom_obciazenia(url, 1, 0, 0, args.ziarno))[0]
+        print(f"Pierwsze wczytanie (zimny serwer): {rozgrzewka.czasy_wczytania[0] * 1000:.0f} ms, "
+              f"widżety do zmiany: {len(rozgrzewka.widzety)}")
+        print(f"\n{'sesje':>6} {'przebiegi':>9} {'błędy':>6} | {'wczytanie p50/p95/p99 [ms]':>26} | "
+              f"{'zmiana widżetu p50/p95/p99 [ms]':>31} | {'przeb./s':>8} | {'CPU śr/max [%]':>14} | {'RSS max [MB]':>12}")
+        for liczba_sesji in args.sesje:
+            monitor = MonitorProcesu(pid) if pid else None
+            start = time.perf_counter()
+            if monitor:
+                with monitor:
+                    sesje = asyncio.run(poziom_obciazenia(url, liczba_sesji, args.akcje, args.pauza, args.ziarno))
+            else:
+                sesje = asyncio.run(poziom_obciazenia(url, liczba_sesji, args.akcje, args.pauza, args.ziarno))
+            czas = time.perf_counter() - start
+            wczytania = [t for s in sesje for t in s.czasy_wczytania]
+            zmiany = [t for s in sesje for t in s.czasy_zmian]
+            cpu = (f"{np.mean(monitor.cpu):6.0f} {np.max(monitor.cpu):6.0f}" if monitor and monitor.cpu
+                   else f"{'-':>6} {'-':>6}")
+            rss = f"{max(monitor.rss) / 1024 ** 2:12.0f}" if monitor and monitor.rss else f"{'-':>12}"
+            print(f"{liczba_sesji:>6} {len(wczytania) + len(zmiany):>9} {sum(s.bledy for s in sesje):>6} | "
+                  f"{percentyle(wczytania):>26} | {percentyle(zmiany):>31} | "
+                  f"{(len(wczytania) + len(zmiany)) / czas:8.1f} | {cpu:>14} | {rss}")
+    finally:
+        if serwer:
+            serwer.terminate()
+            serwer.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Testy obliczeń modułu analityka (bez Streamlit). Uruchomienie:  python -m pytest -q"""
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analityka import CachePamieci, formatuj_liczby, formatuj_liczbe
+
+
+def format_pythona(x: float, miejsca: int) -> str:
+    return f"{x:,.{miejsca}f}".replace(",", " ").replace(".", ",")
+
+
+def test_formatuj_liczby_polski_format():
+    wynik = formatuj_liczby(pd.Series([1234567.891, -0.004, 1000, np.nan], index=[5, 6, 7, 8]), 2, " zł", brak="-")
+    assert wynik.tolist() == ["1 234 567,89 zł", "0,00 zł", "1 000,00 zł", "-"]
+    assert wynik.index.tolist() == [5, 6, 7, 8]
+
+
+def test_formatuj_liczbe_delta_pp():
+    assert formatuj_liczbe(1.234, 2, " pp", znak=True) == "+1,23 pp"
+    assert formatuj_liczbe(-1.234, 2, " pp", znak=True) == "-1,23 pp"
+    assert formatuj_liczbe(42.5, 1, "%") == "42,5%"
+
+
+def test_formatuj_liczby_zgodny_z_formatem_pythona():
+    wartosci = np.random.default_rng(0).normal(0, 1e7, 1000)
+    for miejsca in (0, 2):
+        assert formatuj_liczby(wartosci, miejsca).tolist() == [format_pythona(x, miejsca) for x in wartosci]
+
+
+def test_formatuj_liczby_poza_zakresem_int64():
+    # Jednostki >= 2**63 nie mieszczą się w int64 - takie wartości idą ścieżką skalarną zamiast zawijać się
+    wartosci = [1e19, -2.5e20, 9.2e16, 1e300]
+    for miejsca in (0, 2):
+        oczekiwane = [("-" if x < 0 else "") + format_pythona(abs(x), miejsca) for x in wartosci]
+        assert formatuj_liczby(wartosci, miejsca).tolist() == oczekiwane
+    assert formatuj_liczbe(1e19, 0, " zł", znak=True) == "+10 000 000 000 000 000 000 zł"
+
+
+def test_cache_pamieci_liczy_chybienie_wywolania_z_wyjatkiem():
+    pamiec = CachePamieci(limit_bajtow=1024 ** 2)
+
+    @pamiec.zapamietaj
+    def podwoj(x):
+        if x < 0:
+            raise ValueError("ujemna")
+        return 2 * x
+
+    with pytest.raises(ValueError):
+        podwoj(-1)
+    assert podwoj(2) == 4
+    assert podwoj(2) == 4
+    statystyki = pamiec.raport().set_index('Funkcja').loc[podwoj.__qualname__]
+    assert (statystyki['Chybienia'], statystyki['Trafienia']) == (2, 1)
+
+
+def test_analityka_nie_zalezy_od_przetworz_dane():
+    # Kierunek zależności: zadanie wsadowe importuje analitykę, nigdy odwrotnie
+    wynik = subprocess.run([sys.executable, "-c", "import sys, analityka; print('przetworz_dane' in sys.modules)"],
+                           cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+    assert wynik.stdout.strip() == "False"
@@ -0,0 +1,7 @@
+"""Budżet czasu importu dashboardu (wyjście 'python -X importtime', zob. sprawdz_importy.py)."""
+from sprawdz_importy import bledy_importu, zmierz
+
+
+def test_budzet_importu():
+    _, czasy, laczny_ms = zmierz()
+    assert bledy_importu(czasy, laczny_ms) == []